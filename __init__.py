@@ -1,7 +1,11 @@
 import os
-import importlib.util
 import glob
+import time
 from dotenv import load_dotenv
+from .fluxagent.utils.NodeManifest import NodeManifest, import_node_file, make_lazy_node
+from .fluxagent.utils.StartupProfiler import StartupProfiler
+from .fluxagent.utils.Precompile import precompile
+from .fluxagent.utils.Env import env_int
 
 current_dir = os.path.dirname(os.path.realpath(__file__))
 load_dotenv(os.path.join(current_dir, '.env'), override=True)
@@ -16,10 +20,32 @@ extension_dir = os.path.dirname(os.path.realpath(__file__))
 # Path to the JavaScript directory
 WEB_DIRECTORY = os.path.join(extension_dir, "js")
 
+# Set FLUXAGENT_LAZY_NODES=0 to always import every node file on startup
+LAZY_NODE_LOADING = os.getenv("FLUXAGENT_LAZY_NODES", "1") != "0"
+
+# Cache of discovered node files, see fluxagent/utils/NodeManifest.py
+NODE_MANIFEST_PATH = os.path.join(extension_dir, ".cache", "node_manifest.json")
+
+# Set FLUXAGENT_PROFILE_STARTUP=1 to record per-file import times (served on /X-FluxAgent-startup-report)
+PROFILE_STARTUP = os.getenv("FLUXAGENT_PROFILE_STARTUP", "0") == "1"
+
+# Number of processes used to precompile stale node files to bytecode, 0 disables it
+PRECOMPILE_WORKERS = env_int("FLUXAGENT_PRECOMPILE_WORKERS", 0)
+
+# Set FLUXAGENT_HOT_RELOAD=1 to reload node files when they are saved (see fluxagent/utils/HotReload.py)
+HOT_RELOAD = os.getenv("FLUXAGENT_HOT_RELOAD", "0") == "1"
+
+# Directories scanned for node files
+SCAN_DIRS = ["fluxagent", "user"]
+
 # Auto-discovery and loading of all Python files in the fluxagent and nodes directories
 def load_nodes():
     # Directories to scan for node files
-    scan_dirs = ["fluxagent", "user"]
+    scan_dirs = SCAN_DIRS
+
+    manifest = NodeManifest(NODE_MANIFEST_PATH)
+    profiler = StartupProfiler(PROFILE_STARTUP)
+    discovered = []
     
     for dir_name in scan_dirs:
         target_dir = os.path.join(extension_dir, dir_name)
@@ -31,27 +57,68 @@ def load_nodes():
         node_files = [f for f in node_files if not f.endswith("__init__.py")]
         
         for file_path in node_files:
+            # Create a unique module name using the relative path, under this package
+            # so node files can share helpers through relative imports
+            rel_path = os.path.relpath(file_path, extension_dir)
+            module_name = f"{__name__}.{rel_path.replace(os.sep, '.')[:-3]}"  # Remove .py extension and use dots
+
             try:
-                # Create a unique module name using the relative path
-                rel_path = os.path.relpath(file_path, extension_dir)
-                module_name = rel_path.replace(os.sep, ".")[:-3]  # Remove .py extension and use dots
-                
-                spec = importlib.util.spec_from_file_location(module_name, file_path)
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
+                entry = manifest.lookup(rel_path, file_path) if LAZY_NODE_LOADING else None
+            except OSError:
+                entry = None
+            discovered.append((rel_path, file_path, module_name, entry))
+
+    # Compile the files that are about to be imported in parallel before the serial import pass
+    to_import = [file_path for _, file_path, _, entry in discovered if entry is None or not entry["lazy"]]
+    if PRECOMPILE_WORKERS > 0:
+        start = time.perf_counter()
+        result = precompile(to_import, PRECOMPILE_WORKERS)
+        profiler.record_stage("precompile", time.perf_counter() - start, **result)
+
+    for rel_path, file_path, module_name, entry in discovered:
+        try:
+            # Unchanged files are registered through proxies and imported on first use
+            if entry is not None and entry["lazy"]:
+                with profiler.measure(rel_path, "lazy"):
+                    for class_type, description in entry["nodes"].items():
+                        NODE_CLASS_MAPPINGS[class_type] = make_lazy_node(class_type, description, module_name, file_path)
+                    NODE_DISPLAY_NAME_MAPPINGS.update(entry["display_names"])
+                continue
+
+            with profiler.measure(rel_path, "import"):
+                module = import_node_file(module_name, file_path)
+            manifest.record(rel_path, file_path, module)
+            
+            # If the module defines NODE_CLASS_MAPPINGS, update our mappings
+            if hasattr(module, "NODE_CLASS_MAPPINGS"):
+                NODE_CLASS_MAPPINGS.update(module.NODE_CLASS_MAPPINGS)
+            # If the module defines NODE_DISPLAY_NAME_MAPPINGS, update our mappings
+            if hasattr(module, "NODE_DISPLAY_NAME_MAPPINGS"):
+                NODE_DISPLAY_NAME_MAPPINGS.update(module.NODE_DISPLAY_NAME_MAPPINGS)
                 
-                # If the module defines NODE_CLASS_MAPPINGS, update our mappings
-                if hasattr(module, "NODE_CLASS_MAPPINGS"):
-                    NODE_CLASS_MAPPINGS.update(module.NODE_CLASS_MAPPINGS)
-                # If the module defines NODE_DISPLAY_NAME_MAPPINGS, update our mappings
-                if hasattr(module, "NODE_DISPLAY_NAME_MAPPINGS"):
-                    NODE_DISPLAY_NAME_MAPPINGS.update(module.NODE_DISPLAY_NAME_MAPPINGS)
-                    
-            except Exception as e:
-                print(f"Warning: Failed to load node file {file_path}: {e}")
+        except Exception as e:
+            manifest.forget(rel_path)
+            print(f"Warning: Failed to load node file {file_path}: {e}")
+
+    try:
+        manifest.save(keep=[rel_path for rel_path, _, _, _ in discovered])
+    except OSError as e:
+        print(f"Warning: Failed to save node manifest {NODE_MANIFEST_PATH}: {e}")
+
+    report = profiler.finish()
+    if report is not None:
+        print(f"X-FluxAgent loaded {report['imported']} node files and {report['lazy']} from the manifest "
+              f"in {report['total_seconds']:.3f}s, {report['failed']} failed")
 
 # Auto-load nodes when the extension is imported
 load_nodes()
 
+if HOT_RELOAD:
+    try:
+        from .fluxagent.utils.HotReload import start_watcher
+        start_watcher(__name__, extension_dir, SCAN_DIRS)
+    except Exception as e:
+        print(f"Warning: Hot reload unavailable: {e}")
+
 # This is what ComfyUI will use to register our nodes
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
@@ -1,3 +1,23 @@
+import json
+import hashlib
+
+from .utils.WorkflowIndex import get_workflow_index
+from .utils.CodeSandbox import get_code_sandbox
+
+# Value of the code widget before any code was generated
+DEFAULT_CODE = "Your code"
+
+_sandbox_warned = False
+
+
+def _warn_sandbox_disabled_once():
+    global _sandbox_warned
+    if not _sandbox_warned:
+        _sandbox_warned = True
+        print("Warning: AICodeGenNode does not run generated code unless FLUXAGENT_SANDBOX_ENABLED=1, "
+              "returning the placeholder output")
+
+
 class AICodeGenNode:
 
     @classmethod
@@ -30,6 +50,45 @@ class AICodeGenNode:
     '''
 
 
+    @classmethod
+    def IS_CHANGED(cls, rich_text=None, **kw):
+        """
+        Hash of the node's code, instead of the whole workflow
+        
+        ComfyUI calls IS_CHANGED without the prompt's extra data, so the
+        workflow (and the slots in it) is not available here. The values of
+        the input slots are part of ComfyUI's own cache key through their
+        links; renaming an output slot alone keeps the cached result until the
+        code or an input changes.
+        
+        Args:
+            rich_text: The code widget
+            
+        Returns:
+            str: Hex digest of the code
+        """
+        return hashlib.sha256((rich_text or "").encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def find_slots(extra_pnginfo, node_id):
+        """
+        Read the node's input and output slots from the workflow
+        
+        Args:
+            extra_pnginfo: Extra data holding the workflow
+            node_id: Id of the node
+            
+        Returns:
+            tuple: (inputs, outputs), lists of {"name", "type"}
+        """
+        # Indexed once per prompt, shared by every code-gen node of the workflow
+        node = get_workflow_index().get_node(extra_pnginfo, node_id)
+        if node is None:
+            return [], []
+        inputs = [{"name": input.get('name', ''), "type": input.get('type', 'ANY')} for input in node.get('inputs', [])]
+        outputs = [{"name": output.get('name', ''), "type": output.get('type', 'ANY')} for output in node.get('outputs', [])]
+        return inputs, outputs
+
     def process(self, **kw):
         # the dynamically created input data will be in the dictionary kwargs
         node_id = kw.get('node_id', 0)
@@ -39,31 +98,7 @@ class AICodeGenNode:
         #import json
         #print(json.dumps(kw, indent=4))
         
-        inputs = []
-        outputs = []
-
-        extra_pnginfo = kw.get('extra_pnginfo', {})
-        
-        
-        # Parse outputs from workflow data
-        if extra_pnginfo and 'workflow' in extra_pnginfo:
-            workflow = extra_pnginfo['workflow']
-            if 'nodes' in workflow:
-                for node in workflow['nodes']:
-                    if str(node.get('id')) == node_id:
-                        node_inputs = node.get('inputs', [])
-                        for input in node_inputs:
-                            inputs.append({
-                                "name": input.get('name', ''),
-                                "type": input.get('type', 'ANY')
-                            })
-                        node_outputs = node.get('outputs', [])
-                        for output in node_outputs:
-                            outputs.append({
-                                "name": output.get('name', ''),
-                                "type": output.get('type', 'ANY')
-                            })
-                        break
+        inputs, outputs = self.find_slots(kw.get('extra_pnginfo', {}), node_id)
 
         '''
         inputs => [{'name': 'input_1748856857813', 'type': 'STRING'}, {'name': 'input_1748856863647', 'type': 'STRING'}]
@@ -80,12 +115,26 @@ class AICodeGenNode:
         print(f"inputs => {inputs}")
         print(f"outputs => {outputs}")
         
-        # This is a placeholder for the actual code generation logic
-        # You can implement your own code generation logic here
-        generated_code = f"Generated code goes here {node_id}"
+        # One value per output slot, the node declares a single STRING
+        arity = max(1, len(outputs))
+        code = kw.get('rich_text')
+        if not code or code.strip() == DEFAULT_CODE:
+            # No code generated yet
+            return (f"Generated code goes here {node_id}",) * arity
+        
+        sandbox = get_code_sandbox()
+        if not sandbox.enabled:
+            # Running generated code is opt-in, workflows keep working without it
+            _warn_sandbox_disabled_once()
+            return (f"Generated code goes here {node_id}",) * arity
         
-        # Return the generated code as a string
-        return (generated_code,)
+        # Inputs are variables named after the input slots, outputs are read
+        # back from the variables named after the output slots. The code runs
+        # in a sandbox worker process, started on the first run, see
+        # utils/CodeSandbox.py
+        values = {input["name"]: kw.get(input["name"]) for input in inputs}
+        result = sandbox.run(code, f"<AICodeGenNode {node_id}>", values, [output["name"] for output in outputs])
+        return result or (None,) * arity
     
     # Node registration
 NODE_CLASS_MAPPINGS = {
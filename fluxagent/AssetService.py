@@ -0,0 +1,64 @@
+import asyncio
+import hashlib
+import threading
+
+from server import PromptServer
+from aiohttp import web
+
+from .utils.AssetBundle import get_asset_bundle, choose_encoding
+
+routes = PromptServer.instance.routes
+
+# Hashed names never change content
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# Plain names and the manifest are revalidated, a 304 when unchanged
+REVALIDATE_CACHE = 'no-cache'
+
+# Compressing the CodeMirror bundle takes seconds at the highest levels, do it before the first page load
+threading.Thread(target=get_asset_bundle().refresh, name="FluxAgentAssetBuild", daemon=True).start()
+
+
+def _not_modified(request, etag):
+    if_none_match = request.headers.get('If-None-Match', '')
+    return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+
+
+@routes.get('/X-FluxAgent-assets/manifest.json')
+async def get_asset_manifest(request):
+    """
+    Map asset names to their content hashed file names, for the frontend
+    to import the current version from get_asset()
+    """
+    manifest = await asyncio.get_running_loop().run_in_executor(None, get_asset_bundle().manifest)
+    response = web.json_response(manifest, headers={'Cache-Control': REVALIDATE_CACHE})
+    etag = f'"{hashlib.sha256(response.body).hexdigest()[:32]}"'
+    if _not_modified(request, etag):
+        return web.Response(status=304, headers={'ETag': etag, 'Cache-Control': REVALIDATE_CACHE})
+    response.headers['ETag'] = etag
+    return response
+
+
+@routes.get('/X-FluxAgent-assets/{name}')
+async def get_asset(request):
+    """
+    Serve a frontend asset, precompressed with the best encoding the client
+    accepts. Hashed names (codemirror_bundle.<hash>.js) are cached for a
+    year, plain names are revalidated with their ETag.
+    """
+    name = request.match_info['name']
+    asset, immutable = await asyncio.get_running_loop().run_in_executor(None, get_asset_bundle().lookup, name)
+    if asset is None:
+        return web.json_response({'error': f'Unknown asset {name}'}, status=404)
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), asset)
+    headers = {
+        'ETag': asset.etag(encoding),
+        'Cache-Control': IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE,
+        'Vary': 'Accept-Encoding',
+    }
+    if _not_modified(request, headers['ETag']):
+        return web.Response(status=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return web.Response(body=asset.variants[encoding], content_type=asset.content_type,
+                        charset='utf-8', headers=headers)
@@ -1,119 +1,368 @@
-import os
 import json
-import requests
+import time
+import uuid
 import asyncio
 from server import PromptServer
 from aiohttp import web
 
+from .utils.HttpClient import close_async_sessions
+from .utils.LLMClient import async_routed_chat_completion, async_routed_stream_chat_completion, resolve_provider, extract_content, LLMError
+from .utils.LLMProviders import get_provider_registry
+from .utils.ConversationMemory import ConversationStore
+from .utils.ClientOutbox import ClientOutboxes
+from .utils.AdmissionControl import AdmissionController, QueueFull
+from .utils import Metrics
+from .utils.Env import env_float, env_int
+
 routes = PromptServer.instance.routes
 
+# Streamed deltas are coalesced into one websocket frame per window
+STREAM_FLUSH_INTERVAL = env_float("FLUXAGENT_CHAT_STREAM_INTERVAL_MS", 50) / 1000
+STREAM_FLUSH_CHARS = env_int("FLUXAGENT_CHAT_STREAM_MAX_CHARS", 512)
+
+# Events waiting for one client before the oldest droppable ones are dropped
+CLIENT_OUTBOX_EVENTS = env_int("FLUXAGENT_CHAT_OUTBOX_EVENTS", 256)
+
+# Chatbot requests answered at once, waiting in line, and in progress per session
+MAX_RUNNING_REQUESTS = env_int("FLUXAGENT_CHAT_MAX_RUNNING", 8)
+MAX_QUEUED_REQUESTS = env_int("FLUXAGENT_CHAT_MAX_QUEUED", 32)
+MAX_SESSION_REQUESTS = env_int("FLUXAGENT_CHAT_MAX_PER_SESSION", 2)
+
+# How often the route checks whether the requesting client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# Model used unless the session's provider configures its own
+CHAT_MODEL = "gpt-4.1"
+DEFAULT_SYSTEM_MESSAGE = "You are a helpful AI assistant specialized in programming and technical topics. Respond concisely and helpfully. When providing code examples, use proper markdown code blocks with language specification for syntax highlighting. Feel free to use markdown formatting like **bold**, *italics*, `inline code`, lists, and tables when appropriate."
+
+# Completion budget of a rolling conversation summary
+SUMMARY_MAX_TOKENS = 400
+
+
+# Chatbot events go only to the websocket client that sent the message
+outboxes = ClientOutboxes(PromptServer.instance.send, CLIENT_OUTBOX_EVENTS)
+
+
+def _merge_deltas(queued, data):
+    return dict(queued, delta=queued["delta"] + data["delta"])
+
+
+def send_event(client_id, event, data):
+    """
+    Send a chatbot event to one client through its outbox
+    
+    Loading states of a message replace each other and its streamed deltas are
+    merged while they wait; both may be dropped for a client that falls
+    behind, since the final message event carries the complete response.
+    Events are never broadcast: without a client id there is no one to send
+    them to.
+    """
+    if not client_id:
+        return
+    if event == "X-FluxAgent.chatbot.loading":
+        outboxes.get(client_id).put(event, data, coalesce_key=("loading", data.get("message_id")), droppable=True)
+    elif event == "X-FluxAgent.chatbot.delta":
+        outboxes.get(client_id).put(event, data, coalesce_key=("delta", data["message_id"]), merge=_merge_deltas, droppable=True)
+    else:
+        outboxes.get(client_id).put(event, data)
+
+
+class DeltaCoalescer:
+    """
+    Buffers streamed text deltas and sends them as X-FluxAgent.chatbot.delta
+    events, at most one per STREAM_FLUSH_INTERVAL unless the buffer grows past
+    STREAM_FLUSH_CHARS, so a fast token stream does not flood the websocket.
+    Must be used from the event loop; a timer flushes what is left when the
+    stream stalls.
+    """
+
+    def __init__(self, message_id, client_id=None, interval=STREAM_FLUSH_INTERVAL, max_chars=STREAM_FLUSH_CHARS):
+        self.message_id = message_id
+        self.client_id = client_id
+        self.interval = interval
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+        self.index = 0
+        self.last_flush = 0.0
+        self.timer = None
+
+    def add(self, delta):
+        self.parts.append(delta)
+        self.size += len(delta)
+        wait = self.interval - (time.monotonic() - self.last_flush)
+        if self.size >= self.max_chars or wait <= 0:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(wait, self.flush)
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.parts:
+            return
+        send_event(self.client_id, "X-FluxAgent.chatbot.delta", {
+            "message_id": self.message_id,
+            "index": self.index,
+            "delta": "".join(self.parts),
+        })
+        self.index += 1
+        self.parts = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+
+
 class ChatBotService:
     """
     Service for handling chatbot functionality with OpenAI integration
     """
     
     def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            print("Warning: OPENAI_API_KEY not found in environment variables")
-        else:
-            print("ChatBotService initialized with OpenAI API key")
+        provider = get_provider_registry().get()
+        try:
+            provider.check_api_key()
+            print(f"ChatBotService initialized with LLM provider {provider.name}")
+        except ValueError:
+            print(f"Warning: {provider.api_key_env} not found in environment variables")
+        self.conversations = ConversationStore()
+        # Running summary tasks, referenced so they are not garbage collected
+        self._background_tasks = set()
     
-    def get_openai_response(self, user_message, system_message=None):
+    def build_request(self, user_message, system_message=None, conversation=None, model=CHAT_MODEL):
         """
-        Get response from OpenAI API
+        Build the chat completion request body
         
         Args:
             user_message: The user's message
             system_message: Optional system message
+            conversation: Optional Conversation whose history is included
+            model: The model to use
             
         Returns:
-            str: The AI response
+            dict: The request body, or None if the user message is empty
         """
-        if not self.api_key:
-            return "Error: OpenAI API key not configured"
+        if not user_message or not user_message.strip():
+            return None
         
-        # Prepare the messages
-        messages = []
+        # Use the default system message for chatbot unless one is provided
+        if not system_message or not system_message.strip():
+            system_message = DEFAULT_SYSTEM_MESSAGE
         
-        # Add system message if provided
-        if system_message and system_message.strip():
-            messages.append({
-                "role": "system",
-                "content": system_message
-            })
+        if conversation is not None:
+            # Summary and recent history, fitted into the prompt token budget
+            messages = conversation.build_messages(system_message, user_message, self.conversations.context_tokens)
         else:
-            # Default system message for chatbot
-            messages.append({
-                "role": "system",
-                "content": "You are a helpful AI assistant specialized in programming and technical topics. Respond concisely and helpfully. When providing code examples, use proper markdown code blocks with language specification for syntax highlighting. Feel free to use markdown formatting like **bold**, *italics*, `inline code`, lists, and tables when appropriate."
-            })
-
-        # Add user message
-        if user_message and user_message.strip():
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
-        else:
-            return "Error: User message is empty"
-        
-        # API endpoint
-        url = "https://api.openai.com/v1/chat/completions"
-        
-        # Headers
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+            messages = [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message},
+            ]
         
         # Request body
-        data = {
-            "model": "gpt-4.1",
+        return {
+            "model": model,
             "messages": messages,
             "max_tokens": 1000,
             "temperature": 0.7
         }
+
+    def _provider(self, conversation=None):
+        """
+        The provider of a conversation, the default one without
         
+        Raises:
+            LLMError: If the provider is unknown or has no API key
+        """
         try:
-            # Make the API request
-            response = requests.post(url, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
+            provider = resolve_provider(conversation.provider if conversation is not None else None)
+            provider.check_api_key()
+        except ValueError as e:
+            raise LLMError(f"Error: {e}", retryable=False, kind="config") from e
+        return provider
+
+    def _prepare(self, user_message, system_message=None, conversation=None):
+        """
+        Check the configuration and build the request body
+        
+        Returns:
+            tuple: (provider, request body)
+        
+        Raises:
+            LLMError: If the provider is not usable or the message is empty
+        """
+        provider = self._provider(conversation)
+        data = self.build_request(user_message, system_message, conversation, provider.model or CHAT_MODEL)
+        if data is None:
+            raise LLMError("Error: User message is empty")
+        return provider, data
+
+    def remember(self, conversation, user_message, ai_response):
+        """
+        Store a completed exchange, and fold old messages into the rolling
+        summary in the background when the history outgrows the budget
+        """
+        conversation.add("user", user_message)
+        conversation.add("assistant", ai_response)
+        if not self.conversations.summary_enabled or conversation.summarizing:
+            return
+        folded = conversation.messages_to_fold(self.conversations.context_tokens)
+        if folded:
+            task = asyncio.ensure_future(self._summarize(conversation, folded))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _summarize(self, conversation, folded):
+        conversation.summarizing = True
+        try:
+            provider = self._provider(conversation)
+            result = await async_routed_chat_completion(provider, {
+                "model": provider.model or CHAT_MODEL,
+                "messages": conversation.summary_request_messages(folded),
+                "max_tokens": SUMMARY_MAX_TOKENS,
+                "temperature": 0.2
+            }, timeout=30, caller="chat_summary")
+            summary = extract_content(result)
+            if summary:
+                conversation.fold(folded, summary.strip())
+        except LLMError as e:
+            print(f"Conversation summary failed, keeping the sliding window only: {e}")
+        finally:
+            conversation.summarizing = False
+
+    async def get_openai_response(self, user_message, system_message=None, conversation=None):
+        """
+        Get response from OpenAI API
+        
+        Args:
+            user_message: The user's message
+            system_message: Optional system message
+            conversation: Optional Conversation to continue and extend
             
-            # Parse the response
-            result = response.json()
+        Returns:
+            str: The AI response
             
-            # Extract the assistant's response
-            if "choices" in result and len(result["choices"]) > 0:
-                assistant_response = result["choices"][0]["message"]["content"]
-                return assistant_response
-            else:
-                return "Error: No response from API"
-                
-        except requests.exceptions.HTTPError as e:
-            error_msg = f"HTTP Error: {e}"
-            if hasattr(e, 'response') and e.response.text:
-                try:
-                    error_details = e.response.json()
-                    error_msg += f"\nDetails: {error_details.get('error', {}).get('message', 'Unknown error')}"
-                except:
-                    error_msg += f"\nResponse: {e.response.text}"
-            return error_msg
+        Raises:
+            LLMError: If the request failed after retries
+        """
+        provider, data = self._prepare(user_message, system_message, conversation)
+        
+        # Make the API request over the shared connection pool, joining an
+        # identical request already in flight
+        result = await async_routed_chat_completion(provider, data, timeout=30, caller="chat")
+        
+        # Extract the assistant's response
+        assistant_response = extract_content(result)
+        if assistant_response is None:
+            raise LLMError("Error: No response from API")
+        if conversation is not None:
+            self.remember(conversation, user_message, assistant_response)
+        return assistant_response
+
+    async def stream_openai_response(self, user_message, message_id, system_message=None, conversation=None, client_id=None):
+        """
+        Get response from OpenAI API as a stream, forwarding deltas to the client
+        
+        Args:
+            user_message: The user's message
+            message_id: Id the delta events are tagged with
+            system_message: Optional system message
+            conversation: Optional Conversation to continue and extend
+            client_id: Websocket client the deltas are sent to
             
-        except requests.exceptions.RequestException as e:
-            return f"Request Error: {e}"
+        Returns:
+            str: The complete AI response
             
-        except Exception as e:
-            return f"Error: {e}"
+        Raises:
+            LLMError: If the request failed; deltas received before the
+                failure have already been sent
+        """
+        provider, data = self._prepare(user_message, system_message, conversation)
+
+        coalescer = DeltaCoalescer(message_id, client_id)
+        parts = []
+        try:
+            async for delta in async_routed_stream_chat_completion(provider, data, timeout=30, caller="chat"):
+                parts.append(delta)
+                coalescer.add(delta)
+        finally:
+            coalescer.flush()
+        if not parts:
+            raise LLMError("Error: No response from API")
+        ai_response = "".join(parts)
+        if conversation is not None:
+            self.remember(conversation, user_message, ai_response)
+        return ai_response
 
 # Create global service instance
 chatbot_service = ChatBotService()
 
+# Bounds the chatbot requests in progress and lets them be cancelled
+admission = AdmissionController(MAX_RUNNING_REQUESTS, MAX_QUEUED_REQUESTS, MAX_SESSION_REQUESTS)
+Metrics.CHAT_JOBS.function = lambda: {("running",): admission.running, ("waiting",): admission.waiting}
+
+
+async def _close_http_sessions(app):
+    await close_async_sessions()
+
+PromptServer.instance.app.on_cleanup.append(_close_http_sessions)
+
+
+def client_session(data):
+    """
+    The requesting websocket client and its session key
+    
+    Conversations and admission are keyed by "client_id:session_id", so one
+    client can neither continue nor cancel another client's session by
+    sending its session id. The client must be connected to the websocket.
+    
+    Returns:
+        tuple: (client_id, session key), (None, None) if the body names no
+            connected client
+    """
+    client_id = str(data.get('client_id') or '')
+    if not client_id:
+        return None, None
+    # Not every stand-in server keeps the connected clients
+    sockets = getattr(PromptServer.instance, 'sockets', None)
+    if sockets is not None and client_id not in sockets:
+        return None, None
+    return client_id, f"{client_id}:{data.get('session_id') or 'default'}"
+
+
+class ClientDisconnected(Exception):
+    """The client that sent the chatbot request went away before the response."""
+
+
+async def run_until_disconnected(request, coro):
+    """
+    Run coro while the requesting client stays connected
+    
+    The task is cancelled (aborting the upstream LLM request) as soon as the
+    client's connection closes, or when the handler itself is cancelled.
+    
+    Raises:
+        ClientDisconnected: If the client went away first
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if request.transport is None or request.transport.is_closing():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise ClientDisconnected()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
 @routes.post('/X-FluxAgent-chatbot-message')
 async def on_message(request):
     """
     Handle incoming chatbot messages
     """
+    client_id = None
     try:
         print("Received chatbot message request")
         
@@ -127,24 +376,91 @@ async def on_message(request):
         
         print(f"Processing message: {user_message[:100]}...")  # Log first 100 chars
         
-        # Send loading indicator
-        PromptServer.instance.send_sync("X-FluxAgent.chatbot.loading", {
-            "loading": True
+        client_id, session_id = client_session(data)
+        if client_id is None:
+            print("Error: Chatbot message without a connected client_id")
+            return web.json_response({'error': 'client_id of a connected websocket client is required'}, status=400)
+        stream = bool(data.get('stream', False))
+        message_id = uuid.uuid4().hex
+        # Follow-up messages of the same session see the earlier exchanges
+        conversation = chatbot_service.conversations.get(session_id)
+        # The provider chosen for the session is kept for its later messages
+        provider = str(data.get('provider') or '').strip()
+        if provider:
+            try:
+                conversation.provider = get_provider_registry().get(provider).name
+            except ValueError as e:
+                return web.json_response({'error': str(e)}, status=400)
+        
+        # Refuse the message up front when the session or the queue is full;
+        # with "supersede" it replaces the session's unfinished messages
+        try:
+            job = admission.submit(message_id, session_id, supersede=bool(data.get('supersede', False)), owner=client_id)
+        except QueueFull as e:
+            print(f"Chatbot message refused: {e}")
+            return web.json_response({'error': str(e), 'queue_position': e.position}, status=429,
+                                     headers={'Retry-After': '1'})
+        
+        # Send loading indicator, with the place in line if all slots are busy
+        send_event(client_id, "X-FluxAgent.chatbot.loading", {
+            "loading": True,
+            "message_id": message_id,
+            "queue_position": job.queue_position
         })
         
-        # Get AI response (run in thread pool to avoid blocking)
-        loop = asyncio.get_event_loop()
-        ai_response = await loop.run_in_executor(
-            None, 
-            chatbot_service.get_openai_response, 
-            user_message
-        )
+        async def answer():
+            async with admission.slot(job):
+                if stream:
+                    return await chatbot_service.stream_openai_response(user_message, message_id, conversation=conversation, client_id=client_id)
+                return await chatbot_service.get_openai_response(user_message, conversation=conversation)
         
-        # Send the response back to the client
+        # Get AI response on the event loop, cancelled if the client disconnects
+        # or the job is cancelled
+        job.task = asyncio.ensure_future(answer())
+        try:
+            ai_response = await run_until_disconnected(request, job.task)
+        except ClientDisconnected:
+            print("Chatbot client disconnected, request cancelled")
+            send_event(client_id, "X-FluxAgent.chatbot.message", {
+                "message_id": message_id,
+                "error": "Request cancelled",
+                "loading": False
+            })
+            return web.json_response({'error': 'Client disconnected'}, status=499)
+        except asyncio.CancelledError:
+            if job.cancel_reason is None:
+                raise
+            print(f"Chatbot message {message_id} cancelled: {job.cancel_reason}")
+            send_event(client_id, "X-FluxAgent.chatbot.message", {
+                "message_id": message_id,
+                "error": job.cancel_reason,
+                "cancelled": True,
+                "streamed": stream,
+                "loading": False
+            })
+            return web.json_response({'status': 'cancelled', 'reason': job.cancel_reason})
+        except LLMError as e:
+            # Reported through the websocket like a response, so the tab shows
+            # it once (next to any streamed partial text)
+            print(f"Chatbot request failed: {e}")
+            send_event(client_id, "X-FluxAgent.chatbot.message", {
+                "message_id": message_id,
+                "user_message": user_message,
+                "error": str(e),
+                "streamed": stream,
+                "loading": False
+            })
+            return web.json_response({'status': 'error', 'error': str(e)})
+        finally:
+            admission.finish(job)
+        
+        # Send the response back to the client (the full text, also after streaming)
         print(f"Sending AI response: {ai_response[:100]}...")  # Log first 100 chars
-        PromptServer.instance.send_sync("X-FluxAgent.chatbot.message", {
+        send_event(client_id, "X-FluxAgent.chatbot.message", {
+            "message_id": message_id,
             "user_message": user_message,
             "ai_response": ai_response,
+            "streamed": stream,
             "timestamp": int(asyncio.get_event_loop().time() * 1000),  # Unix timestamp in milliseconds
             "loading": False
         })
@@ -155,9 +471,43 @@ async def on_message(request):
         print(f"Error in chatbot service: {e}")
         
         # Send error response
-        PromptServer.instance.send_sync("X-FluxAgent.chatbot.message", {
+        send_event(client_id, "X-FluxAgent.chatbot.message", {
             "error": str(e),
             "loading": False
         })
         
-        return web.json_response({'error': str(e)}, status=500)
\ No newline at end of file
+        return web.json_response({'error': str(e)}, status=500)
+
+
+@routes.get('/X-FluxAgent-chatbot-providers')
+async def get_providers(request):
+    """
+    List the LLM providers a chat session can use, and the default one
+    """
+    registry = get_provider_registry()
+    return web.json_response({
+        'providers': [provider.describe() for provider in registry.providers.values()],
+        'default': registry.default
+    })
+
+
+@routes.post('/X-FluxAgent-chatbot-cancel')
+async def on_cancel(request):
+    """
+    Cancel chatbot messages, waiting or in progress
+    
+    The body names the requesting "client_id" and either one "message_id"
+    or a "session_id" whose messages are all cancelled; the upstream LLM
+    requests are aborted. Clients can only cancel their own messages.
+    """
+    data = await request.json()
+    client_id, session_id = client_session(data)
+    if client_id is None:
+        return web.json_response({'error': 'client_id of a connected websocket client is required'}, status=400)
+    if data.get('message_id'):
+        cancelled = int(admission.cancel(str(data['message_id']), owner=client_id))
+    elif data.get('session_id'):
+        cancelled = admission.cancel_session(session_id)
+    else:
+        return web.json_response({'error': 'message_id or session_id is required'}, status=400)
+    return web.json_response({'status': 'success', 'cancelled': cancelled})
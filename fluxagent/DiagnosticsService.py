@@ -0,0 +1,29 @@
+from server import PromptServer
+from aiohttp import web
+
+from .utils import StartupProfiler
+from .utils import Metrics
+
+routes = PromptServer.instance.routes
+
+
+@routes.get('/X-FluxAgent-startup-report')
+async def get_startup_report(request):
+    """
+    Return the per-file import report of the last profiled startup
+    """
+    report = StartupProfiler.load_report()
+    if report is None:
+        return web.json_response({
+            'error': 'No startup report available, start ComfyUI with FLUXAGENT_PROFILE_STARTUP=1'
+        }, status=404)
+    return web.json_response(report)
+
+
+@routes.get('/X-FluxAgent-metrics')
+async def get_metrics(request):
+    """
+    Return the LLM traffic metrics in the Prometheus text format
+    """
+    return web.Response(text=Metrics.render(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Prometheus-Format-Version': '0.0.4'})
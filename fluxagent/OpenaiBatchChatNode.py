@@ -0,0 +1,180 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from .OpenaiChatNode import OpenAIChatnNode
+from .utils.LLMClient import routed_chat_completion, resolve_provider, extract_content, request_key, LLMError
+from .utils.ResponseCache import get_response_cache
+from .utils.Metrics import record_cache_lookup
+
+
+class OpenAIBatchChatNode:
+    """
+    A ComfyUI node that fans one system prompt out over many user messages.
+
+    The user messages come either as a list (from a list output upstream) or
+    as one STRING split by lines or JSONL. They are sent with bounded
+    concurrency over the shared connection pool, and the responses come back
+    in input order with per-item errors instead of failing the whole batch.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "optional": {
+                "system": ("STRING", {
+                    "forceInput": True,
+                }),
+                "cache": (["False", "True"], {"default": "False"}),
+                # LLM provider name, empty for the default
+                "provider": ("STRING", {
+                    "default": "",
+                    "multiline": False,
+                }),
+            },
+            "required": {
+                "model": ("STRING", {
+                    "default": "gpt-4.1",
+                    "multiline": False,
+                }),
+                "user": ("STRING", {
+                    "forceInput": True,
+                }),
+                # How a user STRING is split into messages
+                "split": (["lines", "jsonl", "none"], {"default": "lines"}),
+                "concurrency": ("INT", {
+                    "default": 8,
+                    "min": 1,
+                    "max": 64,
+                }),
+            },
+        }
+
+    # Every input arrives as a list, so a list of user messages is one batch
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("responses", "errors")
+    OUTPUT_IS_LIST = (True, True)
+    FUNCTION = "batch_chat_completion"
+    CATEGORY = "X-FluxAgent"
+
+    @staticmethod
+    def split_messages(user, split):
+        """
+        Turn the user input into batch items
+
+        Args:
+            user: List of user STRINGs
+            split: "lines", "jsonl" or "none"
+
+        Returns:
+            list: (user message, system override or None, parse error or None) tuples
+        """
+        items = []
+        for text in user:
+            if split == "none":
+                items.append((text, None, None))
+                continue
+            for line in text.splitlines():
+                if not line.strip():
+                    continue
+                if split == "lines":
+                    items.append((line, None, None))
+                    continue
+                # JSONL: a JSON string, or an object with "user" and optional "system"
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    items.append((None, None, f"Error: Invalid JSONL line: {e}"))
+                    continue
+                if not isinstance(record, dict):
+                    items.append((str(record), None, None))
+                    continue
+                record_user = record.get("user", record.get("content"))
+                record_system = record.get("system")
+                if not isinstance(record_user, (str, type(None))) or not isinstance(record_system, (str, type(None))):
+                    items.append((None, None, 'Error: JSONL "user" and "system" must be strings'))
+                    continue
+                items.append((record_user, record_system, None))
+        return items
+
+    def _complete(self, provider, model, user, system, cache):
+        """
+        Run one chat completion
+
+        Returns:
+            tuple: (response text, error message), one of them empty
+        """
+        if not user or not user.strip():
+            return ("", "Error: User message is empty!")
+
+        data = OpenAIChatnNode.build_request(model, user, system)
+        key = request_key(data, provider.chat_url) if cache else None
+        if key is not None:
+            cached_response = get_response_cache().get(key)
+            record_cache_lookup(model, "batch_node", cached_response is not None)
+            if cached_response is not None:
+                return (cached_response, "")
+
+        try:
+            assistant_response = extract_content(routed_chat_completion(provider, data, caller="batch_node"))
+        except LLMError as e:
+            return ("", str(e))
+        except Exception as e:
+            return ("", f"Error: {e}")
+
+        if assistant_response is None:
+            return ("", "Error: No response from API")
+        if key is not None:
+            get_response_cache().put(key, assistant_response)
+        return (assistant_response, "")
+
+    def batch_chat_completion(self, model, user, split, concurrency, system=None, cache=None, provider=None):
+        """
+        Call OpenAI chat completion API for every user message
+
+        Args:
+            model: The OpenAI model to use (list, first value used)
+            user: User messages (list)
+            split: How user STRINGs are split (list, first value used)
+            concurrency: Maximum requests in flight (list, first value used)
+            system: Optional system message (list, first value used)
+            cache: "True" to answer identical requests from the response cache
+            provider: LLM provider name, empty for the default one (list, first value used)
+
+        Returns:
+            Tuple of the responses and errors lists, in input order
+        """
+        provider = resolve_provider(provider[0] if provider else None)
+        provider.check_api_key()
+
+        model = model[0]
+        split = split[0]
+        concurrency = max(1, int(concurrency[0]))
+        system = system[0] if system else None
+        cache = bool(cache) and cache[0] == "True"
+
+        items = self.split_messages(user, split)
+        if not items:
+            raise ValueError("User message is empty!")
+
+        def run(item):
+            item_user, item_system, error = item
+            if error:
+                return ("", error)
+            return self._complete(provider, model, item_user, item_system or system, cache)
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(items))) as executor:
+            results = list(executor.map(run, items))
+
+        failed = sum(1 for _, error in results if error)
+        print(f"Batch chat completion: {len(results)} requests, {failed} failed")
+        return ([r for r, _ in results], [e for _, e in results])
+
+# Node registration
+NODE_CLASS_MAPPINGS = {
+    "X-FluxAgent.OpenAIBatchChatNode": OpenAIBatchChatNode
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "X-FluxAgent.OpenAIBatchChatNode": "OpenAI Batch Chat Node"
+}
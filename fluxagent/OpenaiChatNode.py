@@ -1,6 +1,9 @@
-import os
 import json
-import requests
+
+from .utils.LLMClient import async_routed_stream_chat_completion, resolve_provider, request_key, LLMError
+from .utils.NodeRunner import RequestProgress, run_interruptible
+from .utils.ResponseCache import get_response_cache
+from .utils.Metrics import record_cache_lookup
 
 
 class OpenAIChatnNode:
@@ -14,7 +17,14 @@ class OpenAIChatnNode:
             "optional": {
                 "system": ("STRING", {
                     "forceInput": True,
-                })
+                }),
+                # Reuse earlier responses to byte-identical requests (memory + disk)
+                "cache": (["False", "True"], {"default": "False"}),
+                # Provider from FLUXAGENT_LLM_PROVIDERS (openai, ollama, llamacpp, ...), empty for the default
+                "provider": ("STRING", {
+                    "default": "",
+                    "multiline": False,
+                }),
             },
             "required": {
                 "model": ("STRING", {
@@ -25,33 +35,29 @@ class OpenAIChatnNode:
                     "forceInput": True,
                 }),
             },
+            "hidden": {
+                "node_id": "UNIQUE_ID",
+            },
         }
     
     RETURN_TYPES = ("STRING",)
     RETURN_NAMES = ("string",)
     FUNCTION = "chat_completion"
     CATEGORY = "X-FluxAgent"
-    
-    def chat_completion(self, model, user, system=None):
+
+    @staticmethod
+    def build_request(model, user, system=None):
         """
-        Call OpenAI chat completion API
+        Build the chat completion request body
         
         Args:
             model: The OpenAI model to use
-            system: System message (from link input)
-            user: User message (from link input)
+            user: User message
+            system: Optional system message
             
         Returns:
-            Tuple containing the response text
+            dict: The request body
         """
-
-        #return ("Good!",)
-        
-        # Get API key from environment
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in .env file")
-        
         # Prepare the messages
         messages = []
         
@@ -61,9 +67,6 @@ class OpenAIChatnNode:
                 "role": "system",
                 "content": system
             })
-
-        if not user or not user.strip():
-            raise ValueError(f"User message is empty!")
         
         # Add user message if provided
         if user and user.strip():
@@ -72,52 +75,101 @@ class OpenAIChatnNode:
                 "content": user
             })
         
-        # API endpoint
-        url = "https://api.openai.com/v1/chat/completions"
-        
-        # Headers
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        
         # Request body
-        data = {
+        return {
             "model": model,
             "messages": messages
         }
-        
+
+    @classmethod
+    def IS_CHANGED(cls, model=None, user=None, system=None, cache="False", provider="", **kwargs):
+        """
+        With the cache enabled the node is identified by the content hash of its
+        request, so ComfyUI's own cache can skip it when the request is unchanged.
+        Linked inputs may not be resolved yet, in which case ComfyUI's input
+        signature decides as usual.
+        """
+        if cache != "True" or user is None:
+            return ""
         try:
-            # Make the API request
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            
-            # Parse the response
-            result = response.json()
-            
-            # Extract the assistant's response
-            if "choices" in result and len(result["choices"]) > 0:
-                assistant_response = result["choices"][0]["message"]["content"]
-                print(f"Assistant response: {assistant_response}")
-                return (assistant_response,)
-            else:
-                return ("Error: No response from API",)
-                
-        except requests.exceptions.HTTPError as e:
-            error_msg = f"HTTP Error: {e}"
-            if response.text:
-                try:
-                    error_details = response.json()
-                    error_msg += f"\nDetails: {error_details.get('error', {}).get('message', 'Unknown error')}"
-                except:
-                    error_msg += f"\nResponse: {response.text}"
-            return (error_msg,)
+            provider = resolve_provider(provider)
+        except ValueError:
+            # Reported when the node runs
+            return ""
+        return request_key(cls.build_request(model, user, system), provider.chat_url)
+    
+    @staticmethod
+    async def stream_response(provider, data, progress):
+        """
+        Stream the response, counting the received tokens in progress
+        
+        Args:
+            provider: The LLM provider
+            data: The request body
+            progress: RequestProgress of the node
             
-        except requests.exceptions.RequestException as e:
-            return (f"Request Error: {e}",)
+        Returns:
+            str: The complete response text
+        """
+        parts = []
+        async for delta in async_routed_stream_chat_completion(provider, data, caller="node"):
+            parts.append(delta)
+            # Each streamed delta carries about one token
+            progress.tokens += 1
+        return "".join(parts)
+
+    def chat_completion(self, model, user, system=None, cache="False", provider="", node_id=None):
+        """
+        Call OpenAI chat completion API
+        
+        Args:
+            model: The OpenAI model to use
+            system: System message (from link input)
+            user: User message (from link input)
+            cache: "True" to answer identical requests from the response cache
+            provider: LLM provider name, empty for the default one
+            node_id: Id of the node, for its progress text
             
-        except Exception as e:
-            return (f"Error: {e}",)
+        Returns:
+            Tuple containing the response text
+        """
+
+        #return ("Good!",)
+        
+        # Endpoint and API key of the provider, from the environment
+        provider = resolve_provider(provider)
+        provider.check_api_key()
+        
+        if not user or not user.strip():
+            raise ValueError(f"User message is empty!")
+        
+        data = self.build_request(model, user, system)
+
+        # Answer byte-identical requests from the cache
+        key = None
+        if cache == "True":
+            key = request_key(data, provider.chat_url)
+            cached_response = get_response_cache().get(key)
+            record_cache_lookup(model, "node", cached_response is not None)
+            if cached_response is not None:
+                print(f"Assistant response (cached): {cached_response}")
+                return (cached_response,)
+        
+        # Stream the response on the node request loop, joining an identical
+        # request already in flight and hedging to the provider's second
+        # endpoint when the first is slow. The executor polls for Cancel/
+        # Interrupt meanwhile, aborting the connection, and reports the tokens
+        # received; failures (after retries) raise LLMError so they never flow
+        # downstream as text
+        progress = RequestProgress(node_id)
+        assistant_response = run_interruptible(self.stream_response(provider, data, progress), progress)
+        if not assistant_response:
+            raise LLMError("Error: No response from API")
+        
+        print(f"Assistant response: {assistant_response}")
+        if key is not None:
+            get_response_cache().put(key, assistant_response)
+        return (assistant_response,)
 
 # Node registration
 NODE_CLASS_MAPPINGS = {
@@ -1,3 +1,7 @@
+from server import PromptServer
+
+from .utils.TextDelta import get_text_versions
+
 class RichTextNode:
     
     @classmethod
@@ -24,8 +28,21 @@ class RichTextNode:
     def process(self, text_input, node_id, rich_text = None):
         print(f"Processing text input for node_id: {node_id}")
         
+        # The ui result, which the prompt history keeps, only names the version:
+        # widgets fetch texts they do not show yet from /X-FluxAgent-rich-text.
+        # The client that queued the prompt is sent the change since the text
+        # it was last sent, so its widget edits the text in place
+        versions = get_text_versions()
+        client_id = PromptServer.instance.client_id
+        if client_id:
+            update = versions.update((client_id, str(node_id)), text_input)
+            PromptServer.instance.send_sync("X-FluxAgent.rich_text.update", {"node_id": node_id, "update": update}, client_id)
+            version = update["hash"]
+        else:
+            version = versions.put(text_input)
+        
         # data in ui is required to use array, node_id is a string, but it is number in js code
-        return {"ui": {"node_id":  [node_id], "rich_text": [text_input]}, "result": (text_input, )}
+        return {"ui": {"node_id":  [node_id], "rich_text_version": [versions.summary(text_input, version)]}, "result": (text_input, )}
 
 # Register the node
 NODE_CLASS_MAPPINGS = {
@@ -0,0 +1,50 @@
+from server import PromptServer
+from aiohttp import web
+
+from .utils.TextDelta import get_text_versions
+
+routes = PromptServer.instance.routes
+
+# Largest slice served at once, in characters
+MAX_SLICE_CHARS = 4 * 1024 * 1024
+
+
+@routes.get('/X-FluxAgent-rich-text')
+async def get_rich_text(request):
+    """
+    Serve a text kept for rich text nodes, for updates too large to travel
+    in the update event, for widgets that lost track (resync) and for the
+    versions named by ui results, including those replayed from the history
+
+    Query:
+        hash: Version to serve; without it, the one last sent to the client
+        client_id: The websocket client the update was sent to
+        node_id: The node
+        offset, limit: Slice of the text in characters; without them only
+            the version, its length and the slice size are returned
+    """
+    versions = get_text_versions()
+    node_id = request.query.get('node_id', '')
+    current = versions.current((request.query.get('client_id', ''), node_id))
+    version = request.query.get('hash')
+    if version is None:
+        if current is None:
+            return web.json_response({'error': f'No text for node {node_id}, run the node again'}, status=404)
+        version, text = current
+    else:
+        text = versions.get(version)
+
+    if 'offset' not in request.query:
+        if text is None:
+            return web.json_response({'error': f'Text {version} is no longer kept, run the node again'}, status=404)
+        return web.json_response(versions.summary(text, version))
+
+    if text is None:
+        # Dropped for newer texts since the update was sent
+        return web.json_response({'error': 'Text changed', 'hash': current[0] if current else None}, status=409)
+    try:
+        offset = max(0, int(request.query['offset']))
+        limit = min(MAX_SLICE_CHARS, max(0, int(request.query.get('limit', MAX_SLICE_CHARS))))
+    except ValueError:
+        return web.json_response({'error': 'offset and limit must be integers'}, status=400)
+    return web.json_response({'hash': version, 'text': text[offset:offset + limit]})
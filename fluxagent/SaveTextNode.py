@@ -1,6 +1,10 @@
 import os
+import json
+import datetime
 import folder_paths
 
+from .utils.FileWriter import get_file_writer, OutputFormat, compressed_path, COMPRESSIONS, DEFAULT_ROTATION_PATTERN
+
 class SaveTextNode:
     """
     A custom ComfyUI node that accepts a string input and saves it to a file on disk.
@@ -20,6 +24,15 @@ class SaveTextNode:
             },
             "optional": {
                 "subfolder": ("STRING", {"default": ""}),  # Optional subfolder within output directory
+                "output_format": (["text", "jsonl"], {"default": "text"}),  # jsonl: one JSON record per save, text plus metadata
+                "compression": (list(COMPRESSIONS), {"default": "none"}),  # Compress while writing, adds .gz / .zst to the filename
+                "rotate_size_mb": ("FLOAT", {"default": 0, "min": 0, "step": 1}),  # Start a new file past this size, 0 for never
+                "rotate_records": ("INT", {"default": 0, "min": 0}),  # Start a new file after this many saves (jsonl: lines), 0 for never
+                "rotate_pattern": ("STRING", {"default": DEFAULT_ROTATION_PATTERN}),  # Name of full files: {stem}, {ext}, {index}, {timestamp}
+                "metadata": ("STRING", {"default": "", "multiline": True}),  # JSON object added to each jsonl record
+            },
+            "hidden": {
+                "node_id": "UNIQUE_ID"
             }
         }
     
@@ -28,31 +41,66 @@ class SaveTextNode:
     CATEGORY = "X-FluxAgent"  # Category the node appears under in UI
     OUTPUT_NODE = True  # Indicates this is an output node
     
-    def save_string(self, text, filename, append, subfolder=""):
-        # Create the subfolder if provided and doesn't exist
-        if subfolder:
-            save_dir = os.path.join(self.output_dir, subfolder)
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
-        else:
-            save_dir = self.output_dir
+    def save_string(self, text, filename, append, subfolder="", output_format="text", compression="none",
+                    rotate_size_mb=0, rotate_records=0, rotate_pattern=DEFAULT_ROTATION_PATTERN, metadata="", node_id=None):
+        # Subfolders are created by the writer, once per directory
+        save_dir = os.path.join(self.output_dir, subfolder) if subfolder else self.output_dir
         
         # Full path to the file
-        file_path = os.path.join(save_dir, filename)
+        file_path = compressed_path(os.path.join(save_dir, filename), compression)
         
-        # Determine write mode (append or overwrite)
-        mode = "a" if append == "True" else "w"
+        if output_format == "jsonl":
+            text = self.build_record(text, metadata, node_id)
         
-        # Write the string to the file
+        # Appends are buffered and written in batches over a pooled handle,
+        # overwrites replace the file atomically
+        writer = get_file_writer()
         try:
-            with open(file_path, mode, encoding="utf-8") as f:
-                f.write(text)
-            print(f"Successfully saved string to {file_path}")
+            file_format = OutputFormat(
+                compression=compression,
+                max_bytes=int(rotate_size_mb * 1024 * 1024),
+                max_records=rotate_records,
+                pattern=rotate_pattern,
+                line_records=output_format == "jsonl",
+            )
+            if append == "True":
+                # Written by the writer's flush, which reports its own errors
+                writer.append(file_path, text, file_format)
+                print(f"Queued string to append to {file_path}")
+            else:
+                writer.write(file_path, text, file_format)
+                print(f"Successfully saved string to {file_path}")
         except Exception as e:
             print(f"Error saving string to file: {e}")
             
         # Return the file path
         return ()
+    
+    def build_record(self, text, metadata="", node_id=None):
+        """
+        Build a JSONL record of a text
+        
+        Args:
+            text: The text to save
+            metadata: JSON object whose fields are added to the record; other
+                values are stored under "metadata"
+            node_id: Id of the saving node
+            
+        Returns:
+            str: The record as one line of JSON, newline terminated
+        """
+        record = {
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "node_id": node_id,
+        }
+        if metadata.strip():
+            try:
+                extra = json.loads(metadata)
+            except ValueError:
+                extra = metadata
+            record.update(extra if isinstance(extra, dict) else {"metadata": extra})
+        record["text"] = text
+        return json.dumps(record, ensure_ascii=False) + "\n"
 
 # Register the node in ComfyUI
 NODE_CLASS_MAPPINGS = {
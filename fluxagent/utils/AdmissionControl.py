@@ -0,0 +1,148 @@
+"""
+Admission control for jobs running on the server event loop.
+
+At most max_running jobs run at once; up to max_waiting more wait in a FIFO
+queue, and each session may have at most max_per_session jobs in the system.
+Anything beyond that is refused up front with QueueFull instead of piling up.
+Every admitted job can be cancelled by id or by session, whether it is still
+waiting or already running; a job may name an owner, and then only that
+owner can cancel it by id.
+
+Must be used from the server event loop.
+"""
+
+import asyncio
+import contextlib
+from collections import deque
+
+
+class QueueFull(Exception):
+    """
+    A job was refused.
+
+    position is the place the job would have taken in the queue.
+    """
+
+    def __init__(self, message: str, position: int):
+        super().__init__(message)
+        self.position = position
+
+
+class Job:
+    """
+    An admitted job; task is the asyncio task running it.
+
+    queue_position is its place in line when admitted, 0 if a slot was free.
+    """
+
+    def __init__(self, job_id: str, session_id: str, queue_position: int, owner: str = None):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.owner = owner
+        self.queue_position = queue_position
+        self.task = None
+        self.cancel_reason = None
+
+    def cancel(self, reason: str):
+        if self.cancel_reason is not None:
+            return
+        self.cancel_reason = reason
+        if self.task is not None:
+            self.task.cancel()
+
+
+class AdmissionController:
+    """Bounded global and per-session job queue."""
+
+    def __init__(self, max_running: int, max_waiting: int, max_per_session: int):
+        self.max_running = max_running
+        self.max_waiting = max_waiting
+        self.max_per_session = max_per_session
+        self.running = 0
+        self._waiting = deque()  # (job, future) in arrival order
+        self._jobs = {}
+
+    def submit(self, job_id: str, session_id: str, supersede: bool = False, owner: str = None) -> Job:
+        """
+        Admit a job.
+
+        :param job_id: Unique id of the job.
+        :param session_id: Session the job belongs to.
+        :param supersede: Cancel the session's earlier jobs first.
+        :param owner: The only one allowed to cancel the job by id, None for anyone.
+        :return: The registered Job; run it inside slot() and call finish() at the end.
+        :raises QueueFull: If the session or the queue is full.
+        """
+        if supersede:
+            self.cancel_session(session_id, "Superseded by a newer message")
+
+        # Admitted jobs count from submit() on, before their task reaches slot()
+        active = [job for job in self._jobs.values() if job.cancel_reason is None]
+        in_session = sum(1 for job in active if job.session_id == session_id)
+        if in_session >= self.max_per_session:
+            raise QueueFull(f"Too many messages in progress ({in_session}), wait for them or cancel", position=in_session + 1)
+        position = max(0, len(active) - self.max_running + 1)
+        if position > self.max_waiting:
+            raise QueueFull("Chatbot is busy, try again shortly", position=position)
+
+        job = self._jobs[job_id] = Job(job_id, session_id, position, owner)
+        return job
+
+    @contextlib.asynccontextmanager
+    async def slot(self, job: Job):
+        """Wait for a running slot (FIFO) and hold it for the duration of the block."""
+        if self.running < self.max_running and not self._waiting:
+            self.running += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            entry = (job, future)
+            self._waiting.append(entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just before the cancellation
+                    self._release()
+                elif entry in self._waiting:
+                    self._waiting.remove(entry)
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        # Hand the slot to the first live waiter, keeping running unchanged
+        while self._waiting:
+            _, future = self._waiting.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def finish(self, job: Job):
+        self._jobs.pop(job.job_id, None)
+
+    def cancel(self, job_id: str, reason: str = "Cancelled", owner: str = None) -> bool:
+        """
+        Cancel one job.
+
+        :param owner: Who asks; a job with an owner is only cancelled by it.
+        :return: Whether the job was found (and allowed to be cancelled).
+        """
+        job = self._jobs.get(job_id)
+        if job is None or (job.owner is not None and job.owner != owner):
+            return False
+        job.cancel(reason)
+        return True
+
+    def cancel_session(self, session_id: str, reason: str = "Cancelled") -> int:
+        """Cancel every job of a session, return how many were cancelled."""
+        jobs = [job for job in self._jobs.values() if job.session_id == session_id and job.cancel_reason is None]
+        for job in jobs:
+            job.cancel(reason)
+        return len(jobs)
@@ -0,0 +1,234 @@
+"""
+Content hashed, precompressed copies of the extension's frontend assets.
+
+Every asset is copied under a name carrying the hash of its content
+(codemirror_bundle.<hash>.js), next to gzip and, when the brotli package is
+installed, brotli variants compressed once at the highest level. A hashed
+name never changes content, so browsers may keep it for a year and send no
+request at all; the manifest mapping asset names to hashed names is the
+only thing they revalidate. Assets are rebuilt when their source changes,
+built variants are kept on disk so a restart does not compress them again.
+
+The CodeMirror bundle lives outside WEB_DIRECTORY so ComfyUI does not load
+it with the extension scripts; the rich text widget imports it from here
+the first time an editor is shown. Minification is done by the bundler,
+see libs/codemirror/package.json.
+
+Configuration (.env):
+
+    FLUXAGENT_ASSET_GZIP_LEVEL      gzip level of the precompressed variants (9)
+    FLUXAGENT_ASSET_BROTLI_QUALITY  brotli quality of the precompressed variants (11)
+"""
+
+import os
+import gzip
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from .Paths import EXTENSION_DIR, default_cache_dir
+from .Env import env_int
+
+# Asset name -> source path relative to the extension directory. Only what
+# the frontend imports from /X-FluxAgent-assets/, the extension scripts are
+# served by ComfyUI from WEB_DIRECTORY
+ASSET_SOURCES = {
+    "codemirror_bundle.js": "libs/codemirror/dist/codemirror_bundle.js",
+}
+
+CONTENT_TYPES = {".js": "text/javascript", ".css": "text/css", ".json": "application/json"}
+
+# Encodings in order of preference, with the suffix of their files
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class Asset(namedtuple("Asset", "name hashed_name digest content_type variants source_state")):
+    """
+    One built asset. variants maps an encoding ("identity", "gzip", "br")
+    to its bytes; source_state is the (mtime_ns, size) it was built from.
+    """
+
+    def etag(self, encoding: str) -> str:
+        # Strong validators differ between representations
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.digest[:32]}{suffix}"'
+
+
+def hashed_name(name: str, digest: str) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:16]}{ext}"
+
+
+class AssetBundle:
+    """Thread safe set of built assets, rebuilt one by one as their sources change."""
+
+    def __init__(self, sources: dict, root_dir: str, out_dir: str = None,
+                 gzip_level: int = 9, brotli_quality: int = 11):
+        """
+        :param sources: Asset name -> source path relative to root_dir.
+        :param root_dir: Directory the source paths are relative to.
+        :param out_dir: Directory of the built variants, None to keep them in memory only.
+        :param gzip_level: gzip compression level.
+        :param brotli_quality: brotli quality, used when the brotli package is installed.
+        """
+        self.sources = dict(sources)
+        self.root_dir = root_dir
+        self.out_dir = out_dir
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._assets = {}  # asset name -> Asset
+        self._hashed = {}  # hashed name -> Asset
+        self._lock = threading.Lock()
+
+    def refresh(self) -> dict:
+        """
+        Rebuild the assets whose source changed since they were built.
+
+        :return: The assets by name.
+        """
+        with self._lock:
+            for name, rel_path in self.sources.items():
+                path = os.path.join(self.root_dir, rel_path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                state = (stat.st_mtime_ns, stat.st_size)
+                asset = self._assets.get(name)
+                if asset is not None and asset.source_state == state:
+                    continue
+                try:
+                    asset = self._build(name, path, state)
+                except OSError as e:
+                    print(f"Warning: Could not build asset {name}: {e}")
+                    continue
+                self._assets[name] = asset
+                # Older hashed names keep being served to pages loaded before the change
+                self._hashed[asset.hashed_name] = asset
+            return dict(self._assets)
+
+    def manifest(self) -> dict:
+        """Asset name -> hashed name, digest and size of each variant."""
+        return {
+            name: {
+                "file": asset.hashed_name,
+                "digest": asset.digest,
+                "sizes": {encoding: len(data) for encoding, data in asset.variants.items()},
+            }
+            for name, asset in self.refresh().items()
+        }
+
+    def lookup(self, file_name: str):
+        """
+        Find an asset by hashed name or by plain name.
+
+        :param file_name: Name requested.
+        :return: (asset, immutable) where immutable tells a hashed name, or (None, False).
+        """
+        with self._lock:
+            asset = self._hashed.get(file_name)
+        if asset is None:
+            # Nothing built yet, or the name of a source changed since
+            assets = self.refresh()
+            with self._lock:
+                asset = self._hashed.get(file_name)
+            if asset is None:
+                return assets.get(file_name), False
+        return asset, True
+
+    def _build(self, name: str, path: str, state) -> Asset:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        built_name = hashed_name(name, digest)
+        variants = {"identity": data}
+        for encoding, suffix in ENCODINGS:
+            compressed = self._variant(built_name + suffix, encoding, data)
+            # Tiny files can grow when compressed
+            if compressed is not None and len(compressed) < len(data):
+                variants[encoding] = compressed
+        content_type = CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+        return Asset(name, built_name, digest, content_type, variants, state)
+
+    def _variant(self, file_name: str, encoding: str, data: bytes):
+        if encoding == "br" and brotli is None:
+            return None
+        cached = None if self.out_dir is None else os.path.join(self.out_dir, file_name)
+        if cached is not None:
+            try:
+                with open(cached, "rb") as f:
+                    return f.read()
+            except OSError:
+                pass
+
+        if encoding == "br":
+            compressed = brotli.compress(data, quality=self.brotli_quality)
+        else:
+            # No timestamp, the same input always gives the same bytes
+            compressed = gzip.compress(data, self.gzip_level, mtime=0)
+
+        if cached is not None:
+            temp_path = None
+            try:
+                os.makedirs(self.out_dir, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=self.out_dir)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(compressed)
+                os.replace(temp_path, cached)
+            except OSError as e:
+                print(f"Warning: Could not store built asset {cached}: {e}")
+                if temp_path is not None and os.path.exists(temp_path):
+                    os.unlink(temp_path)
+        return compressed
+
+
+def choose_encoding(accept_encoding: str, asset: Asset) -> str:
+    """
+    Pick the variant of an asset for a request's Accept-Encoding header.
+
+    :param accept_encoding: The header, "" when missing.
+    :param asset: The asset.
+    :return: "br", "gzip" or "identity".
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding] = quality
+    for encoding, _ in ENCODINGS:
+        if encoding in asset.variants and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+_bundle = None
+_bundle_lock = threading.Lock()
+
+
+def get_asset_bundle() -> AssetBundle:
+    """Return the process-wide AssetBundle, creating it on first use. Assets are built on first access."""
+    global _bundle
+    if _bundle is None:
+        with _bundle_lock:
+            if _bundle is None:
+                _bundle = AssetBundle(
+                    ASSET_SOURCES,
+                    EXTENSION_DIR,
+                    os.path.join(default_cache_dir(), "assets"),
+                    gzip_level=env_int("FLUXAGENT_ASSET_GZIP_LEVEL", 9),
+                    brotli_quality=env_int("FLUXAGENT_ASSET_BROTLI_QUALITY", 11),
+                )
+    return _bundle
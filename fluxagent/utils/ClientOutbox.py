@@ -0,0 +1,109 @@
+"""
+Bounded per-client queues for websocket events.
+
+Events for one client are queued in its ClientOutbox and written by a sender
+task of its own, so a slow browser only delays its own events. Each queue is
+bounded; when it is full the oldest droppable event goes first. Events that
+are not droppable (final responses, errors) are never dropped, the queue
+grows past its bound for them instead. Events can
+also be coalesced: a new event with the same coalesce key as one still waiting
+replaces it (or is merged into it), e.g. the latest loading state or the
+streamed text of one message.
+
+Must be used from the server event loop.
+"""
+
+import asyncio
+from collections import deque
+
+
+class _Item:
+    __slots__ = ("event", "data", "key", "droppable")
+
+    def __init__(self, event, data, key, droppable):
+        self.event = event
+        self.data = data
+        self.key = key
+        self.droppable = droppable
+
+
+class ClientOutbox:
+    """Outbound event queue of one websocket client."""
+
+    def __init__(self, sid: str, send, max_items: int, on_idle=None):
+        """
+        :param sid: The client id events are sent to.
+        :param send: Coroutine function send(event, data, sid).
+        :param max_items: Events kept waiting before droppable ones are dropped.
+        :param on_idle: Called when the queue has been drained.
+        """
+        self.sid = sid
+        self.send = send
+        self.max_items = max_items
+        self.on_idle = on_idle
+        self.dropped = 0
+        self._items = deque()
+        self._task = None
+
+    def put(self, event: str, data: dict, coalesce_key=None, merge=None, droppable: bool = False):
+        """
+        Queue an event.
+
+        :param event: Event name.
+        :param data: Event payload.
+        :param coalesce_key: Events with the same key replace each other while waiting.
+        :param merge: Optional merge(queued_data, data) -> data used instead of replacing.
+        :param droppable: The event may be dropped when the queue is full.
+        """
+        if coalesce_key is not None:
+            for item in self._items:
+                if item.key == coalesce_key:
+                    item.data = merge(item.data, data) if merge else data
+                    return
+
+        if len(self._items) >= self.max_items:
+            victim = next((item for item in self._items if item.droppable), None)
+            if victim is not None:
+                self._items.remove(victim)
+                self.dropped += 1
+                if self.dropped == 1:
+                    print(f"Warning: Client {self.sid} is not keeping up, dropping events")
+
+        self._items.append(_Item(event, data, coalesce_key, droppable))
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self):
+        try:
+            while self._items:
+                item = self._items.popleft()
+                try:
+                    await self.send(item.event, item.data, self.sid)
+                except Exception as e:
+                    print(f"Warning: Failed to send {item.event} to client {self.sid}: {e}")
+        finally:
+            self._task = None
+            if self._items:
+                # Cancelled with events left: they are dropped with the outbox
+                self._items.clear()
+            if self.on_idle is not None:
+                self.on_idle(self)
+
+
+class ClientOutboxes:
+    """Outboxes by client id, kept only while they have events waiting."""
+
+    def __init__(self, send, max_items: int):
+        self.send = send
+        self.max_items = max_items
+        self._outboxes = {}
+
+    def get(self, sid: str) -> ClientOutbox:
+        outbox = self._outboxes.get(sid)
+        if outbox is None:
+            outbox = self._outboxes[sid] = ClientOutbox(sid, self.send, self.max_items, on_idle=self._release)
+        return outbox
+
+    def _release(self, outbox: ClientOutbox):
+        if self._outboxes.get(outbox.sid) is outbox:
+            del self._outboxes[outbox.sid]
@@ -0,0 +1,130 @@
+"""
+Cache of compiled code for the Python that AICodeGenNode runs.
+
+Sources are keyed by a SHA-256 of their text and compiled once: code
+objects are kept in an in-memory LRU and persisted as marshalled bytecode
+under the ComfyUI user directory, so neither a new run nor a restarted
+server (or a worker process) parses the same code again. Persisted files
+carry the interpreter's bytecode magic number and are ignored by other
+Python versions.
+
+Configuration (.env):
+
+    FLUXAGENT_CODE_CACHE_ENTRIES  code objects kept in memory (256)
+    FLUXAGENT_CODE_CACHE_DISK     1 to persist the bytecode (1)
+"""
+
+import os
+import marshal
+import hashlib
+import tempfile
+import threading
+import importlib.util
+from collections import OrderedDict
+
+from .Paths import default_cache_dir
+from .Env import env_int
+
+
+def source_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+class CodeCache:
+    """Thread safe two tier cache of code objects."""
+
+    def __init__(self, max_entries: int, cache_dir: str = None):
+        """
+        :param max_entries: Code objects kept in memory.
+        :param cache_dir: Directory of the persisted bytecode, None to keep it in memory only.
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()  # (source hash, filename) -> code object
+        self._lock = threading.Lock()
+
+    def compile(self, source: str, filename: str = "<generated>"):
+        """
+        Compile source for exec(), or return the code compiled earlier.
+
+        :param source: Python source.
+        :param filename: Name shown in tracebacks.
+        :return: The code object.
+        :raises SyntaxError: If the source does not compile.
+        """
+        digest = source_hash(source)
+        key = (digest, filename)
+        with self._lock:
+            code = self._entries.get(key)
+            if code is not None:
+                self._entries.move_to_end(key)
+                return code
+
+        code = self._load(digest, filename)
+        if code is None:
+            code = compile(source, filename, "exec", dont_inherit=True)
+            self._save(digest, filename, code)
+
+        with self._lock:
+            self._entries[key] = code
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return code
+
+    def _path(self, digest: str, filename: str) -> str:
+        # The filename is compiled into the code object, so it is part of the key
+        name = hashlib.sha256(f"{digest}\0{filename}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], name + ".bin")
+
+    def _load(self, digest: str, filename: str):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(digest, filename), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        magic = importlib.util.MAGIC_NUMBER
+        if not data.startswith(magic):
+            return None
+        try:
+            return marshal.loads(data[len(magic):])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def _save(self, digest: str, filename: str, code):
+        if self.cache_dir is None:
+            return
+        path = self._path(digest, filename)
+        temp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not persist compiled code to {path}: {e}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_code_cache() -> CodeCache:
+    """Return the process-wide CodeCache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache_dir = None
+                if os.getenv("FLUXAGENT_CODE_CACHE_DISK", "1") == "1":
+                    cache_dir = os.path.join(default_cache_dir(), "code")
+                _cache = CodeCache(env_int("FLUXAGENT_CODE_CACHE_ENTRIES", 256), cache_dir)
+    return _cache
@@ -0,0 +1,310 @@
+"""
+Pool of warm worker processes that run the code of AICodeGenNode.
+
+Running generated code is off unless FLUXAGENT_SANDBOX_ENABLED=1: the
+workers contain mistakes, not attacks. Generated code never runs in the
+ComfyUI server process: a fault, a leak or a runaway loop costs a worker,
+not the server. Starting an interpreter for every run would cost hundreds
+of milliseconds, so workers are started on the first run with the common
+modules already imported, and serve many runs each.
+
+Every run has a wall timeout, after which the worker is killed, and a CPU
+time limit. Every worker has limits on its memory, on the size of the files
+it writes and on its open files (all of these apply on POSIX only). It runs
+in an empty temporary directory of its own, with an environment holding
+only PATH and the locale (no API keys), and on Linux it leaves the network
+where user namespaces allow it. It can still read every file the server's
+user can, and write where that user can write; this is not a security
+boundary for untrusted code.
+
+Workers are replaced after a number of runs, when they crash and when a
+limit stopped them. Code is compiled once through the CodeCache and sent
+to each worker as bytecode once. Inputs and outputs are pickled with
+protocol 5, large ones travel through shared memory, see SandboxWorker.py.
+
+Configuration (.env):
+
+    FLUXAGENT_SANDBOX_ENABLED       1 to run generated code at all (0)
+    FLUXAGENT_SANDBOX_WORKERS       worker processes, at least 1 (2)
+    FLUXAGENT_SANDBOX_MAX_RUNS      runs before a worker is replaced, 0 for no limit (100)
+    FLUXAGENT_SANDBOX_TIMEOUT       wall time limit of a run in seconds (60)
+    FLUXAGENT_SANDBOX_CPU_SECONDS   CPU time limit of a run in seconds, 0 for none (60)
+    FLUXAGENT_SANDBOX_MEMORY_MB     address space limit of a worker, 0 for none (4096)
+    FLUXAGENT_SANDBOX_FILE_MB       largest file a worker may write, 0 for no limit (256)
+    FLUXAGENT_SANDBOX_NETWORK       1 to leave the workers on the network (0)
+    FLUXAGENT_SANDBOX_PRELOAD       modules imported by workers on start (json,math,re,random,...,numpy)
+    FLUXAGENT_SANDBOX_SHM_BYTES     smallest payload passed through shared memory (1048576)
+"""
+
+import os
+import sys
+import json
+import queue
+import shutil
+import atexit
+import marshal
+import tempfile
+import threading
+import subprocess
+
+from .CodeCache import get_code_cache, source_hash
+from .SandboxWorker import read_frame, write_frame, dump_payload, load_payload, release
+from .Env import env_float, env_int
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SandboxWorker.py")
+
+DEFAULT_PRELOAD = "json,math,re,random,itertools,functools,collections,datetime,string,numpy"
+
+# Time a new worker gets to import the preloaded modules
+START_TIMEOUT = 60
+
+# Variables passed on to workers, what the interpreter and the locale need
+WORKER_ENV = ("PATH", "SYSTEMROOT", "LANG", "LC_ALL", "LC_CTYPE")
+
+
+class SandboxError(Exception):
+    """A run failed: the code raised, hit a limit, or its worker died."""
+
+
+def _worker_env(directory: str) -> dict:
+    """Environment of a worker: nothing of the server's but WORKER_ENV, home and temp in its directory."""
+    env = {name: os.environ[name] for name in WORKER_ENV if name in os.environ}
+    env.update(HOME=directory, TMPDIR=directory, TEMP=directory, TMP=directory, PYTHONDONTWRITEBYTECODE="1")
+    return env
+
+
+class _Worker:
+    """One worker process, its working directory and the thread reading its replies."""
+
+    def __init__(self, config: dict):
+        self.runs = 0
+        self.codes = set()  # code keys the worker has received
+        self.ready = False
+        self.replies = queue.Queue()
+        self.directory = tempfile.mkdtemp(prefix="fluxagent-sandbox-")
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, WORKER_SCRIPT, json.dumps(config)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=self.directory,
+                env=_worker_env(self.directory),
+            )
+        except BaseException:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            raise
+        self._reader = threading.Thread(target=self._read, name="FluxAgentSandboxReader", daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        try:
+            while True:
+                message = read_frame(self.process.stdout)
+                self.replies.put(message)
+                if message is None:
+                    return
+        except Exception as e:
+            self.replies.put(("error", type(e).__name__, str(e), "", True))
+
+    def _reply(self, timeout: float, waiting_for: str):
+        try:
+            reply = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            self.kill()
+            raise SandboxError(f"{waiting_for} did not finish within {timeout:g}s and was stopped") from None
+        if reply is None:
+            code = self.process.wait()
+            raise SandboxError(f"Sandbox worker exited with code {code}")
+        return reply
+
+    def request(self, message, timeout: float):
+        """
+        Send a message and wait for the reply.
+
+        :param message: The message.
+        :param timeout: Seconds to wait, the worker is killed afterwards.
+        :return: The reply.
+        :raises SandboxError: If the worker died or did not answer in time.
+        """
+        if not self.ready:
+            ready = self._reply(START_TIMEOUT, "Sandbox worker start")
+            if ready[0] != "ready":
+                self.kill()
+                raise SandboxError(f"Sandbox worker did not start: {ready[1]}: {ready[2]}")
+            # ("ready", pid, preloaded modules, whether the worker left the network)
+            if ready[3] is False:
+                _warn_network_once()
+            self.ready = True
+        try:
+            write_frame(self.process.stdin, message)
+        except OSError as e:
+            self.kill()
+            raise SandboxError(f"Sandbox worker is gone: {e}") from None
+        return self._reply(timeout, "Code")
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stop(self, timeout: float = 2):
+        # Closing stdin ends the worker's loop
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        self.kill()
+
+
+_network_warned = False
+
+
+def _warn_network_once():
+    global _network_warned
+    if not _network_warned:
+        _network_warned = True
+        print("Warning: Sandbox workers could not leave the network (needs Linux user namespaces), "
+              "generated code can open connections")
+
+
+class CodeSandbox:
+    """Fixed size pool of worker processes running code one run per worker at a time."""
+
+    def __init__(self, enabled: bool, workers: int, max_runs: int, timeout: float, cpu_seconds: float,
+                 memory_mb: int, preload, shm_threshold: int, file_mb: int = 0, network: bool = False):
+        """
+        :param enabled: Whether code may run at all.
+        :param workers: Worker processes, at least 1.
+        :param max_runs: Runs before a worker is replaced, 0 for no limit.
+        :param timeout: Default wall time limit of a run in seconds.
+        :param cpu_seconds: CPU time limit of a run in seconds, 0 for none.
+        :param memory_mb: Address space limit of a worker in MB, 0 for none.
+        :param preload: Modules imported by a worker when it starts.
+        :param shm_threshold: Smallest payload in bytes passed through shared memory.
+        :param file_mb: Largest file a worker may write in MB, 0 for no limit.
+        :param network: Leave the workers on the network.
+        """
+        self.enabled = enabled
+        self.workers = workers
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.shm_threshold = shm_threshold
+        self.config = {"preload": list(preload), "memory_mb": memory_mb, "shm_threshold": shm_threshold,
+                       "file_mb": file_mb, "isolate_network": not network}
+        self._idle = queue.Queue()
+        self._started = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the workers, if they are not running yet. Returns without waiting for them."""
+        if self._started or not self.enabled or self.workers <= 0:
+            return
+        with self._lock:
+            if self._started or self._closed:
+                return
+            for _ in range(self.workers):
+                self._idle.put(_Worker(self.config))
+            self._started = True
+
+    def run(self, source: str, filename: str, inputs: dict, output_names, timeout: float = None) -> tuple:
+        """
+        Execute code with the inputs as variables and read the outputs back.
+
+        :param source: Python source.
+        :param filename: Name shown in tracebacks.
+        :param inputs: Variable name -> value, values must be picklable.
+        :param output_names: Variables read after the run.
+        :param timeout: Wall time limit in seconds, None for the default.
+        :return: Tuple of the output values, None for unset variables.
+        :raises SyntaxError: If the source does not compile.
+        :raises SandboxError: If running code is disabled or the run failed.
+        """
+        if not self.enabled:
+            raise SandboxError("Running generated code is disabled, set FLUXAGENT_SANDBOX_ENABLED=1 in .env "
+                               "to run it in sandbox worker processes")
+        if self.workers <= 0:
+            raise SandboxError("No sandbox workers configured, FLUXAGENT_SANDBOX_WORKERS must be at least 1")
+
+        code = get_code_cache().compile(source, filename)
+        key = (source_hash(source), filename)
+        try:
+            payload, block = dump_payload(inputs, self.shm_threshold)
+        except Exception as e:
+            raise SandboxError(f"Inputs cannot be passed to the sandbox: {e}") from None
+
+        self.start()
+        if self._closed:
+            release(block)
+            raise SandboxError("Sandbox is shut down")
+        worker = self._idle.get()
+        retire = True
+        try:
+            code_bytes = None if key in worker.codes else marshal.dumps(code)
+            message = ("run", key, code_bytes, payload, list(output_names), self.cpu_seconds)
+            reply = worker.request(message, self.timeout if timeout is None else timeout)
+            worker.codes.add(key)
+            worker.runs += 1
+            if reply[0] == "error":
+                _, name, error, text, fatal = reply
+                retire = fatal
+                raise SandboxError(f"{name}: {error}\n{text}".rstrip())
+            retire = False
+            return load_payload(reply[1])
+        finally:
+            release(block)
+            self._checkin(worker, retire)
+
+    def _checkin(self, worker: _Worker, retire: bool):
+        if retire or not worker.alive() or (self.max_runs > 0 and worker.runs >= self.max_runs):
+            # Replaced right away, the new worker warms up while the old one exits
+            with self._lock:
+                replacement = None if self._closed else _Worker(self.config)
+            worker.stop()
+            if replacement is None:
+                return
+            worker = replacement
+        self._idle.put(worker)
+
+    def shutdown(self):
+        """Stop the idle workers; busy ones are stopped when their run ends."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+_sandbox = None
+_sandbox_lock = threading.Lock()
+
+
+def get_code_sandbox() -> CodeSandbox:
+    """Return the process-wide CodeSandbox, creating it on first use. Workers start on the first run."""
+    global _sandbox
+    if _sandbox is None:
+        with _sandbox_lock:
+            if _sandbox is None:
+                preload = os.getenv("FLUXAGENT_SANDBOX_PRELOAD", DEFAULT_PRELOAD)
+                _sandbox = CodeSandbox(
+                    enabled=os.getenv("FLUXAGENT_SANDBOX_ENABLED", "0") == "1",
+                    workers=env_int("FLUXAGENT_SANDBOX_WORKERS", 2),
+                    max_runs=env_int("FLUXAGENT_SANDBOX_MAX_RUNS", 100),
+                    timeout=env_float("FLUXAGENT_SANDBOX_TIMEOUT", 60),
+                    cpu_seconds=env_float("FLUXAGENT_SANDBOX_CPU_SECONDS", 60),
+                    memory_mb=env_int("FLUXAGENT_SANDBOX_MEMORY_MB", 4096),
+                    preload=[name.strip() for name in preload.split(",") if name.strip()],
+                    shm_threshold=env_int("FLUXAGENT_SANDBOX_SHM_BYTES", 1024 * 1024),
+                    file_mb=env_int("FLUXAGENT_SANDBOX_FILE_MB", 256),
+                    network=os.getenv("FLUXAGENT_SANDBOX_NETWORK", "0") == "1",
+                )
+                atexit.register(_sandbox.shutdown)
+    return _sandbox
@@ -0,0 +1,148 @@
+"""
+Per-session conversation memory for the chatbot.
+
+Each chat session keeps its recent messages in a bounded deque together with
+their estimated token counts (Tokenizer). A prompt is assembled from the
+system message, an optional rolling summary of older messages, as many of the
+most recent messages as fit in the token budget (sliding window) and the new
+user message, so prompt size stays flat however long the conversation gets.
+
+With summaries enabled, once the stored history outgrows the budget the
+oldest messages are folded into the session's summary by a background LLM
+call and dropped.
+
+Sessions live in memory on the server event loop, bounded by count and idle
+time. Configuration (.env):
+
+    FLUXAGENT_CHAT_CONTEXT_TOKENS   prompt budget for summary, history and new message (4000)
+    FLUXAGENT_CHAT_MAX_MESSAGES     messages kept per session (200)
+    FLUXAGENT_CHAT_MAX_SESSIONS     sessions kept (256)
+    FLUXAGENT_CHAT_SESSION_TTL      seconds an idle session is kept (86400)
+    FLUXAGENT_CHAT_SUMMARY          1 to keep a rolling summary of older messages (0)
+"""
+
+import os
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from .Tokenizer import count_tokens, count_message_tokens, count_messages_tokens
+from .Env import env_float, env_int
+
+Message = namedtuple("Message", ["role", "content", "tokens"])
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below for your own future reference. Keep facts, "
+    "decisions, names, code identifiers and open questions. Be concise."
+)
+
+
+class Conversation:
+    """The stored history of one chat session."""
+
+    def __init__(self, max_messages: int):
+        self.messages = deque(maxlen=max_messages)
+        self.summary = ""
+        self.summarizing = False
+        # LLM provider name chosen for the session, None for the default
+        self.provider = None
+        self.last_used = time.monotonic()
+
+    def add(self, role: str, content: str):
+        self.messages.append(Message(role, content, count_message_tokens({"content": content})))
+
+    def build_messages(self, system_message: str, user_message: str, budget: int) -> list:
+        """
+        Assemble the chat messages of the next request.
+
+        :param system_message: The system prompt.
+        :param user_message: The new user message, always included.
+        :param budget: Prompt token budget the history is fitted into.
+        :return: The messages list for the request.
+        """
+        head = [{"role": "system", "content": system_message}]
+        if self.summary:
+            head.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        tail = [{"role": "user", "content": user_message}]
+
+        used = count_messages_tokens(head + tail)
+        window = []
+        for message in reversed(self.messages):
+            if used + message.tokens > budget:
+                break
+            window.append({"role": message.role, "content": message.content})
+            used += message.tokens
+        window.reverse()
+        return head + window + tail
+
+    def messages_to_fold(self, budget: int) -> list:
+        """
+        Oldest messages to fold into the summary once the history outgrows budget.
+
+        Folds down to half the budget, so a summary is not rewritten every
+        turn, but always keeps the latest exchange verbatim.
+        """
+        total = sum(message.tokens for message in self.messages) + count_tokens(self.summary)
+        if total <= budget:
+            return []
+        folded = []
+        for message in list(self.messages)[:-2]:
+            if total <= budget // 2:
+                break
+            folded.append(message)
+            total -= message.tokens
+        return folded
+
+    def summary_request_messages(self, folded: list) -> list:
+        """Chat messages asking for the new rolling summary."""
+        transcript = "\n\n".join(f"{message.role}: {message.content}" for message in folded)
+        if self.summary:
+            transcript = f"Summary so far:\n{self.summary}\n\nContinued conversation:\n{transcript}"
+        return [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": transcript},
+        ]
+
+    def fold(self, folded: list, summary: str):
+        """Replace the folded messages by the new summary."""
+        folded_ids = {id(message) for message in folded}
+        while self.messages and id(self.messages[0]) in folded_ids:
+            self.messages.popleft()
+        self.summary = summary
+
+
+class ConversationStore:
+    """
+    Bounded map of session id to Conversation.
+
+    Only used from the server event loop, so it needs no locking.
+    """
+
+    def __init__(self):
+        self.context_tokens = env_int("FLUXAGENT_CHAT_CONTEXT_TOKENS", 4000)
+        self.max_messages = env_int("FLUXAGENT_CHAT_MAX_MESSAGES", 200)
+        self.max_sessions = env_int("FLUXAGENT_CHAT_MAX_SESSIONS", 256)
+        self.session_ttl = env_float("FLUXAGENT_CHAT_SESSION_TTL", 86400)
+        self.summary_enabled = os.getenv("FLUXAGENT_CHAT_SUMMARY", "0") == "1"
+        self._sessions = OrderedDict()
+
+    def get(self, session_id: str) -> Conversation:
+        """Return the conversation of a session, starting a new one if needed."""
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used < self.session_ttl:
+                break
+            self._sessions.popitem(last=False)
+
+        conversation = self._sessions.get(session_id)
+        if conversation is None:
+            conversation = self._sessions[session_id] = Conversation(self.max_messages)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        conversation.last_used = now
+        return conversation
+
+    def clear(self, session_id: str):
+        self._sessions.pop(session_id, None)
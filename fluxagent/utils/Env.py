@@ -0,0 +1,37 @@
+"""
+Typed reads of FluxAgent's environment settings (.env).
+
+A malformed value must not stop the extension from loading, so it is
+reported and the default is used instead.
+"""
+
+import os
+
+
+def _env_number(name: str, default, parse):
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return parse(value.strip())
+    except ValueError:
+        print(f"Warning: Invalid {name}={value!r}, using the default {default}")
+        return default
+
+
+def env_int(name: str, default: int) -> int:
+    """
+    :param name: Environment variable name.
+    :param default: Value when the variable is unset, empty or not an integer.
+    :return: The integer value.
+    """
+    return _env_number(name, default, int)
+
+
+def env_float(name: str, default: float) -> float:
+    """
+    :param name: Environment variable name.
+    :param default: Value when the variable is unset, empty or not a number.
+    :return: The float value.
+    """
+    return _env_number(name, default, float)
@@ -0,0 +1,240 @@
+"""
+Watch directory trees for changed Python files.
+
+On Linux the kernel reports changes through inotify, so the cost of a
+change does not depend on how many files are watched; elsewhere, or when
+inotify is unavailable, the trees are rescanned at an interval. Changes are
+debounced: the callback receives every path changed in a burst (an editor
+saving through a temporary file, a generator writing many nodes) once the
+burst has been quiet for the debounce time.
+
+Configuration (.env):
+
+    FLUXAGENT_HOT_RELOAD_BACKEND      auto, inotify or poll (auto)
+    FLUXAGENT_HOT_RELOAD_DEBOUNCE_MS  quiet time before changes are reported (300)
+    FLUXAGENT_HOT_RELOAD_POLL_MS      rescan interval of the poll backend (1000)
+"""
+
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+import threading
+
+from .Env import env_int
+
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT = struct.Struct("iIII")
+
+# Directories never watched
+IGNORED_DIRS = {"__pycache__", ".git", ".cache"}
+
+
+def is_watched_file(name: str) -> bool:
+    # Editors' lock and backup files start with a dot
+    return name.endswith(".py") and not name.startswith(".")
+
+
+def _walk_dirs(root: str):
+    for dir_path, dir_names, _ in os.walk(root):
+        dir_names[:] = [name for name in dir_names if name not in IGNORED_DIRS]
+        yield dir_path
+
+
+class _InotifyBackend:
+    """Changed paths from inotify, one watch per directory."""
+
+    def __init__(self, roots):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}  # watch descriptor -> directory
+        try:
+            for root in roots:
+                self._watch_tree(root)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def _watch_tree(self, root: str) -> list:
+        created = []
+        for dir_path in _walk_dirs(root):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "inotify watch limit reached (fs.inotify.max_user_watches)")
+                continue
+            self._dirs[wd] = dir_path
+            # Files created before the watch was in place
+            created.extend(os.path.join(dir_path, name) for name in os.listdir(dir_path) if is_watched_file(name))
+        return created
+
+    def read(self, timeout: float):
+        """Return the changed paths reported within timeout seconds, None if events were lost."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(sys.getfilesystemencoding(), "surrogateescape")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and name not in IGNORED_DIRS:
+                    paths.extend(self._watch_tree(path))
+                continue
+            if is_watched_file(name):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingBackend:
+    """Changed paths from comparing the size and mtime of every file at an interval."""
+
+    def __init__(self, roots, interval: float):
+        self.roots = list(roots)
+        self.interval = interval
+        self._files = self._scan()
+
+    def _scan(self) -> dict:
+        files = {}
+        for root in self.roots:
+            for dir_path in _walk_dirs(root):
+                try:
+                    entries = list(os.scandir(dir_path))
+                except OSError:
+                    continue
+                for entry in entries:
+                    if entry.is_file() and is_watched_file(entry.name):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def read(self, timeout: float):
+        time.sleep(min(timeout, self.interval))
+        files = self._scan()
+        changed = [path for path, state in files.items() if self._files.get(path) != state]
+        changed.extend(path for path in self._files if path not in files)
+        self._files = files
+        return changed
+
+    def close(self):
+        pass
+
+
+class FileWatcher:
+    """Background thread reporting debounced batches of changed .py files."""
+
+    def __init__(self, roots, callback, debounce: float = None, backend: str = None, poll_interval: float = None):
+        """
+        :param roots: Directories watched recursively.
+        :param callback: Called with a set of absolute paths, on the watcher thread.
+        :param debounce: Quiet seconds before a batch is reported.
+        :param backend: "auto", "inotify" or "poll".
+        :param poll_interval: Rescan interval of the poll backend in seconds.
+        """
+        self.roots = [os.path.abspath(root) for root in roots if os.path.isdir(root)]
+        self.callback = callback
+        self.debounce = debounce if debounce is not None else env_int("FLUXAGENT_HOT_RELOAD_DEBOUNCE_MS", 300) / 1000
+        self.poll_interval = poll_interval if poll_interval is not None else env_int("FLUXAGENT_HOT_RELOAD_POLL_MS", 1000) / 1000
+        self.backend_name = backend or os.getenv("FLUXAGENT_HOT_RELOAD_BACKEND", "auto")
+        self.backend = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _open_backend(self):
+        if self.backend_name in ("auto", "inotify") and sys.platform.startswith("linux"):
+            try:
+                return _InotifyBackend(self.roots)
+            except (OSError, AttributeError) as e:
+                if self.backend_name == "inotify":
+                    raise
+                print(f"Warning: inotify unavailable ({e}), polling for changes instead")
+        return _PollingBackend(self.roots, self.poll_interval)
+
+    def start(self):
+        """Start watching; changes made from now on are reported."""
+        if self._thread is not None:
+            return
+        self.backend = self._open_backend()
+        self._thread = threading.Thread(target=self._run, name="FluxAgentFileWatcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        pending = set()
+        deadline = None
+        while not self._stop.is_set():
+            timeout = self.debounce if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                paths = self.backend.read(timeout)
+            except OSError as e:
+                print(f"Warning: File watcher stopped: {e}")
+                return
+            if paths is None:
+                # Events were dropped, rescan with polling from now on
+                print("Warning: File watcher lost events, switching to polling")
+                self.backend.close()
+                self.backend = _PollingBackend(self.roots, self.poll_interval)
+                continue
+            if paths:
+                pending.update(paths)
+                deadline = time.monotonic() + self.debounce
+                continue
+            if pending and time.monotonic() >= deadline:
+                batch, pending, deadline = pending, set(), None
+                try:
+                    self.callback(batch)
+                except Exception as e:
+                    print(f"Warning: File watcher callback failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.backend is not None:
+            self.backend.close()
+            self.backend = None
@@ -0,0 +1,483 @@
+"""
+Buffered, pooled writer for text output files.
+
+Appends are queued in memory per file and written by a background flush
+thread, in batches, through a pool of file handles kept open between calls,
+so saving thousands of texts to one file costs a few large writes instead of
+an open/write/close per text. Each file has its own lock and every batch is
+written with one call on an O_APPEND handle, so concurrent saves never
+interleave within a text. Overwrites go to a temporary file that is renamed
+over the target, so readers see the old or the new content, never a partial
+one. Everything still buffered is flushed at interpreter exit.
+
+An OutputFormat can compress the output as it is written (gzip, or zstd when
+the zstandard package is installed) and rotate a file once it reaches a size
+or a number of records: the full file is renamed following a pattern and a
+new one is started under the original name. Compressed files opened again
+for appending get a new gzip member or zstd frame, which standard tools read
+as one stream.
+
+Configuration (.env):
+
+    FLUXAGENT_TEXT_FLUSH_INTERVAL_MS  longest time an append stays buffered (200)
+    FLUXAGENT_TEXT_FLUSH_BYTES        buffered bytes per file that trigger a write (1048576)
+    FLUXAGENT_TEXT_MAX_OPEN_FILES     file handles kept open, least recently used closed first (64)
+    FLUXAGENT_TEXT_FSYNC              none: leave it to the OS, flush: fsync each batch written,
+                                      always: write and fsync every save before returning (none)
+"""
+
+import os
+import gzip
+import time
+import zlib
+import atexit
+import threading
+from collections import OrderedDict, namedtuple
+
+from .Env import env_float, env_int
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FSYNC_POLICIES = ("none", "flush", "always")
+COMPRESSIONS = ("none", "gzip", "zstd")
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+# {stem} and {ext} split the file name at its first dot: out.jsonl.gz -> out, .jsonl.gz
+DEFAULT_ROTATION_PATTERN = "{stem}.{index:04d}{ext}"
+
+
+
+class OutputFormat(namedtuple("OutputFormat", "compression max_bytes max_records pattern line_records")):
+    """
+    How a file is written.
+
+    compression is one of COMPRESSIONS. A file being appended to is rotated
+    once its size on disk reaches max_bytes or it holds max_records records
+    (0 disables either). Records are the appended texts; with line_records
+    they are lines, and the records of an existing file are counted when it
+    is opened, otherwise counting starts when this process opens the file.
+    """
+
+    def __new__(cls, compression="none", max_bytes=0, max_records=0, pattern=DEFAULT_ROTATION_PATTERN,
+                line_records=False):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}, expected one of {', '.join(COMPRESSIONS)}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+        if max_bytes or max_records:
+            if "{index" not in pattern:
+                raise ValueError(f"Rotation pattern {pattern!r} needs an {{index}} field")
+            try:
+                pattern.format(stem="output", ext=".txt", index=1, timestamp="20000101-000000")
+            except (KeyError, IndexError, ValueError) as e:
+                raise ValueError(f"Invalid rotation pattern {pattern!r}: {e}") from e
+        return super().__new__(cls, compression, max_bytes, max_records, pattern, line_records)
+
+
+PLAIN = OutputFormat()
+
+
+def compressed_path(path: str, compression: str) -> str:
+    """Add the suffix of the compression to a path that does not have it yet."""
+    suffix = COMPRESSION_SUFFIXES[compression]
+    return path if path.endswith(suffix) else path + suffix
+
+
+def _encode(text: str, output_format: OutputFormat) -> bytes:
+    # Uncompressed text gets the same bytes as a file opened in text mode
+    if output_format == PLAIN and os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
+
+
+def _open_compressed(raw, compression: str):
+    """Writable stream over raw; flush() makes everything written so far readable."""
+    if compression == "gzip":
+        return _GzipStream(raw)
+    if compression == "zstd":
+        return _ZstdStream(raw)
+    return raw
+
+
+class _GzipStream:
+    def __init__(self, raw):
+        self.stream = gzip.GzipFile(fileobj=raw, mode="ab", mtime=0)
+
+    def write(self, data: bytes):
+        self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self):
+        # Writes the member trailer, leaving raw open
+        self.stream.close()
+
+
+class _ZstdStream:
+    def __init__(self, raw):
+        self.stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+
+    def write(self, data: bytes):
+        self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush(zstandard.FLUSH_BLOCK)
+
+    def close(self):
+        # Ends the frame, leaving raw open
+        self.stream.close()
+
+
+def _create_temp_file(directory: str):
+    """
+    Create an empty temporary file for an atomic overwrite.
+
+    Unlike tempfile.mkstemp (mode 0o600) it gets the mode of a new file: the
+    kernel applies the process umask to 0o666.
+
+    :param directory: Directory of the target, the file is renamed over it.
+    :return: (file descriptor, path)
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        temp_path = os.path.join(directory, f".tmp-{os.urandom(8).hex()}")
+        try:
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def _count_lines(path: str, compression: str) -> int:
+    """Lines of an existing file, as far as it can be read."""
+    count = 0
+    try:
+        with open(path, "rb") as raw:
+            if compression == "gzip":
+                stream = gzip.GzipFile(fileobj=raw, mode="rb")
+            elif compression == "zstd":
+                stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            else:
+                stream = raw
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                count += chunk.count(b"\n")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # Typically a compressed file cut short by a crash
+        print(f"Warning: Could only count {count} records of {path}: {e}")
+    return count
+
+
+class _Handle:
+    """
+    An output file and the appends waiting to be written to it; opened by
+    BufferedFileWriter under the handle's lock.
+    """
+
+    def __init__(self, path: str, output_format: OutputFormat):
+        self.path = path
+        self.format = output_format
+        self.pending = []
+        self.pending_bytes = 0
+        self.records = 0
+        self.lock = threading.Lock()
+        self.file = None
+        self.raw = None
+
+    def open(self):
+        if self.format.max_records and self.format.line_records:
+            self.records = _count_lines(self.path, self.format.compression)
+        else:
+            self.records = 0
+        self.raw = open(self.path, "ab")
+        self.file = _open_compressed(self.raw, self.format.compression)
+
+    def size(self) -> int:
+        return self.raw.tell()
+
+    def close(self):
+        try:
+            if self.file is not self.raw:
+                self.file.close()
+        finally:
+            self.raw.close()
+            self.file = None
+            self.raw = None
+
+
+class BufferedFileWriter:
+    """Thread safe writer shared by every node execution of the process."""
+
+    def __init__(self, flush_interval: float = 0.2, flush_bytes: int = 1024 * 1024,
+                 max_open_files: int = 64, fsync: str = "none"):
+        """
+        :param flush_interval: Seconds an append may stay buffered.
+        :param flush_bytes: Buffered bytes of one file that are written at once.
+        :param max_open_files: Handles kept in the pool.
+        :param fsync: One of FSYNC_POLICIES.
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}, expected one of {', '.join(FSYNC_POLICIES)}")
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.max_open_files = max(1, max_open_files)
+        self.fsync = fsync
+        self._handles = OrderedDict()  # path -> _Handle, least recently used first
+        self._lock = threading.Lock()
+        self._known_dirs = set()
+        self._rotation_index = {}  # path -> next rotation index to try
+        self._stop = threading.Event()
+        self._thread = None
+
+    def append(self, path: str, text: str, output_format: OutputFormat = PLAIN):
+        """
+        Append text to a file, creating it and its directory if needed.
+
+        :param path: The file path.
+        :param text: The text to append, one record.
+        :param output_format: Compression and rotation of the file.
+        :raises OSError: If the file cannot be opened, or written when the
+                         append is written right away.
+        """
+        data = _encode(text, output_format)
+        while True:
+            handle = self._handle(os.path.abspath(path), output_format)
+            with handle.lock:
+                if handle.file is None:
+                    # Closed by the pool between lookup and lock, reopen
+                    continue
+                handle.pending.append(data)
+                handle.pending_bytes += len(data)
+                handle.records += 1
+                if output_format.max_records and handle.records >= output_format.max_records:
+                    self._write_pending(handle)
+                    self._rotate(handle)
+                elif self.fsync == "always" or handle.pending_bytes >= self.flush_bytes:
+                    self._write_pending(handle)
+                return
+
+    def write(self, path: str, text: str, output_format: OutputFormat = PLAIN):
+        """
+        Replace the content of a file atomically.
+
+        :param path: The file path.
+        :param text: The new content.
+        :param output_format: Compression of the file; rotation does not apply.
+        :raises OSError: If the file cannot be written.
+        """
+        path = os.path.abspath(path)
+        directory = os.path.dirname(path)
+        self._ensure_dir(directory)
+        # Earlier appends land in the file being replaced, not after the new content
+        self._close(path)
+
+        try:
+            fd, temp_path = _create_temp_file(directory)
+        except FileNotFoundError:
+            # The directory was removed since it was created
+            self._known_dirs.discard(directory)
+            self._ensure_dir(directory)
+            fd, temp_path = _create_temp_file(directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                # A replaced file keeps its mode
+                try:
+                    os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+                except FileNotFoundError:
+                    pass
+                stream = _open_compressed(f, output_format.compression)
+                stream.write(_encode(text, output_format))
+                if stream is not f:
+                    stream.close()
+                if self.fsync != "none":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def flush(self, path: str = None):
+        """Write out what is buffered, for one file or all of them."""
+        with self._lock:
+            if path is None:
+                handles = list(self._handles.values())
+            else:
+                handle = self._handles.get(os.path.abspath(path))
+                handles = [handle] if handle is not None else []
+        for handle in handles:
+            with handle.lock:
+                self._write_pending(handle)
+
+    def close(self):
+        """Flush and close every file and stop the flush thread."""
+        self._stop.set()
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for handle in handles:
+            with handle.lock:
+                self._close_handle(handle)
+
+    def _handle(self, path: str, output_format: OutputFormat) -> _Handle:
+        replaced = None
+        evicted = []
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is not None and handle.format == output_format:
+                self._handles.move_to_end(path)
+                return handle
+            if handle is not None:
+                # Written in another format from now on: finish the file as it was
+                replaced = self._handles.pop(path)
+
+            # Opened below under its own lock, which only appends to this file wait for:
+            # opening a compressed file with rotation reads all of it to count the records
+            handle = _Handle(path, output_format)
+            handle.lock.acquire()
+            self._handles[path] = handle
+            while len(self._handles) > self.max_open_files:
+                evicted.append(self._handles.popitem(last=False)[1])
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="fluxagent-file-writer", daemon=True)
+                self._thread.start()
+
+        try:
+            if replaced is not None:
+                with replaced.lock:
+                    self._close_handle(replaced)
+            self._open_handle(handle)
+        except BaseException:
+            with self._lock:
+                if self._handles.get(path) is handle:
+                    del self._handles[path]
+            raise
+        finally:
+            handle.lock.release()
+
+        for old in evicted:
+            with old.lock:
+                self._close_handle(old)
+        return handle
+
+    def _open_handle(self, handle: _Handle):
+        # Called with handle.lock held
+        directory = os.path.dirname(handle.path)
+        self._ensure_dir(directory)
+        try:
+            handle.open()
+        except FileNotFoundError:
+            # The directory was removed since it was created
+            self._known_dirs.discard(directory)
+            self._ensure_dir(directory)
+            handle.open()
+
+    def _close(self, path: str):
+        with self._lock:
+            handle = self._handles.pop(path, None)
+        if handle is not None:
+            with handle.lock:
+                self._close_handle(handle)
+
+    def _ensure_dir(self, directory: str):
+        if directory not in self._known_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._known_dirs.add(directory)
+
+    def _write_pending(self, handle: _Handle):
+        # Called with handle.lock held
+        if not handle.pending or handle.file is None:
+            return
+        data = b"".join(handle.pending)
+        handle.file.write(data)
+        handle.file.flush()
+        if handle.file is not handle.raw:
+            handle.raw.flush()
+        # Kept for the next attempt until the OS has it
+        handle.pending.clear()
+        handle.pending_bytes = 0
+        if self.fsync != "none":
+            os.fsync(handle.raw.fileno())
+        if handle.format.max_bytes and handle.size() >= handle.format.max_bytes:
+            self._rotate(handle)
+
+    def _rotate(self, handle: _Handle):
+        # Called with handle.lock held and nothing pending
+        if handle.size() == 0:
+            return
+        handle.close()
+        target = self._rotated_path(handle.path, handle.format.pattern)
+        try:
+            os.replace(handle.path, target)
+        finally:
+            handle.open()
+        print(f"Rotated {handle.path} to {target}")
+
+    def _rotated_path(self, path: str, pattern: str) -> str:
+        directory, name = os.path.split(path)
+        stem, dot, rest = name.partition(".")
+        ext = dot + rest
+        index = self._rotation_index.get(path, 1)
+        while True:
+            candidate = os.path.join(directory, pattern.format(
+                stem=stem, ext=ext, index=index, timestamp=time.strftime("%Y%m%d-%H%M%S")))
+            index += 1
+            if not os.path.exists(candidate):
+                break
+        self._rotation_index[path] = index
+        return candidate
+
+    def _close_handle(self, handle: _Handle):
+        # Called with handle.lock held
+        if handle.file is None:
+            return
+        try:
+            self._write_pending(handle)
+        except OSError as e:
+            print(f"Error writing buffered text to {handle.path}: {e}")
+        finally:
+            if handle.file is not None:
+                handle.close()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                handles = [handle for handle in self._handles.values() if handle.pending]
+            for handle in handles:
+                with handle.lock:
+                    try:
+                        self._write_pending(handle)
+                    except OSError as e:
+                        print(f"Error writing buffered text to {handle.path}: {e}")
+        with self._lock:
+            self._thread = None
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_file_writer() -> BufferedFileWriter:
+    """Return the process-wide BufferedFileWriter, creating it on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BufferedFileWriter(
+                    flush_interval=env_float("FLUXAGENT_TEXT_FLUSH_INTERVAL_MS", 200) / 1000,
+                    flush_bytes=env_int("FLUXAGENT_TEXT_FLUSH_BYTES", 1024 * 1024),
+                    max_open_files=env_int("FLUXAGENT_TEXT_MAX_OPEN_FILES", 64),
+                    fsync=os.getenv("FLUXAGENT_TEXT_FSYNC", "none").lower(),
+                )
+                atexit.register(_writer.close)
+    return _writer
@@ -3,25 +3,39 @@ Refer to https://github.com/logtd/ComfyUI-HotReloadHack/blob/main/__init__.py
 
 ComfyUI Hot Reload Module
 A simplified hot reload system for ComfyUI custom nodes.
+
+With FLUXAGENT_HOT_RELOAD=1 a FileWatcher reports saved files under
+fluxagent/ and user/. Only the changed modules and the loaded modules that
+import them, directly or not, are executed again, in dependency order, and
+only their node classes are re-registered and marked for cache clearing.
+The import graph is parsed once and then updated file by file, so a reload
+costs the same however many generated nodes the tree holds.
+
+Reloads run on the watcher thread while ComfyUI executes prompts and serves
+/object_info. The node mappings are never changed in place: new ones are
+built aside and swapped in whole, and RELOADED_CLASS_TYPES changes, under a
+lock the set_prompt patch takes too.
 """
 
 import os
+import ast
 import sys
 import logging
-import importlib
-import importlib.util
+import threading
 from collections import defaultdict
 
-import folder_paths
-#from fluxagent import load_custom_node
 from comfy_execution import caching
 
+from .FileWatcher import FileWatcher
+from .NodeManifest import import_node_file
+
 # ==============================================================================
 # === GLOBALS ===
 # ==============================================================================
 
 RELOADED_CLASS_TYPES: dict = {}  # Stores types of classes that have been reloaded.
-CUSTOM_NODE_ROOT: list[str] = folder_paths.folder_names_and_paths["custom_nodes"][0]  # Custom Node root directory list.
+# Held while the node mappings are swapped and while RELOADED_CLASS_TYPES is read or changed
+REGISTRY_LOCK = threading.Lock()
 
 # ==============================================================================
 # === SUPPORT FUNCTIONS ===
@@ -43,80 +57,426 @@ def dfs(item_list: list, searches: set) -> bool:
     return False
 
 # ==============================================================================
-# === CORE RELOAD FUNCTIONALITY ===
+# === DEPENDENCY GRAPH ===
 # ==============================================================================
 
-def reload_module(module_name: str) -> bool:
+def _imported_names(tree: ast.AST, module_name: str, is_package: bool) -> set:
     """
-    Reloads a ComfyUI custom node module and clears relevant caches.
+    Collect the absolute names a module imports, with every name imported
+    from a package also taken as a possible submodule.
 
-    :param module_name: The name of the module to reload.
-    :return: True if reload was successful, False otherwise.
-    """
-    try:
-        # Find all dependent modules that should be reloaded
-        reload_modules: list[str] = [
-            mod_name for mod_name in sys.modules.keys()
-            if module_name in mod_name and mod_name != module_name
-        ]
-
-        # Unload dependent modules first
-        for reload_mod in reload_modules:
-            if reload_mod in sys.modules:
-                del sys.modules[reload_mod]
-
-        # Unload the main module
-        if module_name in sys.modules:
-            del sys.modules[module_name]
-
-        # Reload the module
-        module_path_init: str = os.path.join(CUSTOM_NODE_ROOT[0], module_name, '__init__.py')
-        
-        if not os.path.exists(module_path_init):
-            logging.error(f"Module init file not found: {module_path_init}")
-            return False
-
-        spec = importlib.util.spec_from_file_location(module_name, module_path_init)
-        if spec is None:
-            logging.error(f"Could not create spec for module: {module_name}")
-            return False
-
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = module
-        spec.loader.exec_module(module)
-
-        # Mark reloaded class types for cache clearing
-        if hasattr(module, 'NODE_CLASS_MAPPINGS'):
-            for key in module.NODE_CLASS_MAPPINGS.keys():
-                RELOADED_CLASS_TYPES[key] = 3
-
-        # Load the custom node
-        module_path: str = os.path.join(CUSTOM_NODE_ROOT[0], module_name)
-        #load_custom_node(module_path)
-        
-        logging.info(f'[ComfyUI-HotReload] Successfully reloaded module: {module_name}')
-        return True
+    :param tree: Parsed source of the module.
+    :param module_name: The module's name, to resolve relative imports.
+    :param is_package: True for an __init__.py.
+    :return: Set of candidate module names.
+    """
+    names = set()
+    package = module_name if is_package else module_name.rpartition(".")[0]
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = package.split(".")
+                if node.level - 1 >= len(parts):
+                    continue
+                base = ".".join(parts[:len(parts) - (node.level - 1)])
+                target = f"{base}.{node.module}" if node.module else base
+            else:
+                target = node.module
+            names.add(target)
+            names.update(f"{target}.{alias.name}" for alias in node.names)
+    return names
+
+
+class ModuleGraph:
+    """
+    Import graph of the extension's modules, named the way load_nodes()
+    names them: the package, then the path relative to the extension.
+    """
+
+    def __init__(self, package: str, extension_dir: str):
+        self.package = package
+        self.extension_dir = os.path.abspath(extension_dir)
+        self.files = {}  # module name -> file path
+        self.imports = {}  # module name -> extension modules it imports
+        self.importers = defaultdict(set)  # module name -> modules importing it
+
+    def module_name(self, file_path: str) -> str:
+        rel_path = os.path.relpath(os.path.abspath(file_path), self.extension_dir)
+        name = rel_path.replace(os.sep, ".")[:-3]
+        if name.endswith(".__init__"):
+            name = name[:-len(".__init__")]
+        return f"{self.package}.{name}"
+
+    def scan(self, roots):
+        """Parse every module under the roots."""
+        for root in roots:
+            for dir_path, dir_names, file_names in os.walk(root):
+                dir_names[:] = [name for name in dir_names if name != "__pycache__"]
+                for file_name in file_names:
+                    if file_name.endswith(".py"):
+                        self.update(os.path.join(dir_path, file_name), resolve=False)
+        # Imports of modules that were not known yet when their importer was parsed
+        for name in list(self.imports):
+            self._link(name, self.imports[name])
+
+    def update(self, file_path: str, resolve: bool = True) -> str:
+        """
+        Parse one module again after it changed.
+
+        :param file_path: The module's file.
+        :param resolve: False while scanning, links are made afterwards.
+        :return: The module name.
+        """
+        name = self.module_name(file_path)
+        self.files[name] = os.path.abspath(file_path)
+        try:
+            with open(file_path, "rb") as f:
+                tree = ast.parse(f.read(), file_path)
+            candidates = _imported_names(tree, name, file_path.endswith("__init__.py"))
+        except (OSError, SyntaxError, ValueError):
+            # Keep the edges it had, the reload will report the error
+            candidates = self.imports.get(name, set())
+        if resolve:
+            self._link(name, candidates)
+        else:
+            self.imports[name] = candidates
+        return name
+
+    def _link(self, name: str, candidates):
+        for target in self.imports.get(name, ()):
+            self._unlink(target, name)
+        imports = {target for target in candidates if target in self.files and target != name}
+        self.imports[name] = imports
+        for target in imports:
+            self.importers[target].add(name)
+
+    def remove(self, file_path: str) -> str:
+        """Forget a deleted module and return its name."""
+        name = self.module_name(file_path)
+        self.files.pop(name, None)
+        for target in self.imports.pop(name, ()):
+            self._unlink(target, name)
+        return name
+
+    def _unlink(self, target: str, importer: str):
+        importers = self.importers.get(target)
+        if importers:
+            importers.discard(importer)
+
+    def dependents(self, names) -> set:
+        """Modules importing any of names, directly or through others."""
+        found = set()
+        stack = list(names)
+        while stack:
+            for importer in self.importers.get(stack.pop(), ()):
+                if importer not in found:
+                    found.add(importer)
+                    stack.append(importer)
+        return found - set(names)
+
+    def order(self, names) -> list:
+        """Sort names so every module comes after the modules it imports."""
+        names = set(names)
+        ordered = []
+        visited = set()
+
+        def visit(name):
+            # Cycles are broken where they are entered
+            visited.add(name)
+            for target in sorted(self.imports.get(name, ())):
+                if target in names and target not in visited:
+                    visit(target)
+            ordered.append(name)
+
+        for name in sorted(names):
+            if name not in visited:
+                visit(name)
+        return ordered
+
+
+# ==============================================================================
+# === INCREMENTAL RELOAD ===
+# ==============================================================================
+
+_graph: ModuleGraph = None
+_graph_ready = threading.Event()
+_watcher: FileWatcher = None
+_reload_lock = threading.Lock()
+_owners: list = []  # modules whose NODE_CLASS_MAPPINGS and NODE_DISPLAY_NAME_MAPPINGS are replaced on reload
+
+# Modules holding the reload state itself are never reloaded
+_SELF_MODULES = ("HotReload", "FileWatcher", "NodeManifest")
+
+
+def _registry_owners() -> list:
+    owners = list(_owners)
+    # ComfyUI copied the extension's mappings into its own at startup
+    nodes = sys.modules.get("nodes")
+    if nodes is not None and hasattr(nodes, "NODE_CLASS_MAPPINGS"):
+        owners.append(nodes)
+    return owners
+
+
+def _node_registries() -> list:
+    # Mappings are replaced, not changed, so the ones read here stay consistent
+    return [(owner.NODE_CLASS_MAPPINGS, owner.NODE_DISPLAY_NAME_MAPPINGS) for owner in _registry_owners()]
+
+
+def _unregister(registries: list, module_name: str) -> set:
+    # Real classes and lazy proxies both carry the name of their node file
+    removed = set()
+    for class_mappings, display_names in registries:
+        for class_type, node_class in list(class_mappings.items()):
+            if getattr(node_class, "__module__", None) == module_name:
+                del class_mappings[class_type]
+                display_names.pop(class_type, None)
+                removed.add(class_type)
+    return removed
+
+
+def _register(registries: list, module) -> set:
+    class_mappings = getattr(module, "NODE_CLASS_MAPPINGS", None) or {}
+    display_names = getattr(module, "NODE_DISPLAY_NAME_MAPPINGS", None) or {}
+    for registry, display_registry in registries:
+        registry.update(class_mappings)
+        display_registry.update(display_names)
+    return set(class_mappings)
+
+
+def _swap_registries(owners: list, registries: list, class_types: set):
+    """Install the new mappings and mark the class types for cache clearing, in one step for set_prompt."""
+    with REGISTRY_LOCK:
+        for owner, (class_mappings, display_names) in zip(owners, registries):
+            owner.NODE_CLASS_MAPPINGS = class_mappings
+            owner.NODE_DISPLAY_NAME_MAPPINGS = display_names
+        for class_type in class_types:
+            RELOADED_CLASS_TYPES[class_type] = 3
+
+
+def _execute(module_name: str, file_path: str):
+    module = import_node_file(module_name, file_path)
+    parent, _, child = module_name.rpartition(".")
+    if parent in sys.modules:
+        # What the import system does, for "from . import module"
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def reload_files(file_paths) -> list:
+    """
+    Reload the modules of changed files and the loaded modules depending on them.
+
+    :param file_paths: Changed, created or deleted files.
+    :return: Names of the modules executed again.
+    """
+    _graph_ready.wait()
+    with _reload_lock:
+        changed, removed = set(), set()
+        for file_path in file_paths:
+            file_name = os.path.basename(file_path)
+            if file_name == "__init__.py" or file_name[:-3] in _SELF_MODULES:
+                continue
+            if os.path.exists(file_path):
+                changed.add(_graph.update(file_path))
+            else:
+                removed.add(_graph.remove(file_path))
+        if not changed and not removed:
+            return []
+
+        # Copies of the mappings are updated while ComfyUI keeps using the current ones
+        owners = _registry_owners()
+        registries = [(dict(owner.NODE_CLASS_MAPPINGS), dict(owner.NODE_DISPLAY_NAME_MAPPINGS)) for owner in owners]
+
+        # Lazy node proxies describe their node as it was, so their modules are
+        # executed too; other modules nothing imported yet load the new code on their own
+        registered = {
+            getattr(node_class, "__module__", None)
+            for class_mappings, _ in registries for node_class in class_mappings.values()
+        }
+        dependents = {
+            name for name in _graph.dependents(changed | removed)
+            if (name in sys.modules or name in registered) and name.rpartition(".")[2] not in _SELF_MODULES
+        }
+        targets = _graph.order(changed | dependents)
+        # Dependents keep the removed module's objects until they fail to import it
+        class_types = set()
+        for name in removed:
+            class_types |= _unregister(registries, name)
+            sys.modules.pop(name, None)
+
+        previous = {name: sys.modules.pop(name, None) for name in targets}
+        reloaded = []
+        for name in targets:
+            try:
+                module = _execute(name, _graph.files[name])
+            except Exception as e:
+                # The old module and its nodes stay in place
+                logging.error(f"[ComfyUI-HotReload] Failed to reload {name}: {e}")
+                if previous[name] is not None:
+                    sys.modules[name] = previous[name]
+                continue
+            class_types |= _unregister(registries, name)
+            class_types |= _register(registries, module)
+            reloaded.append(name)
+
+        if class_types:
+            _swap_registries(owners, registries, class_types)
+        if reloaded:
+            logging.info(f"[ComfyUI-HotReload] Reloaded {', '.join(reloaded)}")
+        return reloaded
+
+
+def start_watcher(package: str, extension_dir: str, scan_dirs) -> FileWatcher:
+    """
+    Watch the node directories and reload what changes.
+
+    :param package: Module name of the extension, whose NODE_CLASS_MAPPINGS and
+                    NODE_DISPLAY_NAME_MAPPINGS are kept up to date.
+    :param extension_dir: The extension's directory.
+    :param scan_dirs: Directories of node files, relative to extension_dir.
+    :return: The running watcher.
+    """
+    global _graph, _watcher
+    if _watcher is not None:
+        return _watcher
+
+    monkeypatch()
+    roots = [os.path.join(extension_dir, dir_name) for dir_name in scan_dirs]
+    _owners.append(sys.modules[package])
+    _graph = ModuleGraph(package, extension_dir)
+
+    def build_graph():
+        try:
+            _graph.scan([root for root in roots if os.path.isdir(root)])
+        finally:
+            _graph_ready.set()
+
+    # Changes saved while the graph is parsed wait for it in reload_files()
+    threading.Thread(target=build_graph, name="FluxAgentModuleGraph", daemon=True).start()
+    _watcher = FileWatcher(roots, reload_files)
+    _watcher.start()
+    logging.info(f"[ComfyUI-HotReload] Watching {', '.join(_watcher.roots)} ({type(_watcher.backend).__name__})")
+    return _watcher
 
-    except Exception as e:
-        logging.error(f"[ComfyUI-HotReload] Failed to reload module {module_name}: {e}")
-        return False
 
 # ==============================================================================
 # === MONKEY PATCHING ===
 # ==============================================================================
 
-# Store original function to avoid multiple patches
+# Store original functions to avoid multiple patches
 _original_set_prompt = None
+_original_set_immediate = None
+
+# Entries an index may grow by before its first prune
+INDEX_SLACK = 1024
+
+
+def class_types_in(cache_key, class_mappings: list) -> set:
+    """
+    Collect the node class types a cache key is made of.
+
+    :param cache_key: Nested frozensets/tuples, as built by ComfyUI's cache key sets.
+    :param class_mappings: Registries telling class types from other strings, empty to take every string.
+    :return: Set of class types.
+    """
+    found = set()
+    stack = [(cache_key,)]
+    while stack:
+        for item in stack.pop():
+            kind = type(item)
+            if kind is frozenset or kind is tuple or isinstance(item, (frozenset, tuple)):
+                stack.append(item)
+            elif kind is str:
+                if not class_mappings:
+                    found.add(item)
+                    continue
+                for mappings in class_mappings:
+                    if item in mappings:
+                        found.add(item)
+                        break
+    return found
+
+
+class CacheKeyIndex:
+    """
+    Keys of one cache by the class types they contain, filled as entries are
+    stored, so the entries of reloaded classes are found without walking
+    every key on every prompt.
+    """
+
+    def __init__(self):
+        self.keys = defaultdict(set)  # class type -> cache keys
+        self.size = 0
+        # Pruned again once the index doubled, so pruning stays amortized O(1) per entry
+        self.prune_at = INDEX_SLACK
+
+    def add(self, cache_key, class_types):
+        for class_type in class_types:
+            keys = self.keys[class_type]
+            if cache_key not in keys:
+                keys.add(cache_key)
+                self.size += 1
+
+    def pop(self, class_types) -> set:
+        """Remove and return the keys containing any of the class types."""
+        found = set()
+        for class_type in class_types:
+            keys = self.keys.pop(class_type, None)
+            if keys:
+                self.size -= len(keys)
+                found |= keys
+        return found
+
+    def prune(self, live_keys):
+        """Drop the keys ComfyUI evicted from the cache itself."""
+        for class_type in list(self.keys):
+            keys = self.keys[class_type]
+            keys.intersection_update(live_keys)
+            if not keys:
+                del self.keys[class_type]
+        self.size = sum(len(keys) for keys in self.keys.values())
+        self.prune_at = 2 * self.size + INDEX_SLACK
+
+
+def _cache_key_index(cache) -> CacheKeyIndex:
+    index = cache.__dict__.get("_reload_index")
+    if index is None:
+        # Entries stored before the patch are indexed once
+        index = cache._reload_index = CacheKeyIndex()
+        class_mappings = [mappings for mappings, _ in _node_registries()]
+        for cache_key in getattr(cache, "cache", {}):
+            index.add(cache_key, class_types_in(cache_key, class_mappings))
+    return index
+
 
 def monkeypatch():
     """Apply necessary monkey patches for hot reloading cache management."""
-    global _original_set_prompt
+    global _original_set_prompt, _original_set_immediate
     
     # Only patch once
     if _original_set_prompt is not None:
         return
     
     _original_set_prompt = caching.HierarchicalCache.set_prompt
+    _original_set_immediate = getattr(caching.HierarchicalCache, "_set_immediate", None)
+
+    def set_immediate(self, node_id, value):
+        """
+        Store a cache entry and index its key by the class types in it.
+
+        :param node_id: Node whose output is stored.
+        :param value: The cached value.
+        """
+        _original_set_immediate(self, node_id, value)
+        cache_key = self.cache_key_set.get_data_key(node_id)
+        if cache_key is None:
+            return
+        index = _cache_key_index(self)
+        index.add(cache_key, class_types_in(cache_key, [mappings for mappings, _ in _node_registries()]))
+        if index.size > index.prune_at:
+            index.prune(self.cache)
 
     def set_prompt(self, dynprompt, node_ids, is_changed_cache):
         """
@@ -127,33 +487,45 @@ def monkeypatch():
         :param is_changed_cache: Boolean flag indicating if cache has changed.
         """
         if not hasattr(self, 'cache_key_set'):
-            RELOADED_CLASS_TYPES.clear()
+            with REGISTRY_LOCK:
+                RELOADED_CLASS_TYPES.clear()
+            return _original_set_prompt(self, dynprompt, node_ids, is_changed_cache)
+
+        # Nothing was reloaded, which is every prompt but the next few after a reload
+        if not RELOADED_CLASS_TYPES:
             return _original_set_prompt(self, dynprompt, node_ids, is_changed_cache)
 
-        # Find cache keys that need to be cleared due to reloaded classes
-        found_keys = []
-        for key, item_list in self.cache_key_set.keys.items():
-            if dfs(item_list, RELOADED_CLASS_TYPES):
-                found_keys.append(key)
+        with REGISTRY_LOCK:
+            reloaded = list(RELOADED_CLASS_TYPES)
+
+            # Find cache keys that need to be cleared due to reloaded classes
+            if _original_set_immediate is not None:
+                found_keys = _cache_key_index(self).pop(reloaded)
+            else:
+                # ComfyUI without _set_immediate, scan the keys of the last prompt
+                found_keys = {
+                    self.cache_key_set.get_data_key(key) for key, item_list in self.cache_key_set.keys.items()
+                    if dfs(item_list, RELOADED_CLASS_TYPES)
+                }
 
-        # Decrement reload counters and clean up
-        if len(found_keys):
-            for value_key in list(RELOADED_CLASS_TYPES.keys()):
-                RELOADED_CLASS_TYPES[value_key] -= 1
-                if RELOADED_CLASS_TYPES[value_key] == 0:
-                    del RELOADED_CLASS_TYPES[value_key]
+            # Decrement reload counters and clean up
+            if len(found_keys):
+                for value_key in reloaded:
+                    if value_key in RELOADED_CLASS_TYPES:
+                        RELOADED_CLASS_TYPES[value_key] -= 1
+                        if RELOADED_CLASS_TYPES[value_key] <= 0:
+                            RELOADED_CLASS_TYPES.pop(value_key, None)
 
         # Clear the cache for affected keys
-        for key in found_keys:
-            cache_key = self.cache_key_set.get_data_key(key)
-            if cache_key and cache_key in self.cache:
-                del self.cache[cache_key]
-                del self.cache_key_set.keys[key]
-                del self.cache_key_set.subcache_keys[key]
+        for cache_key in found_keys:
+            if cache_key is not None:
+                self.cache.pop(cache_key, None)
         
         return _original_set_prompt(self, dynprompt, node_ids, is_changed_cache)
 
     caching.HierarchicalCache.set_prompt = set_prompt
+    if _original_set_immediate is not None:
+        caching.HierarchicalCache._set_immediate = set_immediate
 
 # ==============================================================================
 # === PUBLIC API ===
@@ -161,13 +533,21 @@ def monkeypatch():
 
 def reloadModule(module_name: str) -> bool:
     """
-    Public API to hot reload a ComfyUI custom node module.
-    
+    Public API to hot reload a module of the watched extension, with its
+    submodules and the loaded modules depending on them.
+
     :param module_name: The name of the module to reload.
-    :return: True if reload was successful, False otherwise.
+    :return: True if a module was reloaded, False otherwise.
     """
-    # Apply monkey patch if not already applied
-    monkeypatch()
-    
-    # Reload the module
-    return reload_module(module_name)
\ No newline at end of file
+    if _graph is None:
+        logging.error("[ComfyUI-HotReload] Hot reload is not running (FLUXAGENT_HOT_RELOAD=1)")
+        return False
+    _graph_ready.wait()
+    file_paths = [
+        file_path for name, file_path in list(_graph.files.items())
+        if name == module_name or name.startswith(module_name + ".")
+    ]
+    if not file_paths:
+        logging.error(f"[ComfyUI-HotReload] Unknown module: {module_name}")
+        return False
+    return bool(reload_files(file_paths))
@@ -0,0 +1,244 @@
+"""
+Shared HTTP client for the FluxAgent components that talk to LLM endpoints.
+
+A single process-wide client keeps connections alive between calls instead of
+paying a TCP+TLS handshake on every request. It is configured from the
+environment (.env):
+
+    FLUXAGENT_HTTP_CONNECT_TIMEOUT   seconds to establish a connection (10)
+    FLUXAGENT_HTTP_READ_TIMEOUT      seconds to wait for data from the server (300)
+    FLUXAGENT_HTTP_POOL_CONNECTIONS  number of hosts to keep a pool for (10)
+    FLUXAGENT_HTTP_POOL_MAXSIZE      kept-alive connections per host (32)
+    FLUXAGENT_HTTP2                  use HTTP/2 when httpx and h2 are installed (1)
+
+Without httpx/h2 the client falls back to a requests Session with an HTTP/1.1
+keep-alive pool.
+
+Code running on ComfyUI's event loop (the chat route) uses get_async_session()
+instead, an aiohttp session with the same pool limits and timeouts, so
+concurrent requests are bounded by sockets rather than executor threads.
+"""
+
+import os
+import time
+import threading
+import importlib.util
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .Env import env_float, env_int
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+# httpx needs h2 for http2=True
+if httpx is not None and importlib.util.find_spec("h2") is None:
+    httpx = None
+
+
+class HttpClientError(Exception):
+    """Raised when a request could not be completed (connection, timeout, ...)."""
+
+
+class HttpClientConfig:
+    """Connection pool and timeout settings of the shared client."""
+
+    def __init__(self):
+        self.connect_timeout = env_float("FLUXAGENT_HTTP_CONNECT_TIMEOUT", 10)
+        self.read_timeout = env_float("FLUXAGENT_HTTP_READ_TIMEOUT", 300)
+        self.pool_connections = env_int("FLUXAGENT_HTTP_POOL_CONNECTIONS", 10)
+        self.pool_maxsize = env_int("FLUXAGENT_HTTP_POOL_MAXSIZE", 32)
+        self.http2 = os.getenv("FLUXAGENT_HTTP2", "1") == "1" and httpx is not None
+
+
+class HttpResponse:
+    """
+    Backend independent view of a response.
+
+    For streamed requests the body is not read up front; iterate iter_lines()
+    and call close() (or use the response as a context manager) when done.
+    headers_at is the time.monotonic() at which the response headers arrived.
+    """
+
+    def __init__(self, response, backend: str, headers_at: float = None):
+        self._response = response
+        self._backend = backend
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.headers_at = headers_at
+
+    @property
+    def text(self) -> str:
+        if self._backend == "httpx":
+            # Streamed httpx bodies must be read explicitly
+            self._response.read()
+        return self._response.text
+
+    def json(self):
+        return self._response.json()
+
+    def iter_lines(self):
+        """Yield the decoded lines of a streamed body."""
+        try:
+            if self._backend == "httpx":
+                yield from self._response.iter_lines()
+            else:
+                # chunk_size=None hands over each chunk as soon as it arrives
+                for line in self._response.iter_lines(chunk_size=None, decode_unicode=True):
+                    yield line
+        except (requests.exceptions.RequestException, *_httpx_errors()) as e:
+            raise HttpClientError(str(e)) from e
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _httpx_errors():
+    return (httpx.HTTPError, httpx.StreamError) if httpx is not None else ()
+
+
+class HttpClient:
+    """
+    Pooled, thread safe HTTP client.
+
+    Node executions run in ComfyUI's worker thread and the chat route in the
+    server's executor, so one instance is shared by all of them.
+    """
+
+    def __init__(self, config: HttpClientConfig = None):
+        self.config = config or HttpClientConfig()
+
+        if self.config.http2:
+            self.backend = "httpx"
+            self._client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=self.config.pool_connections * self.config.pool_maxsize,
+                    max_keepalive_connections=self.config.pool_maxsize,
+                ),
+            )
+        else:
+            self.backend = "requests"
+            adapter = HTTPAdapter(
+                pool_connections=self.config.pool_connections,
+                pool_maxsize=self.config.pool_maxsize,
+            )
+            self._client = requests.Session()
+            self._client.mount("https://", adapter)
+            self._client.mount("http://", adapter)
+
+    def _timeout(self, timeout):
+        """Per-call timeout: None for the defaults, a number for the read timeout."""
+        read_timeout = self.config.read_timeout if timeout is None else timeout
+        if self.backend == "httpx":
+            return httpx.Timeout(read_timeout, connect=self.config.connect_timeout)
+        return (self.config.connect_timeout, read_timeout)
+
+    def post(self, url: str, headers: dict, payload: dict, timeout: float = None, stream: bool = False) -> HttpResponse:
+        """
+        POST a JSON payload.
+
+        :param url: Request URL.
+        :param headers: Request headers.
+        :param payload: JSON body.
+        :param timeout: Optional read timeout in seconds, overrides the default.
+        :param stream: If True the body is not read before returning.
+        :return: The response, whatever its status code.
+        :raises HttpClientError: If the request could not be completed.
+        """
+        try:
+            # Always sent streaming so the arrival of the headers can be timed,
+            # the body is then read here unless the caller streams it
+            if self.backend == "httpx":
+                request = self._client.build_request(
+                    "POST", url, headers=headers, json=payload, timeout=self._timeout(timeout)
+                )
+                response = self._client.send(request, stream=True)
+            else:
+                response = self._client.post(
+                    url, headers=headers, json=payload, timeout=self._timeout(timeout), stream=True
+                )
+            headers_at = time.monotonic()
+            if not stream:
+                if self.backend == "httpx":
+                    response.read()
+                else:
+                    response.content
+        except (requests.exceptions.RequestException, *_httpx_errors()) as e:
+            raise HttpClientError(str(e)) from e
+        return HttpResponse(response, self.backend, headers_at)
+
+    def close(self):
+        self._client.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """Return the process-wide HttpClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+
+_async_sessions = {}
+
+
+def get_async_session():
+    """
+    Return the aiohttp session of the running event loop, creating it on first use.
+
+    aiohttp sessions are bound to the loop they were created on, so one is kept
+    per loop (ComfyUI's server loop and the one NodeRunner runs node requests on).
+    """
+    import asyncio
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        config = get_client().config
+        connector = aiohttp.TCPConnector(
+            limit=config.pool_connections * config.pool_maxsize,
+            limit_per_host=config.pool_maxsize,
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=async_timeout())
+        _async_sessions[loop] = session
+    return session
+
+
+def async_timeout(timeout: float = None):
+    """aiohttp timeout with the configured connect timeout and an optional read timeout override."""
+    import aiohttp
+
+    config = get_client().config
+    return aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=config.connect_timeout,
+        sock_read=config.read_timeout if timeout is None else timeout,
+    )
+
+
+async def close_async_sessions():
+    """
+    Close the aiohttp session of the running event loop (registered on the
+    server's cleanup); sessions of other loops are closed by their own loop.
+    """
+    import asyncio
+
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
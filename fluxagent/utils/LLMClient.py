@@ -0,0 +1,731 @@
+"""
+OpenAI compatible chat completion calls shared by OpenAIChatnNode and ChatBotService.
+
+All requests go through the pooled clients in HttpClient so every component
+reuses the same kept-alive connections: the blocking functions are used from
+blocking node code (the batch node), the async_* ones from coroutines on the
+server event loop or on the NodeRunner loop node requests are interrupted on.
+
+Every call also passes through the process-wide rate limiter, retry policy and
+circuit breaker from RateLimiter, and failures surface as LLMError instead of
+being returned as text. The coalesced_* variants additionally share identical
+in-flight requests through SingleFlight.
+
+Each logical request is recorded in Metrics under its model and the caller
+argument ("node", "batch_node", "chat", ...).
+
+The routed_* functions take a provider from LLMProviders instead of an API
+key and URL. They coalesce like the coalesced_* ones and, for a provider
+with a hedge endpoint, send the request to the faster endpoint first and a
+duplicate to the other when the first is slower than its rolling p95.
+"""
+
+import json
+import time
+import queue
+import asyncio
+import hashlib
+import threading
+
+from .HttpClient import get_client, get_async_session, async_timeout, HttpClientError
+from .RateLimiter import (
+    RETRYABLE_STATUS, estimate_request_tokens, parse_retry_after,
+    get_rate_limiter, get_retry_policy, get_circuit_breaker,
+)
+from .SingleFlight import single_flight_enabled, get_single_flight, get_async_single_flight
+from .Metrics import RequestTimer, LLM_HEDGES
+from .LLMProviders import (
+    OPENAI_CHAT_COMPLETIONS_URL, Provider,
+    get_provider_registry, get_latency_tracker, get_hedge_policy,
+)
+
+
+class LLMError(Exception):
+    """
+    A chat completion request failed.
+
+    str(e) is a readable message; status is the HTTP status code when the
+    server answered with an error, retry_after the delay it asked for.
+    Connection problems and RETRYABLE_STATUS answers are retryable. kind
+    classifies the error for metrics ("http_4xx", "http_429", "http_5xx",
+    "connection", "circuit_open", "invalid_response", ...).
+    """
+
+    def __init__(self, message: str, status: int = None, retry_after: float = None, retryable: bool = None, kind: str = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = (status in RETRYABLE_STATUS) if retryable is None else retryable
+        if kind is None:
+            if status == 429:
+                kind = "http_429"
+            elif status is not None:
+                kind = f"http_{status // 100}xx"
+            else:
+                kind = "error"
+        self.kind = kind
+
+
+def request_key(payload: dict, url: str = OPENAI_CHAT_COMPLETIONS_URL) -> str:
+    """
+    Content hash identifying a request.
+
+    Covers the endpoint, model, messages and sampling parameters; the
+    transport-only "stream" flag is ignored, so a streamed and a plain request
+    for the same completion share a key.
+    """
+    canonical = {key: value for key, value in payload.items() if key != "stream"}
+    data = json.dumps({"url": url, "payload": canonical}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _headers(api_key: str) -> dict:
+    headers = {"Content-Type": "application/json"}
+    # Local servers (Ollama, llama.cpp) need no key
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return headers
+
+
+def _error_from_body(status: int, text: str, url: str, headers) -> LLMError:
+    error_msg = f"HTTP Error: {status} for url: {url}"
+    if text:
+        try:
+            error_details = json.loads(text)
+            error_msg += f"\nDetails: {error_details.get('error', {}).get('message', 'Unknown error')}"
+        except Exception:
+            error_msg += f"\nResponse: {text}"
+    retry_after = parse_retry_after(headers)
+    if retry_after is not None:
+        error_msg += f"\nRetry after: {retry_after:g}s"
+    return LLMError(error_msg, status=status, retry_after=retry_after)
+
+
+def extract_content(result: dict):
+    """
+    Return the assistant message of a chat completion result.
+
+    Returns:
+        str or None: The content of the first choice, None if there is none
+    """
+    if "choices" in result and len(result["choices"]) > 0:
+        return result["choices"][0]["message"]["content"]
+    return None
+
+
+# Returned by parse_sse_line for the terminating "data: [DONE]" event
+SSE_DONE = object()
+
+
+def parse_sse_chunk(line: str):
+    """
+    Parse one line of a streamed chat completion into its JSON chunk.
+
+    Returns:
+        dict, SSE_DONE or None: The chunk of a data event, SSE_DONE at the end
+        of the stream, None for other lines (comments, keep-alives)
+    """
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return SSE_DONE
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        return None
+    if "error" in chunk:
+        raise LLMError(f"Stream Error: {chunk['error'].get('message', 'Unknown error')}", kind="stream_error")
+    return chunk
+
+
+def chunk_delta(chunk: dict):
+    """Content delta of a streamed chunk, None for role-only, empty or usage-only chunks."""
+    choices = chunk.get("choices") or []
+    if not choices:
+        return None
+    return (choices[0].get("delta") or {}).get("content") or None
+
+
+def parse_sse_line(line: str):
+    """
+    Parse one line of a streamed chat completion.
+
+    Returns:
+        str, SSE_DONE or None: The content delta of a data event, SSE_DONE at
+        the end of the stream, None for lines without content (comments,
+        keep-alives, role-only or empty deltas)
+    """
+    chunk = parse_sse_chunk(line)
+    if chunk is None or chunk is SSE_DONE:
+        return chunk
+    return chunk_delta(chunk)
+
+
+# ==============================================================================
+# === REQUEST POLICY ===
+# ==============================================================================
+
+class _Attempts:
+    """
+    Shared bookkeeping of one logical request across its attempts: circuit
+    breaker check, rate limit reservation, the retry decision and metrics.
+    """
+
+    def __init__(self, payload: dict, url: str, caller: str = None):
+        self.model = payload.get("model", "")
+        self.estimated_tokens = estimate_request_tokens(payload)
+        self.limiter = get_rate_limiter()
+        self.policy = get_retry_policy()
+        self.breaker = get_circuit_breaker(url)
+        self.timer = RequestTimer(self.model, caller)
+        self.url = url
+        self.streamed = bool(payload.get("stream"))
+        self.attempt = 0
+        self.attempt_started = None
+        self.responded_at = None
+
+    def before_attempt(self) -> float:
+        """
+        :return: Seconds to wait for the rate limiter before sending.
+        :raises LLMError: If the endpoint's circuit is open.
+        """
+        self.responded_at = None
+        remaining = self.breaker.allow()
+        if remaining is not None:
+            error = LLMError(
+                f"Error: Too many failures from {self.url}, requests paused for {remaining:.0f}s",
+                retryable=False, kind="circuit_open",
+            )
+            self.timer.failure(error.kind)
+            raise error
+        wait = self.limiter.reserve(self.model, self.estimated_tokens)
+        self.attempt_started = time.monotonic() + wait
+        return wait
+
+    def first_byte(self, at: float = None):
+        """The response (plain requests) or its first delta (streams) arrived."""
+        self.responded_at = time.monotonic() if at is None else at
+        self.timer.first_byte(self.responded_at)
+
+    def succeeded(self, result: dict = None):
+        if self.responded_at is not None:
+            # Endpoint latency of the successful attempt, for routing and hedging
+            get_latency_tracker().record(self.url, self.streamed, self.responded_at - self.attempt_started)
+        self.breaker.record_success()
+        self.limiter.record_usage(self.model, self.estimated_tokens, result)
+        self.timer.success((result or {}).get("usage"))
+
+    def failed_midstream(self, error: LLMError):
+        """A stream broke after content was delivered; it cannot be retried."""
+        self.breaker.record_failure(error)
+        self.timer.failure(error.kind)
+
+    def abandoned(self):
+        """The caller went away (cancelled, generator closed) before an outcome."""
+        self.timer.cancelled()
+
+    def failed(self, error: LLMError) -> float:
+        """
+        :return: Seconds to wait before retrying.
+        :raises LLMError: The error itself when it should not be retried.
+        """
+        self.breaker.record_failure(error)
+        if not self.policy.should_retry(error, self.attempt):
+            self.timer.failure(error.kind)
+            raise error
+        delay = self.policy.delay(self.attempt, error.retry_after)
+        self.attempt += 1
+        self.timer.retried()
+        print(f"LLM request failed ({error.status or 'connection'}), retry {self.attempt} in {delay:.1f}s")
+        return delay
+
+
+# ==============================================================================
+# === BLOCKING API ===
+# ==============================================================================
+
+def _chat_completion_once(api_key: str, payload: dict, url: str, timeout: float, attempts: _Attempts) -> dict:
+    try:
+        response = get_client().post(url, _headers(api_key), payload, timeout=timeout)
+    except HttpClientError as e:
+        raise LLMError(f"Request Error: {e}", retryable=True, kind="connection") from e
+    attempts.first_byte(response.headers_at)
+
+    if response.status_code >= 400:
+        raise _error_from_body(response.status_code, response.text, url, response.headers)
+
+    try:
+        return response.json()
+    except ValueError as e:
+        raise LLMError(f"Error: Invalid JSON response: {e}", kind="invalid_response") from e
+
+
+def chat_completion(api_key: str, payload: dict, url: str = OPENAI_CHAT_COMPLETIONS_URL, timeout: float = None, caller: str = None) -> dict:
+    """
+    Call a chat completions endpoint.
+
+    Args:
+        api_key: Bearer token for the endpoint
+        payload: Request body (model, messages and sampling parameters)
+        url: Chat completions URL
+        timeout: Optional read timeout in seconds
+        caller: Component making the request, for metrics
+
+    Returns:
+        dict: The decoded JSON response
+
+    Raises:
+        LLMError: On HTTP errors, connection problems or an invalid response,
+            once retries are exhausted
+    """
+    attempts = _Attempts(payload, url, caller)
+    try:
+        while True:
+            time.sleep(attempts.before_attempt())
+            try:
+                result = _chat_completion_once(api_key, payload, url, timeout, attempts)
+            except LLMError as e:
+                time.sleep(attempts.failed(e))
+                continue
+            attempts.succeeded(result)
+            return result
+    finally:
+        attempts.abandoned()
+
+
+def coalesced_chat_completion(api_key: str, payload: dict, url: str = OPENAI_CHAT_COMPLETIONS_URL, timeout: float = None, caller: str = None) -> dict:
+    """
+    chat_completion, sharing one upstream call between identical concurrent requests.
+
+    The returned dict may be shared with other callers and must not be modified.
+    """
+    if not single_flight_enabled():
+        return chat_completion(api_key, payload, url, timeout, caller)
+    return get_single_flight().do(
+        request_key(payload, url), lambda: chat_completion(api_key, payload, url, timeout, caller)
+    )
+
+
+def _stream_chat_completion_once(api_key: str, payload: dict, url: str, timeout: float, usage: dict):
+    try:
+        response = get_client().post(url, _headers(api_key), payload, timeout=timeout, stream=True)
+    except HttpClientError as e:
+        raise LLMError(f"Request Error: {e}", retryable=True, kind="connection") from e
+
+    with response:
+        if response.status_code >= 400:
+            raise _error_from_body(response.status_code, response.text, url, response.headers)
+        try:
+            for line in response.iter_lines():
+                chunk = parse_sse_chunk(line)
+                if chunk is SSE_DONE:
+                    return
+                if chunk is None:
+                    continue
+                usage.update(chunk.get("usage") or {})
+                delta = chunk_delta(chunk)
+                if delta:
+                    yield delta
+        except HttpClientError as e:
+            raise LLMError(f"Request Error: {e}", retryable=True, kind="connection") from e
+
+
+def _stream_payload(payload: dict) -> dict:
+    # Ask for the usage chunk at the end of the stream, for metrics and the rate limiter
+    return dict(payload, stream=True, stream_options=dict(payload.get("stream_options") or {}, include_usage=True))
+
+
+def stream_chat_completion(api_key: str, payload: dict, url: str = OPENAI_CHAT_COMPLETIONS_URL, timeout: float = None, caller: str = None):
+    """
+    Call a chat completions endpoint with stream=True and yield content deltas.
+
+    A failed attempt is only retried while nothing has been yielded yet.
+
+    Args:
+        api_key: Bearer token for the endpoint
+        payload: Request body (model, messages and sampling parameters)
+        url: Chat completions URL
+        timeout: Optional read timeout in seconds, applies between chunks
+        caller: Component making the request, for metrics
+
+    Yields:
+        str: Content deltas in arrival order
+
+    Raises:
+        LLMError: On HTTP errors, connection problems or an error event
+    """
+    payload = _stream_payload(payload)
+    attempts = _Attempts(payload, url, caller)
+    try:
+        while True:
+            time.sleep(attempts.before_attempt())
+            started = False
+            usage = {}
+            try:
+                for delta in _stream_chat_completion_once(api_key, payload, url, timeout, usage):
+                    if not started:
+                        started = True
+                        attempts.first_byte()
+                    yield delta
+            except LLMError as e:
+                if started:
+                    attempts.failed_midstream(e)
+                    raise
+                time.sleep(attempts.failed(e))
+                continue
+            attempts.succeeded({"usage": usage})
+            return
+    finally:
+        attempts.abandoned()
+
+
+# ==============================================================================
+# === ASYNC API ===
+# ==============================================================================
+
+def _async_request_errors():
+    import aiohttp
+    return (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+async def _async_chat_completion_once(api_key: str, payload: dict, url: str, timeout: float, attempts: _Attempts) -> dict:
+    try:
+        async with get_async_session().post(url, headers=_headers(api_key), json=payload, timeout=async_timeout(timeout)) as response:
+            attempts.first_byte()
+            if response.status >= 400:
+                raise _error_from_body(response.status, await response.text(), url, response.headers)
+            try:
+                return await response.json(content_type=None)
+            except ValueError as e:
+                raise LLMError(f"Error: Invalid JSON response: {e}", kind="invalid_response") from e
+    except _async_request_errors() as e:
+        raise LLMError(f"Request Error: {e or type(e).__name__}", retryable=True, kind="connection") from e
+
+
+async def async_chat_completion(api_key: str, payload: dict, url: str = OPENAI_CHAT_COMPLETIONS_URL, timeout: float = None, caller: str = None) -> dict:
+    """
+    Async version of chat_completion on the shared aiohttp session.
+
+    Cancelling the calling task aborts the request and releases the connection.
+    """
+    attempts = _Attempts(payload, url, caller)
+    try:
+        while True:
+            await asyncio.sleep(attempts.before_attempt())
+            try:
+                result = await _async_chat_completion_once(api_key, payload, url, timeout, attempts)
+            except LLMError as e:
+                await asyncio.sleep(attempts.failed(e))
+                continue
+            attempts.succeeded(result)
+            return result
+    finally:
+        attempts.abandoned()
+
+
+async def async_coalesced_chat_completion(api_key: str, payload: dict, url: str = OPENAI_CHAT_COMPLETIONS_URL, timeout: float = None, caller: str = None) -> dict:
+    """Async version of coalesced_chat_completion."""
+    if not single_flight_enabled():
+        return await async_chat_completion(api_key, payload, url, timeout, caller)
+    return await get_async_single_flight().do(
+        request_key(payload, url), lambda: async_chat_completion(api_key, payload, url, timeout, caller)
+    )
+
+
+async def _async_stream_chat_completion_once(api_key: str, payload: dict, url: str, timeout: float, usage: dict):
+    try:
+        async with get_async_session().post(url, headers=_headers(api_key), json=payload, timeout=async_timeout(timeout)) as response:
+            if response.status >= 400:
+                raise _error_from_body(response.status, await response.text(), url, response.headers)
+            async for raw_line in response.content:
+                chunk = parse_sse_chunk(raw_line.decode("utf-8").strip())
+                if chunk is SSE_DONE:
+                    return
+                if chunk is None:
+                    continue
+                usage.update(chunk.get("usage") or {})
+                delta = chunk_delta(chunk)
+                if delta:
+                    yield delta
+    except _async_request_errors() as e:
+        raise LLMError(f"Request Error: {e or type(e).__name__}", retryable=True, kind="connection") from e
+
+
+async def async_stream_chat_completion(api_key: str, payload: dict, url: str = OPENAI_CHAT_COMPLETIONS_URL, timeout: float = None, caller: str = None):
+    """
+    Async version of stream_chat_completion on the shared aiohttp session.
+
+    A failed attempt is only retried while nothing has been yielded yet.
+
+    Yields:
+        str: Content deltas in arrival order
+    """
+    payload = _stream_payload(payload)
+    attempts = _Attempts(payload, url, caller)
+    try:
+        while True:
+            await asyncio.sleep(attempts.before_attempt())
+            started = False
+            usage = {}
+            try:
+                async for delta in _async_stream_chat_completion_once(api_key, payload, url, timeout, usage):
+                    if not started:
+                        started = True
+                        attempts.first_byte()
+                    yield delta
+            except LLMError as e:
+                if started:
+                    attempts.failed_midstream(e)
+                    raise
+                await asyncio.sleep(attempts.failed(e))
+                continue
+            attempts.succeeded({"usage": usage})
+            return
+    finally:
+        attempts.abandoned()
+
+
+def async_coalesced_stream_chat_completion(api_key: str, payload: dict, url: str = OPENAI_CHAT_COMPLETIONS_URL, timeout: float = None, caller: str = None):
+    """
+    async_stream_chat_completion, sharing one upstream stream between identical
+    concurrent requests; a caller joining late first gets the deltas so far.
+    """
+    if not single_flight_enabled():
+        return async_stream_chat_completion(api_key, payload, url, timeout, caller)
+    return get_async_single_flight().stream(
+        request_key(payload, url), lambda: async_stream_chat_completion(api_key, payload, url, timeout, caller)
+    )
+
+
+# ==============================================================================
+# === PROVIDER ROUTING ===
+# ==============================================================================
+
+def resolve_provider(provider) -> Provider:
+    """
+    :param provider: Provider name, None or "" for the default, or a Provider.
+    :raises ValueError: If there is no such provider.
+    """
+    if isinstance(provider, Provider):
+        return provider
+    return get_provider_registry().get(provider)
+
+
+def _plan(provider, streamed: bool):
+    """:return: (provider, endpoints in the order they are tried, hedge delay or None)."""
+    provider = resolve_provider(provider)
+    endpoints = get_provider_registry().endpoints(provider)
+    if len(endpoints) == 1:
+        return provider, endpoints, None
+    endpoints, delay = get_hedge_policy().plan(endpoints, streamed)
+    return provider, endpoints, delay
+
+
+def _hedge_finished(provider: Provider, endpoints: list, winner: int, sent: int, started: float, streamed: bool):
+    if sent < 2:
+        return
+    LLM_HEDGES.inc(provider=provider.name, winner="primary" if winner == 0 else "hedge")
+    if winner:
+        # The primary took at least this long; without the sample a degraded
+        # endpoint whose requests keep losing would keep its old latency
+        get_latency_tracker().record(endpoints[0].chat_url, streamed, time.monotonic() - started)
+
+
+def _race(calls: list, delay: float):
+    """
+    Run calls[0], and the next call once it has not returned after delay
+    seconds or has failed.
+
+    Blocking requests cannot be aborted: a losing call runs to completion in
+    the background and its result is dropped.
+
+    :return: (index of the first call that succeeded, calls started, its result).
+    :raises BaseException: The first failure, when every call failed.
+    """
+    results = queue.Queue()
+    started = 0
+    running = 0
+    errors = []
+
+    def run(index):
+        try:
+            results.put((index, calls[index](), None))
+        except BaseException as e:
+            results.put((index, None, e))
+
+    def start():
+        nonlocal started, running
+        threading.Thread(target=run, args=(started,), name="FluxAgentLLMHedge", daemon=True).start()
+        started += 1
+        running += 1
+
+    start()
+    while True:
+        try:
+            index, result, error = results.get(timeout=delay if started < len(calls) else None)
+        except queue.Empty:
+            start()
+            continue
+        running -= 1
+        if error is None:
+            return index, started, result
+        errors.append(error)
+        if started < len(calls):
+            start()
+        elif running == 0:
+            raise errors[0]
+
+
+async def _async_race(coro_fns: list, delay: float, discard=None):
+    """
+    Async version of _race; the calls still running are cancelled once
+    there is a winner.
+
+    :param discard: Coroutine function awaited with the results of calls that
+                    succeeded alongside the winner.
+    """
+    pending = {}
+    started = 0
+    errors = []
+
+    def start():
+        nonlocal started
+        pending[asyncio.ensure_future(coro_fns[started]())] = started
+        started += 1
+
+    start()
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                pending, timeout=delay if started < len(coro_fns) else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                start()
+                continue
+            winner = None
+            for task in sorted(done, key=pending.get):
+                index = pending.pop(task)
+                if task.exception() is not None:
+                    errors.append(task.exception())
+                elif winner is None:
+                    winner = (index, started, task.result())
+                elif discard is not None:
+                    await discard(task.result())
+            if winner is not None:
+                return winner
+            if started < len(coro_fns):
+                start()
+            elif not pending:
+                raise errors[0]
+    finally:
+        for task in pending:
+            task.cancel()
+        outcomes = await asyncio.gather(*pending, return_exceptions=True)
+        if discard is not None:
+            for outcome in outcomes:
+                if not isinstance(outcome, BaseException):
+                    await discard(outcome)
+
+
+def routed_chat_completion(provider, payload: dict, timeout: float = None, caller: str = None) -> dict:
+    """
+    coalesced_chat_completion on a provider, hedged when it has a hedge endpoint.
+
+    Args:
+        provider: Provider name (None or "" for the default) or Provider
+        payload: Request body (model, messages and sampling parameters)
+        timeout: Optional read timeout in seconds
+        caller: Component making the request, for metrics
+
+    Returns:
+        dict: The decoded JSON response of the first endpoint to answer; it
+            may be shared with other callers and must not be modified
+
+    Raises:
+        ValueError: If there is no such provider
+        LLMError: If every endpoint failed, the error of the first one
+    """
+    provider, endpoints, delay = _plan(provider, False)
+
+    def call(endpoint):
+        return lambda: chat_completion(endpoint.api_key, endpoint.prepare(payload), endpoint.chat_url, timeout, caller)
+
+    def run():
+        if delay is None:
+            return call(endpoints[0])()
+        started = time.monotonic()
+        winner, sent, result = _race([call(endpoint) for endpoint in endpoints], delay)
+        _hedge_finished(provider, endpoints, winner, sent, started, False)
+        return result
+
+    if not single_flight_enabled():
+        return run()
+    return get_single_flight().do(request_key(payload, provider.chat_url), run)
+
+
+async def async_routed_chat_completion(provider, payload: dict, timeout: float = None, caller: str = None) -> dict:
+    """Async version of routed_chat_completion; a losing hedge is cancelled."""
+    provider, endpoints, delay = _plan(provider, False)
+
+    def call(endpoint):
+        return lambda: async_chat_completion(endpoint.api_key, endpoint.prepare(payload), endpoint.chat_url, timeout, caller)
+
+    async def run():
+        if delay is None:
+            return await call(endpoints[0])()
+        started = time.monotonic()
+        winner, sent, result = await _async_race([call(endpoint) for endpoint in endpoints], delay)
+        _hedge_finished(provider, endpoints, winner, sent, started, False)
+        return result
+
+    if not single_flight_enabled():
+        return await run()
+    return await get_async_single_flight().do(request_key(payload, provider.chat_url), run)
+
+
+def async_routed_stream_chat_completion(provider, payload: dict, timeout: float = None, caller: str = None):
+    """
+    async_coalesced_stream_chat_completion on a provider, hedged when it has
+    a hedge endpoint: the stream whose first delta arrives first is
+    followed, the other is cancelled.
+
+    Raises:
+        ValueError: If there is no such provider
+    """
+    provider, endpoints, delay = _plan(provider, True)
+
+    def stream(endpoint):
+        return async_stream_chat_completion(endpoint.api_key, endpoint.prepare(payload), endpoint.chat_url, timeout, caller)
+
+    async def first_delta(endpoint):
+        agen = stream(endpoint)
+        try:
+            return agen, await agen.__anext__()
+        except StopAsyncIteration:
+            return agen, None
+
+    async def discard(result):
+        await result[0].aclose()
+
+    async def hedged():
+        started = time.monotonic()
+        winner, sent, (agen, delta) = await _async_race(
+            [lambda endpoint=endpoint: first_delta(endpoint) for endpoint in endpoints], delay, discard
+        )
+        _hedge_finished(provider, endpoints, winner, sent, started, True)
+        try:
+            if delta is None:
+                return
+            yield delta
+            async for delta in agen:
+                yield delta
+        finally:
+            await agen.aclose()
+
+    def run():
+        return stream(endpoints[0]) if delay is None else hedged()
+
+    if not single_flight_enabled():
+        return run()
+    return get_async_single_flight().stream(request_key(payload, provider.chat_url), run)
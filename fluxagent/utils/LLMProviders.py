@@ -0,0 +1,309 @@
+"""
+Registry of the OpenAI compatible chat completion endpoints FluxAgent can use,
+and the rolling latency statistics used to route and hedge requests between them.
+
+A provider is a named base URL with its API key. The built-in ones are:
+
+    openai     OPENAI_BASE_URL (https://api.openai.com/v1), key from OPENAI_API_KEY
+    ollama     a local Ollama server (http://127.0.0.1:11434/v1), no key
+    llamacpp   a local llama.cpp server (http://127.0.0.1:8080/v1), no key
+
+Nodes take a provider name as input and chat sessions pick one per session;
+an empty name means the default provider.
+
+A provider may name a "hedge", a second provider serving the same models.
+Requests to it go to whichever of the two currently has the lower rolling
+p95 latency; when that one has not answered after its own p95 (the hedge
+threshold), a duplicate goes to the other and the first answer wins. A
+failure also fails over to the other endpoint straight away. Latency is
+tracked per endpoint URL, separately for plain requests (time to the whole
+response) and streams (time to the first delta).
+
+Configuration (.env):
+
+    FLUXAGENT_LLM_PROVIDERS           JSON providers by name, added to or overriding the built-in ones:
+                                      {"azure": {"base_url": "https://.../v1", "api_key_env": "AZURE_KEY",
+                                      "models": {"gpt-4.1": "my-deployment"}},
+                                      "openai": {"hedge": "azure"}, "ollama": {"model": "llama3.2"}};
+                                      "api_key" sets a literal key, "model" the chatbot model,
+                                      "models" renames models sent to this endpoint
+    FLUXAGENT_LLM_PROVIDER            default provider (openai)
+    FLUXAGENT_LLM_LATENCY_WINDOW      latency samples kept per endpoint (200)
+    FLUXAGENT_LLM_LATENCY_MAX_AGE     seconds a latency sample counts (300)
+    FLUXAGENT_LLM_LATENCY_MIN_SAMPLES samples needed before an endpoint's percentiles are used (10)
+    FLUXAGENT_LLM_HEDGE_PERCENTILE    latency percentile after which a hedge is sent (95)
+    FLUXAGENT_LLM_HEDGE_DELAY         seconds before a hedge while there are too few samples (10)
+    FLUXAGENT_LLM_HEDGE_MIN_DELAY     shortest wait before a hedge in seconds (0.25)
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from collections import deque
+
+from .Metrics import LLM_ENDPOINT_LATENCY
+from .Env import env_float, env_int
+
+# OPENAI_BASE_URL points the openai provider at another OpenAI compatible
+# server (e.g. the offline mock in test/mock_openai_server.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_CHAT_COMPLETIONS_URL = f"{OPENAI_BASE_URL}/chat/completions"
+
+BUILTIN_PROVIDERS = {
+    "openai": {"base_url": OPENAI_BASE_URL, "api_key_env": "OPENAI_API_KEY"},
+    "ollama": {"base_url": "http://127.0.0.1:11434/v1"},
+    "llamacpp": {"base_url": "http://127.0.0.1:8080/v1"},
+}
+
+DEFAULT_PROVIDER = "openai"
+
+
+class Provider:
+    """One OpenAI compatible endpoint."""
+
+    def __init__(self, name: str, base_url: str, api_key_env: str = None, api_key: str = None,
+                 model: str = None, models: dict = None, hedge: str = None):
+        """
+        :param name: Name the provider is selected by.
+        :param base_url: Base URL, the chat completions path is appended.
+        :param api_key_env: Environment variable holding the API key, None if none is needed.
+        :param api_key: Literal API key, takes precedence over api_key_env.
+        :param model: Model the chatbot uses with this provider, None for its default.
+        :param models: Model names rewritten for this endpoint.
+        :param hedge: Name of the provider hedged requests go to.
+        """
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.chat_url = f"{self.base_url}/chat/completions"
+        self.api_key_env = api_key_env
+        self._api_key = api_key
+        self.model = model
+        self.models = dict(models or {})
+        self.hedge = hedge
+
+    @property
+    def api_key(self) -> str:
+        if self._api_key:
+            return self._api_key
+        return os.getenv(self.api_key_env, "") if self.api_key_env else ""
+
+    def check_api_key(self):
+        """:raises ValueError: If the provider needs an API key and none is configured."""
+        if self.api_key_env and not self.api_key:
+            raise ValueError(f"{self.api_key_env} not found in .env file (provider {self.name})")
+
+    def prepare(self, payload: dict) -> dict:
+        """Request body for this endpoint, with the model renamed if configured."""
+        model = payload.get("model")
+        if model in self.models:
+            return dict(payload, model=self.models[model])
+        return payload
+
+    def describe(self) -> dict:
+        """Public description, without the key."""
+        return {"name": self.name, "base_url": self.base_url, "model": self.model, "hedge": self.hedge}
+
+
+class ProviderRegistry:
+    """The providers by name, built once from BUILTIN_PROVIDERS and FLUXAGENT_LLM_PROVIDERS."""
+
+    def __init__(self, config: dict = None, default: str = None):
+        """
+        :param config: Provider settings by name merged over the built-in ones, None to read the environment.
+        :param default: Name of the default provider, None to read the environment.
+        """
+        if config is None:
+            try:
+                config = json.loads(os.getenv("FLUXAGENT_LLM_PROVIDERS", "") or "{}")
+            except ValueError as e:
+                print(f"Warning: Invalid FLUXAGENT_LLM_PROVIDERS, using the built-in providers: {e}")
+                config = {}
+        if not isinstance(config, dict):
+            print("Warning: FLUXAGENT_LLM_PROVIDERS is not a JSON object, using the built-in providers")
+            config = {}
+        self.providers = {}
+        for name in list(BUILTIN_PROVIDERS) + [name for name in config if name not in BUILTIN_PROVIDERS]:
+            overrides = config.get(name) or {}
+            if not isinstance(overrides, dict):
+                print(f"Warning: Invalid settings for LLM provider {name}, ignored: not a JSON object")
+                if name not in BUILTIN_PROVIDERS:
+                    continue
+                overrides = {}
+            settings = dict(BUILTIN_PROVIDERS.get(name, {}), **overrides)
+            if not settings.get("base_url"):
+                print(f"Warning: LLM provider {name} has no base_url, ignored")
+                continue
+            try:
+                self.providers[name] = Provider(name, **settings)
+            except (TypeError, AttributeError) as e:
+                print(f"Warning: Invalid settings for LLM provider {name}, ignored: {e}")
+        for provider in self.providers.values():
+            if provider.hedge is not None and provider.hedge not in self.providers:
+                print(f"Warning: Unknown hedge provider {provider.hedge} for {provider.name}, hedging disabled")
+                provider.hedge = None
+        self.default = default or os.getenv("FLUXAGENT_LLM_PROVIDER", DEFAULT_PROVIDER)
+        if self.default not in self.providers:
+            print(f"Warning: Unknown default LLM provider {self.default}, using {DEFAULT_PROVIDER}")
+            self.default = DEFAULT_PROVIDER
+
+    def register(self, provider: Provider):
+        """
+        Add a provider, or replace the one of the same name, after the registry was built.
+
+        :param provider: The provider; a hedge it names must be registered already.
+        :raises ValueError: If the hedge provider is unknown.
+        """
+        if provider.hedge is not None and provider.hedge not in self.providers and provider.hedge != provider.name:
+            raise ValueError(f"Unknown hedge provider {provider.hedge} for {provider.name}")
+        self.providers[provider.name] = provider
+
+    def names(self) -> list:
+        return list(self.providers)
+
+    def get(self, name: str = None) -> Provider:
+        """
+        :param name: Provider name, None or "" for the default one.
+        :raises ValueError: If there is no such provider.
+        """
+        name = (name or "").strip() or self.default
+        provider = self.providers.get(name)
+        if provider is None:
+            raise ValueError(f"Unknown LLM provider {name!r}, available: {', '.join(self.providers)}")
+        return provider
+
+    def endpoints(self, provider: Provider) -> list:
+        """The provider followed by its hedge, if any."""
+        if provider.hedge is None or provider.hedge == provider.name:
+            return [provider]
+        return [provider, self.providers[provider.hedge]]
+
+
+class LatencyTracker:
+    """
+    Rolling window of recent latencies per endpoint.
+
+    Samples older than max_age are dropped, so an endpoint that stopped
+    getting traffic falls back to its configured rank instead of being
+    judged on old numbers.
+    """
+
+    def __init__(self, window: int = 200, max_age: float = 300.0, min_samples: int = 10):
+        self.window = window
+        self.max_age = max_age
+        self.min_samples = min_samples
+        self._samples = {}  # (url, streamed) -> deque of (time, seconds)
+        self._lock = threading.Lock()
+
+    def record(self, url: str, streamed: bool, seconds: float):
+        key = (url, bool(streamed))
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append((time.monotonic(), seconds))
+
+    def percentile(self, url: str, streamed: bool, percent: float):
+        """
+        :return: The latency percentile in seconds, None with fewer than min_samples recent samples.
+        """
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            samples = self._samples.get((url, bool(streamed)))
+            if not samples:
+                return None
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            values = sorted(seconds for _, seconds in samples)
+        if len(values) < self.min_samples:
+            return None
+        # Nearest rank
+        return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+    def snapshot(self, percent: float) -> dict:
+        """{(url, "stream" or "plain"): percentile} for the endpoints with enough samples."""
+        with self._lock:
+            keys = list(self._samples)
+        snapshot = {}
+        for url, streamed in keys:
+            value = self.percentile(url, streamed, percent)
+            if value is not None:
+                snapshot[(url, "stream" if streamed else "plain")] = value
+        return snapshot
+
+
+class HedgePolicy:
+    """Latency based endpoint order and hedge delay."""
+
+    def __init__(self, tracker: LatencyTracker, percentile: float = 95.0,
+                 default_delay: float = 10.0, min_delay: float = 0.25):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+
+    def plan(self, endpoints: list, streamed: bool):
+        """
+        Order the endpoints of a request and pick the hedge delay.
+
+        :param endpoints: Providers from ProviderRegistry.endpoints, configured order.
+        :param streamed: Whether the request is streamed.
+        :return: (endpoints, delay): the endpoints fastest first (the configured
+                 order while latencies are unknown), and seconds to wait for the
+                 first one before hedging.
+        """
+        latencies = [self.tracker.percentile(endpoint.chat_url, streamed, self.percentile) for endpoint in endpoints]
+        if len(endpoints) > 1 and None not in latencies:
+            order = sorted(range(len(endpoints)), key=lambda index: latencies[index])
+            endpoints = [endpoints[index] for index in order]
+            latencies = [latencies[index] for index in order]
+        delay = self.default_delay if latencies[0] is None else latencies[0]
+        return endpoints, max(self.min_delay, delay)
+
+
+_registry = None
+_tracker = None
+_policy = None
+_lock = threading.Lock()
+
+
+def get_provider_registry() -> ProviderRegistry:
+    """Return the process-wide ProviderRegistry."""
+    global _registry
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                _registry = ProviderRegistry()
+    return _registry
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Return the process-wide LatencyTracker."""
+    global _tracker
+    if _tracker is None:
+        with _lock:
+            if _tracker is None:
+                _tracker = LatencyTracker(
+                    window=env_int("FLUXAGENT_LLM_LATENCY_WINDOW", 200),
+                    max_age=env_float("FLUXAGENT_LLM_LATENCY_MAX_AGE", 300),
+                    min_samples=env_int("FLUXAGENT_LLM_LATENCY_MIN_SAMPLES", 10),
+                )
+    return _tracker
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """Return the process-wide HedgePolicy."""
+    global _policy
+    if _policy is None:
+        tracker = get_latency_tracker()
+        with _lock:
+            if _policy is None:
+                _policy = HedgePolicy(
+                    tracker,
+                    percentile=env_float("FLUXAGENT_LLM_HEDGE_PERCENTILE", 95),
+                    default_delay=env_float("FLUXAGENT_LLM_HEDGE_DELAY", 10),
+                    min_delay=env_float("FLUXAGENT_LLM_HEDGE_MIN_DELAY", 0.25),
+                )
+                LLM_ENDPOINT_LATENCY.function = lambda: tracker.snapshot(_policy.percentile)
+    return _policy
@@ -0,0 +1,242 @@
+"""
+In-process metrics of FluxAgent's LLM traffic, exported in the Prometheus
+text format by DiagnosticsService (GET /X-FluxAgent-metrics).
+
+The metric types are small thread safe implementations of counters, gauges
+and histograms with labels, so no client library is required. Every LLM
+request is labelled with its model and caller ("node", "batch_node",
+"chat", "chat_summary").
+"""
+
+import time
+import bisect
+import threading
+
+# Latency buckets in seconds, from a cached hop to a long completion
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items) -> list:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge set directly, or read from a function at render time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels=(), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> list:
+        if self.function is not None:
+            # function() returns {label values tuple: value}
+            with self._lock:
+                self._values = dict(self.function())
+        return super().render()
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (last one is +Inf), sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def _render_samples(self, items) -> list:
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+_LLM_LABELS = ("model", "caller")
+
+LLM_REQUESTS = REGISTRY.register(Counter(
+    "fluxagent_llm_requests_total", "LLM requests by outcome (success, error, cancelled).", _LLM_LABELS + ("outcome",)))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "fluxagent_llm_errors_total", "Failed LLM requests by error class.", _LLM_LABELS + ("error_class",)))
+LLM_RETRIES = REGISTRY.register(Counter(
+    "fluxagent_llm_retries_total", "LLM request attempts that were retried.", _LLM_LABELS))
+LLM_TTFB = REGISTRY.register(Histogram(
+    "fluxagent_llm_time_to_first_byte_seconds",
+    "Time until the response headers (plain requests) or the first content delta (streams).", _LLM_LABELS))
+LLM_DURATION = REGISTRY.register(Histogram(
+    "fluxagent_llm_request_duration_seconds", "Total LLM request time, retries included.", _LLM_LABELS))
+LLM_PROMPT_TOKENS = REGISTRY.register(Counter(
+    "fluxagent_llm_prompt_tokens_total", "Prompt tokens reported in the usage field.", _LLM_LABELS))
+LLM_COMPLETION_TOKENS = REGISTRY.register(Counter(
+    "fluxagent_llm_completion_tokens_total", "Completion tokens reported in the usage field.", _LLM_LABELS))
+LLM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "fluxagent_llm_in_flight_requests", "LLM requests currently in progress.", _LLM_LABELS))
+LLM_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "fluxagent_llm_cache_lookups_total", "Response cache lookups by result (hit, miss).", _LLM_LABELS + ("result",)))
+LLM_HEDGES = REGISTRY.register(Counter(
+    "fluxagent_llm_hedged_requests_total",
+    "Requests duplicated to a provider's hedge endpoint, by the endpoint that answered first (primary, hedge).",
+    ("provider", "winner")))
+# Set to a function by LLMProviders
+LLM_ENDPOINT_LATENCY = REGISTRY.register(Gauge(
+    "fluxagent_llm_endpoint_latency_seconds",
+    "Rolling hedge percentile latency per endpoint, of whole responses (plain) or first deltas (stream).",
+    ("endpoint", "mode")))
+# Set to a function by ChatBotService
+CHAT_JOBS = REGISTRY.register(Gauge(
+    "fluxagent_chat_jobs", "Chatbot messages admitted, by state (running, waiting).", ("state",)))
+
+
+class RequestTimer:
+    """
+    Metrics of one logical LLM request, from the first attempt to the outcome.
+
+    Call first_byte() when the response starts arriving, then success(),
+    failure() or cancelled(); only the first outcome reported counts.
+    """
+
+    def __init__(self, model: str, caller: str):
+        self.labels = {"model": model or "unknown", "caller": caller or "unknown"}
+        self.started = time.monotonic()
+        self.ttfb = None
+        self.finished = False
+        LLM_IN_FLIGHT.inc(**self.labels)
+
+    def first_byte(self, at: float = None):
+        """:param at: time.monotonic() of the arrival, defaults to now."""
+        if self.ttfb is None:
+            self.ttfb = (time.monotonic() if at is None else at) - self.started
+
+    def retried(self):
+        # Time to first byte is that of the attempt that produced the outcome
+        self.ttfb = None
+        LLM_RETRIES.inc(**self.labels)
+
+    def success(self, usage: dict = None):
+        if self._finish("success"):
+            usage = usage or {}
+            if usage.get("prompt_tokens"):
+                LLM_PROMPT_TOKENS.inc(usage["prompt_tokens"], **self.labels)
+            if usage.get("completion_tokens"):
+                LLM_COMPLETION_TOKENS.inc(usage["completion_tokens"], **self.labels)
+
+    def failure(self, error_class: str):
+        if self._finish("error"):
+            LLM_ERRORS.inc(error_class=error_class, **self.labels)
+
+    def cancelled(self):
+        self._finish("cancelled")
+
+    def _finish(self, outcome: str) -> bool:
+        if self.finished:
+            return False
+        self.finished = True
+        LLM_IN_FLIGHT.dec(**self.labels)
+        LLM_REQUESTS.inc(outcome=outcome, **self.labels)
+        LLM_DURATION.observe(time.monotonic() - self.started, **self.labels)
+        if self.ttfb is not None:
+            LLM_TTFB.observe(self.ttfb, **self.labels)
+        return True
+
+
+def record_cache_lookup(model: str, caller: str, hit: bool):
+    LLM_CACHE_LOOKUPS.inc(model=model or "unknown", caller=caller, result="hit" if hit else "miss")
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return REGISTRY.render()
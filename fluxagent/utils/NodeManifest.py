@@ -0,0 +1,313 @@
+"""
+Node discovery manifest for X-FluxAgent.
+
+load_nodes() in the extension's __init__.py imports every node file under
+fluxagent/ and user/ on each ComfyUI start. The manifest remembers, per file,
+which node classes it exported and the class metadata ComfyUI needs to list
+them (INPUT_TYPES, RETURN_TYPES, CATEGORY, ...). A file whose path, mtime and
+content hash still match its manifest entry is registered through lightweight
+proxy classes, and the real module is only imported the first time one of its
+nodes is executed.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import threading
+import importlib.util
+
+# Bump when the entry layout changes so old manifests are discarded
+MANIFEST_VERSION = 1
+
+# Class-level hooks ComfyUI calls on the node class itself (not on an instance)
+CLASS_HOOKS = ("IS_CHANGED", "VALIDATE_INPUTS")
+
+
+class _Unserializable(Exception):
+    """Raised when a node class attribute can not be stored in the manifest."""
+
+
+def _encode(value):
+    """
+    Encode a class attribute into JSON compatible data.
+
+    Tuples are tagged so they come back as tuples (ComfyUI tells combos from
+    other inputs by list vs tuple). Anything that is not a plain builtin, for
+    example AnyType("*"), makes the node ineligible for lazy loading.
+    """
+    value_type = type(value)
+    if value is None or value_type in (str, int, float, bool):
+        return value
+    if value_type is list:
+        return [_encode(item) for item in value]
+    if value_type is tuple:
+        return {"__tuple__": [_encode(item) for item in value]}
+    if value_type is dict:
+        if not all(type(key) is str for key in value):
+            raise _Unserializable(f"non-string key in {value!r}")
+        if "__tuple__" in value:
+            raise _Unserializable(f"reserved key in {value!r}")
+        return {key: _encode(item) for key, item in value.items()}
+    raise _Unserializable(f"unsupported value {value!r} ({value_type.__name__})")
+
+
+def _decode(value):
+    """Inverse of _encode."""
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if isinstance(value, dict):
+        if "__tuple__" in value:
+            return tuple(_decode(item) for item in value["__tuple__"])
+        return {key: _decode(item) for key, item in value.items()}
+    return value
+
+
+def _file_digest(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _describe_node_class(node_class) -> dict:
+    """
+    Collect the metadata of a node class that ComfyUI reads before execution.
+
+    :param node_class: The node class exported through NODE_CLASS_MAPPINGS.
+    :return: A JSON compatible description of the class.
+    :raises _Unserializable: If any of the metadata can not be stored.
+    """
+    attributes = {}
+    hooks = []
+    for name in dir(node_class):
+        if not name.isupper() or name.startswith("_"):
+            continue
+        value = getattr(node_class, name)
+        if callable(value):
+            if name in CLASS_HOOKS:
+                hooks.append(name)
+            elif name != "INPUT_TYPES":
+                # Some other class level API the proxy would not know to forward
+                raise _Unserializable(f"unknown class hook {name}")
+            continue
+        attributes[name] = _encode(value)
+
+    return {
+        "class_name": node_class.__name__,
+        "attributes": attributes,
+        "input_types": _encode(node_class.INPUT_TYPES()),
+        "hooks": hooks,
+    }
+
+
+def import_node_file(module_name: str, file_path: str):
+    """
+    Import a node file and register it in sys.modules.
+
+    Registering the module lets node files share helpers through relative
+    imports and makes repeated imports (for example from a lazy node proxy)
+    return the already executed module.
+
+    :param module_name: Fully qualified module name.
+    :param file_path: Path to the .py file.
+    :return: The imported module.
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        sys.modules.pop(module_name, None)
+        raise
+    return module
+
+
+class LazyNode:
+    """
+    Base class of the proxies registered for manifest hits.
+
+    ComfyUI only instantiates a node class when it executes it, so __new__ is
+    where the real module gets imported. The instance returned is one of the
+    real node class; class level hooks are forwarded the same way.
+    """
+
+    _module_name = None
+    _file_path = None
+    _class_type = None
+    _input_types = None
+    _node_class = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        return cls.load_node_class()(*args, **kwargs)
+
+    @classmethod
+    def load_node_class(cls):
+        """Import the real module (once) and return the real node class."""
+        if cls._node_class is None:
+            with cls._lock:
+                if cls._node_class is None:
+                    module = import_node_file(cls._module_name, cls._file_path)
+                    cls._node_class = module.NODE_CLASS_MAPPINGS[cls._class_type]
+        return cls._node_class
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        if cls._node_class is not None:
+            return cls._node_class.INPUT_TYPES()
+        return _decode(cls._input_types)
+
+
+def _make_hook(name):
+    def hook(cls, *args, **kwargs):
+        return getattr(cls.load_node_class(), name)(*args, **kwargs)
+    hook.__name__ = name
+    return classmethod(hook)
+
+
+def make_lazy_node(class_type: str, description: dict, module_name: str, file_path: str):
+    """
+    Build a proxy node class from a manifest description.
+
+    :param class_type: The key the node is registered under in NODE_CLASS_MAPPINGS.
+    :param description: The manifest description of the node class.
+    :param module_name: Module to import when the node is first used.
+    :param file_path: File the module is imported from.
+    :return: A LazyNode subclass that ComfyUI can register like the real class.
+    """
+    namespace = {key: _decode(value) for key, value in description["attributes"].items()}
+    namespace.update({
+        "__module__": module_name,
+        "_module_name": module_name,
+        "_file_path": file_path,
+        "_class_type": class_type,
+        "_input_types": description["input_types"],
+        "_lock": threading.Lock(),
+    })
+    for hook in description["hooks"]:
+        namespace[hook] = _make_hook(hook)
+    return type(description["class_name"], (LazyNode,), namespace)
+
+
+class NodeManifest:
+    """
+    Persistent record of the node files discovered by load_nodes().
+
+    Entries are keyed by the file path relative to the extension directory and
+    validated against the file's mtime/size, falling back to a content hash
+    when those changed (for example after a checkout that touched the file).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self._digests = {}
+        self._dirty = False
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def _digest(self, file_path: str, stat) -> str:
+        # lookup() and record() of the same file hash it once
+        key = (file_path, stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = self._digests[key] = _file_digest(file_path)
+        return digest
+
+    def lookup(self, rel_path: str, file_path: str):
+        """
+        Return the manifest entry of a file if it is still up to date.
+
+        :param rel_path: Path relative to the extension directory (the key).
+        :param file_path: Absolute path of the file.
+        :return: The entry dict, or None if the file is new or has changed.
+        """
+        entry = self.entries.get(rel_path)
+        if entry is None:
+            return None
+
+        stat = os.stat(file_path)
+        if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry
+
+        if entry["sha256"] != self._digest(file_path, stat):
+            return None
+
+        # Same content, only the timestamp moved
+        entry["mtime_ns"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        self._dirty = True
+        return entry
+
+    def record(self, rel_path: str, file_path: str, module) -> dict:
+        """
+        Store the entry for a freshly imported node file.
+
+        :param rel_path: Path relative to the extension directory (the key).
+        :param file_path: Absolute path of the file.
+        :param module: The imported module.
+        :return: The new entry.
+        """
+        stat = os.stat(file_path)
+        class_mappings = getattr(module, "NODE_CLASS_MAPPINGS", None) or {}
+        entry = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": self._digest(file_path, stat),
+            "display_names": dict(getattr(module, "NODE_DISPLAY_NAME_MAPPINGS", None) or {}),
+            "nodes": {},
+            # Files without nodes are imported for their side effects
+            # (e.g. ChatBotService registering routes), so never skip them
+            "lazy": bool(class_mappings),
+        }
+
+        try:
+            _encode(entry["display_names"])
+            for class_type, node_class in class_mappings.items():
+                entry["nodes"][class_type] = _describe_node_class(node_class)
+        except Exception:
+            entry["nodes"] = {}
+            entry["lazy"] = False
+
+        self.entries[rel_path] = entry
+        self._dirty = True
+        return entry
+
+    def forget(self, rel_path: str):
+        """Drop the entry of a file that failed to load."""
+        if self.entries.pop(rel_path, None) is not None:
+            self._dirty = True
+
+    def save(self, keep=None):
+        """
+        Write the manifest back to disk if anything changed.
+
+        :param keep: Optional iterable of relative paths seen during this
+                     scan; entries of files that disappeared are dropped.
+        """
+        if keep is not None:
+            keep = set(keep)
+            for rel_path in list(self.entries):
+                if rel_path not in keep:
+                    del self.entries[rel_path]
+                    self._dirty = True
+
+        if not self._dirty:
+            return
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
@@ -0,0 +1,181 @@
+"""
+Interruptible LLM requests for node executions.
+
+ComfyUI runs a node's function on its executor thread and only notices
+Cancel/Interrupt between nodes, so a node blocked in an HTTP call keeps the
+executor until the provider answers. Nodes instead run their request as a
+coroutine on a shared event loop thread and wait for it in short slices,
+checking ComfyUI's interruption flag in between. On interrupt the task is
+cancelled, which closes its aiohttp connection right away, and ComfyUI's
+InterruptProcessingException is raised so the executor moves on at once.
+
+While waiting, the streamed token count and elapsed time are reported
+through comfy.utils.ProgressBar, and as the node's progress text on ComfyUI
+versions that have it. Outside ComfyUI (tests, benchmarks) requests still run
+on the loop, without interruption or progress.
+
+Configuration (.env):
+
+    FLUXAGENT_NODE_POLL_MS   interval between interruption checks and progress updates (100)
+"""
+
+import time
+import atexit
+import asyncio
+import importlib
+import threading
+import concurrent.futures
+
+from .HttpClient import close_async_sessions
+from .Env import env_int
+
+POLL_INTERVAL = env_int("FLUXAGENT_NODE_POLL_MS", 100) / 1000
+
+# Progress bar range before the first token, doubled whenever the count passes it
+DEFAULT_PROGRESS_TOKENS = 1000
+
+
+_comfy_modules = {}
+
+
+def _comfy_module(name: str):
+    """A ComfyUI module, None outside ComfyUI."""
+    if name not in _comfy_modules:
+        try:
+            _comfy_modules[name] = importlib.import_module(name)
+        except ImportError:
+            _comfy_modules[name] = None
+    return _comfy_modules[name]
+
+
+class BackgroundLoop:
+    """An asyncio event loop on a daemon thread, started on first use."""
+
+    def __init__(self, name: str = "FluxAgentNodeLoop"):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self.loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, name=self.name, daemon=True)
+            self._thread.start()
+            self.loop = loop
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """
+        Schedule a coroutine on the loop.
+
+        :param coro: The coroutine.
+        :return: Its future; cancelling the future cancels the task.
+        """
+        if self.loop is None:
+            self._start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        """Close the loop's HTTP session and stop the loop."""
+        if self.loop is None:
+            return
+        try:
+            self.submit(close_async_sessions()).result(timeout=5)
+        except Exception as e:
+            print(f"Warning: Could not close the node HTTP session: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self.loop = None
+        self._thread = None
+
+
+class RequestProgress:
+    """
+    Progress of one node request: the coroutine counts the tokens it
+    receives, the waiting executor thread reports them.
+    """
+
+    def __init__(self, node_id: str = None, total: int = DEFAULT_PROGRESS_TOKENS):
+        """
+        :param node_id: The node's UNIQUE_ID, for its progress text.
+        :param total: Expected tokens, the range of the progress bar.
+        """
+        self.node_id = node_id
+        self.total = total
+        self.tokens = 0
+        self.started = time.monotonic()
+        self._bar = None
+        self._reported = None
+        self._text = None
+
+    def text(self) -> str:
+        elapsed = time.monotonic() - self.started
+        if not self.tokens:
+            return f"Waiting for the response, {elapsed:.0f}s"
+        return f"{self.tokens} tokens, {elapsed:.0f}s"
+
+    def report(self):
+        """Send the changes since the last report to ComfyUI."""
+        comfy_utils = _comfy_module("comfy.utils")
+        if comfy_utils is None:
+            return
+        tokens = self.tokens
+        if tokens != self._reported:
+            while tokens >= self.total:
+                self.total *= 2
+            if self._bar is None:
+                self._bar = comfy_utils.ProgressBar(self.total)
+            self._bar.update_absolute(tokens, self.total)
+            self._reported = tokens
+
+        text = self.text()
+        if text != self._text and self.node_id is not None:
+            server = _comfy_module("server")
+            instance = getattr(getattr(server, "PromptServer", None), "instance", None)
+            # Only in recent ComfyUI versions
+            if hasattr(instance, "send_progress_text"):
+                instance.send_progress_text(text, self.node_id)
+            self._text = text
+
+
+def run_interruptible(coro, progress: RequestProgress = None):
+    """
+    Run a coroutine on the node loop, from a node execution, until it
+    finishes or ComfyUI is interrupted.
+
+    :param coro: The request coroutine.
+    :param progress: Optional progress the coroutine updates, reported while waiting.
+    :return: The coroutine's result.
+    :raises comfy.model_management.InterruptProcessingException: If the user
+            interrupted the prompt; the coroutine is cancelled first.
+    """
+    model_management = _comfy_module("comfy.model_management")
+    future = get_background_loop().submit(coro)
+    while True:
+        try:
+            return future.result(timeout=POLL_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            pass
+        if model_management is not None and model_management.processing_interrupted():
+            # The connection is closed on the loop, no need to wait for it
+            future.cancel()
+            model_management.throw_exception_if_processing_interrupted()
+        if progress is not None:
+            progress.report()
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Return the process-wide BackgroundLoop node requests run on."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                _loop = BackgroundLoop()
+                atexit.register(_loop.stop)
+    return _loop
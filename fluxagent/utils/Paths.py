@@ -0,0 +1,21 @@
+"""
+Where FluxAgent keeps the files it generates for itself (caches, built
+assets), shared by every module that writes them.
+"""
+
+import os
+
+EXTENSION_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+def default_cache_dir() -> str:
+    """
+    :return: X-FluxAgent in ComfyUI's user directory, or <extension>/.cache/X-FluxAgent
+             when running outside ComfyUI (benchmarks, scripts).
+    """
+    try:
+        import folder_paths
+        base_dir = folder_paths.get_user_directory()
+    except ImportError:
+        base_dir = os.path.join(EXTENSION_DIR, ".cache")
+    return os.path.join(base_dir, "X-FluxAgent")
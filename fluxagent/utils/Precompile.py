@@ -0,0 +1,88 @@
+"""
+Parallel bytecode precompilation for node files.
+
+Compiling a cold tree of generated user nodes is CPU bound and happens one
+file at a time inside the serial import pass of load_nodes(). This module
+compiles the stale files up front in a process pool so the import pass only
+has to load the cached bytecode.
+"""
+
+import os
+import sys
+import struct
+import py_compile
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+
+def is_stale(file_path: str) -> bool:
+    """
+    Check whether the cached bytecode of a source file is missing or outdated.
+
+    Mirrors the timestamp validation done by the import system; hash based
+    pycs are left to the import system to validate.
+
+    :param file_path: Path to the .py file.
+    :return: True if the file needs to be compiled.
+    """
+    try:
+        cache_path = importlib.util.cache_from_source(file_path)
+        with open(cache_path, "rb") as f:
+            header = f.read(16)
+        stat = os.stat(file_path)
+    except (OSError, NotImplementedError):
+        return True
+
+    if len(header) < 16 or header[:4] != importlib.util.MAGIC_NUMBER:
+        return True
+
+    flags, mtime, size = struct.unpack("<III", header[4:16])
+    if flags != 0:
+        return False
+    return mtime != (int(stat.st_mtime) & 0xFFFFFFFF) or size != (stat.st_size & 0xFFFFFFFF)
+
+
+def _compile(file_path: str):
+    """
+    Compile one file in a pool worker.
+
+    :return: The compile error message, None on success. PyCompileError
+             itself cannot be unpickled in the parent process.
+    """
+    try:
+        py_compile.compile(file_path, doraise=True)
+    except py_compile.PyCompileError as e:
+        return e.msg
+    return None
+
+
+def precompile(file_paths, workers: int) -> dict:
+    """
+    Compile the stale files among file_paths in a process pool.
+
+    :param file_paths: Source files that are about to be imported.
+    :param workers: Maximum number of worker processes.
+    :return: Dict with the number of compiled files and the compile errors
+             by file path. Errors are reported again by the import itself.
+    """
+    result = {"workers": workers, "compiled": 0, "errors": {}}
+    if sys.dont_write_bytecode or workers <= 0:
+        return result
+
+    stale = [path for path in file_paths if is_stale(path)]
+    # A pool is not worth its startup cost for a single file
+    if len(stale) < 2:
+        return result
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(stale))) as executor:
+        futures = {path: executor.submit(_compile, path) for path in stale}
+        for path, future in futures.items():
+            try:
+                error = future.result()
+            except Exception as e:
+                error = str(e)
+            if error is None:
+                result["compiled"] += 1
+            else:
+                result["errors"][path] = error
+    return result
@@ -0,0 +1,274 @@
+"""
+Process-wide rate limiting, retries and circuit breaking for LLM calls.
+
+Every chat completion made through LLMClient, from any node instance or the
+chat route, passes through the same objects:
+
+- RateLimiter: token buckets for requests/min and tokens/min per model,
+- RetryPolicy: jittered exponential backoff that honours Retry-After,
+- CircuitBreaker: fails fast for an endpoint after repeated server errors.
+
+Configuration (.env):
+
+    FLUXAGENT_RATE_LIMITS            JSON limits per model, "default" applies to the
+                                     others, e.g. {"default": {"rpm": 500, "tpm": 200000},
+                                     "gpt-4.1": {"rpm": 60}}; unset means unlimited
+    FLUXAGENT_LLM_MAX_RETRIES        retries after the first attempt (4)
+    FLUXAGENT_LLM_RETRY_BASE_DELAY   first backoff step in seconds (1)
+    FLUXAGENT_LLM_RETRY_MAX_DELAY    longest wait between attempts in seconds, a longer
+                                     Retry-After fails the request right away (60)
+    FLUXAGENT_LLM_BREAKER_FAILURES   consecutive failures that open the circuit (5)
+    FLUXAGENT_LLM_BREAKER_COOLDOWN   seconds the circuit stays open (30)
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+from .Tokenizer import count_messages_tokens
+from .Env import env_float, env_int
+
+# HTTP statuses worth retrying: timeouts, rate limiting and server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_request_tokens(payload: dict) -> int:
+    """
+    Rough token count of a request for the tokens/min budget.
+
+    The approximate prompt size plus the completion budget when the request
+    sets one.
+    """
+    prompt_tokens = count_messages_tokens(payload.get("messages", []))
+    return prompt_tokens + int(payload.get("max_tokens") or payload.get("max_completion_tokens") or 0)
+
+
+def parse_retry_after(headers) -> float:
+    """
+    Read the server's requested delay from response headers.
+
+    :param headers: Case-insensitive response headers.
+    :return: Seconds to wait, or None if the server did not say.
+    """
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute.
+
+    reserve() takes the tokens immediately, letting the balance go negative,
+    and returns how long the caller has to wait for them. Callers never hold
+    the lock while waiting, so the same bucket serves threads and coroutines.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount: float):
+        """Give back (positive) or take (negative) tokens after the fact."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Requests/min and tokens/min buckets per model."""
+
+    def __init__(self, limits: dict = None):
+        if limits is None:
+            try:
+                limits = json.loads(os.getenv("FLUXAGENT_RATE_LIMITS", "") or "{}")
+            except ValueError as e:
+                print(f"Warning: Invalid FLUXAGENT_RATE_LIMITS, rate limiting disabled: {e}")
+                limits = {}
+        self.limits = limits
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _model_buckets(self, model: str):
+        buckets = self._buckets.get(model)
+        if buckets is None:
+            with self._lock:
+                buckets = self._buckets.get(model)
+                if buckets is None:
+                    limit = self.limits.get(model, self.limits.get("default", {}))
+                    rpm, tpm = limit.get("rpm"), limit.get("tpm")
+                    buckets = (TokenBucket(rpm) if rpm else None, TokenBucket(tpm) if tpm else None)
+                    self._buckets[model] = buckets
+        return buckets
+
+    def reserve(self, model: str, tokens: int) -> float:
+        """
+        Reserve one request and an estimated number of tokens.
+
+        :return: Seconds to wait before sending the request.
+        """
+        requests_bucket, tokens_bucket = self._model_buckets(model)
+        wait = 0.0
+        if requests_bucket is not None:
+            wait = max(wait, requests_bucket.reserve(1))
+        if tokens_bucket is not None:
+            wait = max(wait, tokens_bucket.reserve(tokens))
+        return wait
+
+    def record_usage(self, model: str, estimated: int, result: dict):
+        """Correct the tokens/min bucket with the usage reported by the server."""
+        _, tokens_bucket = self._model_buckets(model)
+        usage = (result or {}).get("usage") or {}
+        if tokens_bucket is not None and usage.get("total_tokens"):
+            tokens_bucket.adjust(estimated - usage["total_tokens"])
+
+
+class RetryPolicy:
+    """Jittered exponential backoff for retryable LLM errors."""
+
+    def __init__(self):
+        self.max_retries = env_int("FLUXAGENT_LLM_MAX_RETRIES", 4)
+        self.base_delay = env_float("FLUXAGENT_LLM_RETRY_BASE_DELAY", 1)
+        self.max_delay = env_float("FLUXAGENT_LLM_RETRY_MAX_DELAY", 60)
+
+    def should_retry(self, error, attempt: int) -> bool:
+        """
+        :param error: The LLMError of the failed attempt.
+        :param attempt: Number of retries already made.
+        :return: False as well when the server asked to wait longer than max_delay,
+                 the error (with its retry_after) is better reported at once.
+        """
+        if error.retry_after is not None and error.retry_after > self.max_delay:
+            return False
+        return attempt < self.max_retries and error.retryable
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        """Full jitter backoff, never shorter than the server's Retry-After nor longer than max_delay."""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return min(max(retry_after, backoff), self.max_delay)
+        return backoff
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint breaker.
+
+    Closed: requests flow. After failure_threshold consecutive retryable
+    failures it opens and rejects requests for cooldown seconds, then lets a
+    single trial request through (half-open); success closes it again. A
+    trial that never reports back (e.g. cancelled) expires after cooldown.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        :return: None if the request may go out, otherwise seconds until the
+                 circuit half-opens.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return None
+            now = time.monotonic()
+            remaining = self.opened_at + self.cooldown - now
+            if remaining > 0:
+                return remaining
+            if self.trial_started is not None and now - self.trial_started < self.cooldown:
+                return self.trial_started + self.cooldown - now
+            self.trial_started = now
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started = None
+
+    def record_failure(self, error):
+        # 429 means we are too fast, not that the endpoint is down
+        if not error.retryable or error.status == 429:
+            with self._lock:
+                self.trial_started = None
+            return
+        with self._lock:
+            self.failures += 1
+            self.trial_started = None
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+_rate_limiter = None
+_retry_policy = None
+_breakers = {}
+_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide RateLimiter."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Return the process-wide RetryPolicy."""
+    global _retry_policy
+    if _retry_policy is None:
+        with _lock:
+            if _retry_policy is None:
+                _retry_policy = RetryPolicy()
+    return _retry_policy
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    """Return the CircuitBreaker of an endpoint URL."""
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.get(endpoint)
+            if breaker is None:
+                breaker = _breakers[endpoint] = CircuitBreaker(
+                    failure_threshold=env_int("FLUXAGENT_LLM_BREAKER_FAILURES", 5),
+                    cooldown=env_float("FLUXAGENT_LLM_BREAKER_COOLDOWN", 30),
+                )
+    return breaker
@@ -0,0 +1,210 @@
+"""
+Content-addressed cache of LLM responses.
+
+Responses are keyed by LLMClient.request_key(), a hash of the endpoint, model,
+messages and sampling parameters, and kept in two tiers:
+
+- an in-memory LRU bounded by entry count and total size,
+- an SQLite database under the ComfyUI user directory that survives restarts.
+
+Both tiers expire entries after a TTL. Configuration (.env):
+
+    FLUXAGENT_LLM_CACHE_TTL          seconds an entry stays valid (604800, one week)
+    FLUXAGENT_LLM_CACHE_MAX_ENTRIES  in-memory entries (1024)
+    FLUXAGENT_LLM_CACHE_MAX_BYTES    in-memory size of the cached texts (67108864)
+    FLUXAGENT_LLM_CACHE_DISK_ENTRIES on-disk entries, 0 disables the disk tier (100000)
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from .Env import env_float, env_int
+from .Paths import default_cache_dir
+
+
+class MemoryCache:
+    """Thread safe LRU with a size budget and per-entry expiry."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def put(self, key: str, value: str, expires_at: float = None):
+        size = len(value)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at or time.time() + self.ttl, value)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class DiskCache:
+    """SQLite backed tier shared by every thread of the process."""
+
+    # Expired and overflowing rows are pruned every PRUNE_EVERY writes
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+
+    def get(self, key: str):
+        """Return (value, expires_at) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+
+class ResponseCache:
+    """
+    Two tier response cache.
+
+    Lookups go to memory first, then to disk; disk hits are promoted to the
+    memory tier with their remaining lifetime.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        ttl = env_float("FLUXAGENT_LLM_CACHE_TTL", 604800)
+        self.memory = MemoryCache(
+            max_entries=env_int("FLUXAGENT_LLM_CACHE_MAX_ENTRIES", 1024),
+            max_bytes=env_int("FLUXAGENT_LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+            ttl=ttl,
+        )
+
+        self.disk = None
+        disk_entries = env_int("FLUXAGENT_LLM_CACHE_DISK_ENTRIES", 100000)
+        if disk_entries > 0:
+            path = os.path.join(cache_dir or default_cache_dir(), "llm_cache.sqlite3")
+            try:
+                self.disk = DiskCache(path, disk_entries, ttl)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: LLM response disk cache disabled, could not open {path}: {e}")
+
+    def get(self, key: str):
+        """
+        Look up a cached response.
+
+        :param key: The request key.
+        :return: The cached text, or None on a miss.
+        """
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+
+        try:
+            row = self.disk.get(key)
+        except sqlite3.Error as e:
+            print(f"Warning: LLM response disk cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        self.memory.put(key, row[0], expires_at=row[1])
+        return row[0]
+
+    def contains(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def put(self, key: str, value: str):
+        """
+        Store a response in both tiers.
+
+        :param key: The request key.
+        :param value: The response text.
+        """
+        self.memory.put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, value)
+            except sqlite3.Error as e:
+                print(f"Warning: LLM response disk cache write failed: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide ResponseCache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,338 @@
+"""
+Worker process of the code sandbox, see CodeSandbox.py.
+
+Run as a script by the sandbox pool, it leaves the network (Linux, where
+unprivileged user namespaces are allowed), preloads the configured modules,
+applies the memory, file size and open file limits and then executes the
+code it is sent, one run at a time, until its stdin is closed. It imports
+nothing from the extension, so it starts without ComfyUI.
+
+Messages in both directions are length prefixed pickles. Values passed
+to and from the code (payloads) are pickled with protocol 5; payloads of
+at least the shared memory threshold are written to a shared memory block
+and only the block's name travels through the pipe. A block is unlinked by
+the process that created it once the other side has answered, the reader
+only copies it.
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import ctypes
+import struct
+import marshal
+import importlib
+import traceback
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+
+try:
+    import resource
+    import signal
+except ImportError:  # Windows, only the wall timeout applies
+    resource = None
+
+_HEADER = struct.Struct("<Q")
+
+# unshare(2) flags
+CLONE_NEWNET = 0x40000000
+CLONE_NEWUSER = 0x10000000
+
+# Open files a worker may hold, after the preloaded modules
+MAX_OPEN_FILES = 256
+
+
+def write_frame(stream, message):
+    """
+    Send a message through a binary stream.
+
+    :param stream: Writable binary stream.
+    :param message: Picklable message.
+    """
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(data)))
+    stream.write(data)
+    stream.flush()
+
+
+def read_frame(stream):
+    """
+    Receive a message sent by write_frame().
+
+    :param stream: Readable binary stream.
+    :return: The message, or None once the stream is closed.
+    """
+    header = _read_exactly(stream, _HEADER.size)
+    if header is None:
+        return None
+    data = _read_exactly(stream, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return pickle.loads(data)
+
+
+def _read_exactly(stream, size: int):
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def dump_payload(value, shm_threshold: int):
+    """
+    Serialize a value for the other process.
+
+    :param value: Picklable value.
+    :param shm_threshold: Smallest payload in bytes passed through shared memory.
+    :return: (descriptor, block), block is the SharedMemory to unlink once
+             the other side answered, or None.
+    """
+    buffers = []
+    data = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+    sizes = [len(data)] + [raw.nbytes for raw in raws]
+    if sum(sizes) < shm_threshold:
+        return ("inline", data, [raw.tobytes() for raw in raws]), None
+
+    block = shared_memory.SharedMemory(create=True, size=max(1, sum(sizes)))
+    offset = 0
+    for part in [memoryview(data)] + raws:
+        block.buf[offset:offset + part.nbytes] = part.cast("B")
+        offset += part.nbytes
+    return ("shm", block.name, sizes), block
+
+
+def load_payload(descriptor):
+    """
+    Deserialize a value sent with dump_payload().
+
+    :param descriptor: The descriptor returned by dump_payload().
+    :return: The value.
+    """
+    if descriptor[0] == "inline":
+        _, data, buffers = descriptor
+        return pickle.loads(data, buffers=buffers)
+
+    _, name, sizes = descriptor
+    block = _attach(name)
+    try:
+        view = block.buf
+        data = bytes(view[:sizes[0]])
+        buffers = []
+        offset = sizes[0]
+        for size in sizes[1:]:
+            # Copied so the block can go, bytearray keeps arrays writable
+            buffers.append(bytearray(view[offset:offset + size]))
+            offset += size
+        del view
+    finally:
+        block.close()
+    return pickle.loads(data, buffers=buffers)
+
+
+def release(block):
+    """Close and unlink a block created by dump_payload()."""
+    if block is None:
+        return
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _attach(name: str):
+    # Attaching registers the block with this process's resource tracker on
+    # POSIX, which would unlink it at exit; the creator owns it
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        block = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+class CPUTimeExceeded(BaseException):
+    """Raised in the code when its CPU time runs out, not caught by except Exception."""
+
+
+def _on_cpu_limit(signum, frame):
+    raise CPUTimeExceeded("CPU time limit exceeded")
+
+
+@contextmanager
+def _cpu_limit(seconds: float):
+    if resource is None or seconds <= 0:
+        yield
+        return
+    # RLIMIT_CPU counts the whole process, the limit is moved along each run
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    previous, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime + seconds + 0.999)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (previous, hard))
+
+
+def _apply_memory_limit(memory_mb: int):
+    if resource is None or memory_mb <= 0:
+        return
+    limit = memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError) as e:
+        print(f"Warning: Sandbox worker could not limit its memory to {memory_mb}MB: {e}", file=sys.stderr)
+
+
+def _unshare(flags: int):
+    if hasattr(os, "unshare"):  # Python 3.12+
+        os.unshare(flags)
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(flags) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def _leave_network() -> bool:
+    """Move the process to a new network namespace with no interfaces, False if the system does not allow it."""
+    if not sys.platform.startswith("linux"):
+        return False
+    # Root may create the namespace directly, other users inside a user namespace of their own
+    for flags in (CLONE_NEWNET, CLONE_NEWUSER | CLONE_NEWNET):
+        try:
+            _unshare(flags)
+            return True
+        except (OSError, AttributeError):
+            pass
+    return False
+
+
+def _limit(name: str, value: int, what: str):
+    if resource is None or value <= 0 or not hasattr(resource, name):
+        return
+    limit = getattr(resource, name)
+    _, hard = resource.getrlimit(limit)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    try:
+        resource.setrlimit(limit, (value, hard))
+    except (ValueError, OSError) as e:
+        print(f"Warning: Sandbox worker could not limit its {what}: {e}", file=sys.stderr)
+
+
+def _preload(modules) -> list:
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            # Optional modules, the code may not need them
+            pass
+    return loaded
+
+
+def _run(message, codes: dict, shm_threshold: int):
+    _, key, code_bytes, inputs, output_names, cpu_seconds = message
+    code = codes.get(key)
+    if code is None:
+        code = codes[key] = marshal.loads(code_bytes)
+
+    namespace = {"__name__": "__fluxagent_codegen__"}
+    namespace.update(load_payload(inputs))
+    start = time.perf_counter()
+    with _cpu_limit(cpu_seconds):
+        exec(code, namespace)
+    elapsed = time.perf_counter() - start
+
+    outputs = tuple(namespace.get(name) for name in output_names)
+    try:
+        descriptor, block = dump_payload(outputs, shm_threshold)
+    except Exception as e:
+        raise TypeError(f"Outputs could not be sent back to ComfyUI: {e}") from None
+    return ("ok", descriptor, elapsed), block
+
+
+def _error_reply(error: BaseException, fatal: bool):
+    # Drop the worker's own frames, the code's frames start below exec()
+    tb = error.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename == __file__:
+        tb = tb.tb_next
+    text = "".join(traceback.format_exception(type(error), error, tb))
+    return ("error", type(error).__name__, str(error), text, fatal)
+
+
+def main(config: dict):
+    """
+    Serve runs until stdin is closed.
+
+    :param config: preload (module names), memory_mb, file_mb, isolate_network and shm_threshold.
+    """
+    # Messages use the original stdin/stdout; prints of the code go to stderr
+    # and input() reads nothing
+    channel_in = os.fdopen(os.dup(0), "rb")
+    channel_out = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+
+    if resource is not None and hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+        # Writes past the file size limit fail with OSError instead of killing the worker
+        signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    isolated = _leave_network() if config.get("isolate_network", True) else None
+    loaded = _preload(config.get("preload", []))
+    _apply_memory_limit(int(config.get("memory_mb", 0)))
+    _limit("RLIMIT_FSIZE", int(config.get("file_mb", 0)) * 1024 * 1024, "file size")
+    _limit("RLIMIT_NOFILE", MAX_OPEN_FILES, "open files")
+    shm_threshold = int(config.get("shm_threshold", 1024 * 1024))
+    write_frame(channel_out, ("ready", os.getpid(), loaded, isolated))
+
+    codes = {}  # (source hash, filename) -> code object
+    block = None
+    try:
+        while True:
+            message = read_frame(channel_in)
+            # The pool has read the previous reply
+            release(block)
+            block = None
+            if message is None:
+                break
+
+            fatal = False
+            try:
+                reply, block = _run(message, codes, shm_threshold)
+            except (CPUTimeExceeded, MemoryError) as e:
+                # The code stopped anywhere, the worker is not trusted afterwards
+                fatal = True
+                reply = _error_reply(e, fatal)
+            except BaseException as e:
+                if isinstance(e, KeyboardInterrupt):
+                    raise
+                reply = _error_reply(e, fatal)
+
+            write_frame(channel_out, reply)
+            if fatal:
+                break
+    finally:
+        release(block)
+
+
+if __name__ == "__main__":
+    main(json.loads(sys.argv[1]) if len(sys.argv) > 1 else {})
@@ -0,0 +1,207 @@
+"""
+Single-flight coalescing of identical in-flight LLM requests.
+
+When the same completion (same LLMClient.request_key()) is requested again
+while a first call is still running, the later callers wait for that call
+instead of sending their own: everyone gets the same result or the same
+error. Nothing is kept once the call finishes; that is ResponseCache's job.
+
+SingleFlight serves blocking callers (batch workers) and AsyncSingleFlight
+coroutines on an event loop (the server's, or the one node executions run
+their requests on), including streamed responses that late joiners replay
+from the start.
+
+Configuration (.env):
+
+    FLUXAGENT_LLM_SINGLE_FLIGHT   1 to share identical in-flight requests (1)
+"""
+
+import os
+import asyncio
+import threading
+
+
+def single_flight_enabled() -> bool:
+    return os.getenv("FLUXAGENT_LLM_SINGLE_FLIGHT", "1") == "1"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Thread based single-flight group."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn):
+        """
+        Run fn(), or wait for the call already running under key.
+
+        :param key: Identity of the request.
+        :param fn: Callable doing the request.
+        :return: The result of the shared call.
+        :raises Exception: The error of the shared call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                print(f"Single-flight: {call.waiters} identical request(s) shared one call")
+            call.done.set()
+        return call.result
+
+
+class _SharedStream:
+    """One upstream stream replayed to every subscriber."""
+
+    def __init__(self, agen):
+        self.parts = []
+        self.finished = False
+        self.error = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(agen))
+
+    async def _pump(self, agen):
+        try:
+            async for delta in agen:
+                self.parts.append(delta)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        index = 0
+        try:
+            while True:
+                while index < len(self.parts):
+                    yield self.parts[index]
+                    index += 1
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.finished:
+                # Nobody is listening any more, abort the upstream request
+                self.task.cancel()
+
+
+class AsyncSingleFlight:
+    """
+    Single-flight group for coroutines of one event loop.
+
+    The shared call runs in its own task, so a caller that is cancelled (its
+    client disconnected) does not abort it for the others; the upstream
+    request is only cancelled when every caller has gone.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> [task, waiters]
+        self._streams = {}
+
+    async def do(self, key: str, coro_fn):
+        """
+        Await coro_fn(), or the call already running under key.
+
+        :param key: Identity of the request.
+        :param coro_fn: Coroutine function doing the request.
+        :return: The result of the shared call.
+        """
+        entry = self._calls.get(key)
+        if entry is None:
+            entry = self._calls[key] = [asyncio.ensure_future(coro_fn()), 0]
+            entry[0].add_done_callback(lambda _: self._calls.pop(key, None))
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if entry[0].cancelled() or entry[1] > 1:
+                raise
+            entry[0].cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def stream(self, key: str, agen_fn):
+        """
+        Iterate agen_fn(), or join the stream already running under key.
+
+        A joining caller first receives the deltas sent so far.
+
+        :param key: Identity of the request.
+        :param agen_fn: Function returning the async iterator of deltas.
+        :return: Async iterator of deltas.
+        """
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _SharedStream(agen_fn())
+            shared.task.add_done_callback(lambda _: self._streams.pop(key, None))
+        shared.subscribers += 1
+        return shared.subscribe()
+
+
+_single_flight = None
+_async_single_flights = {}
+_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide SingleFlight group."""
+    global _single_flight
+    if _single_flight is None:
+        with _lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
+
+
+def get_async_single_flight() -> AsyncSingleFlight:
+    """
+    Return the AsyncSingleFlight group of the running event loop.
+
+    Its tasks belong to that loop, so each loop has its own group.
+    """
+    loop = asyncio.get_running_loop()
+    group = _async_single_flights.get(loop)
+    if group is None:
+        group = _async_single_flights[loop] = AsyncSingleFlight()
+    return group
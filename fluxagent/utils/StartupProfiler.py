@@ -0,0 +1,130 @@
+"""
+Opt-in startup instrumentation for load_nodes().
+
+Set FLUXAGENT_PROFILE_STARTUP=1 to record, for every discovered node file, the
+import wall time, the Python memory allocated while importing it (tracemalloc)
+and the failure reason if it did not load. The report is written to
+.cache/startup_report.json and served by DiagnosticsService on
+/X-FluxAgent-startup-report.
+"""
+
+import os
+import json
+import time
+import traceback
+import tracemalloc
+from contextlib import contextmanager
+
+EXTENSION_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+REPORT_PATH = os.path.join(EXTENSION_DIR, ".cache", "startup_report.json")
+
+# Report of the last profiled load_nodes() run in this process
+LAST_REPORT = None
+
+
+class StartupProfiler:
+    """
+    Collects per-file timings during load_nodes().
+
+    A disabled profiler keeps the same interface but records nothing, so
+    load_nodes() does not need to branch on it.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.files = []
+        self.stages = {}
+        self._started = time.perf_counter()
+        self._started_tracemalloc = False
+
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    @contextmanager
+    def measure(self, rel_path: str, mode: str):
+        """
+        Time the import of one node file.
+
+        Exceptions are recorded and re-raised so the caller keeps its own
+        error handling.
+
+        :param rel_path: File path relative to the extension directory.
+        :param mode: "import" for a real import, "lazy" for a manifest hit.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        record = {"file": rel_path, "mode": mode, "error": None}
+        memory_before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            record["traceback"] = traceback.format_exc(limit=-5)
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            memory_after, peak = tracemalloc.get_traced_memory()
+            record["memory_delta_bytes"] = memory_after - memory_before
+            record["memory_peak_bytes"] = max(peak - memory_before, 0)
+            self.files.append(record)
+
+    def record_stage(self, name: str, seconds: float, **details):
+        """Record a whole-run stage such as the bytecode precompile."""
+        if self.enabled:
+            self.stages[name] = {"seconds": seconds, **details}
+
+    def finish(self):
+        """
+        Build the report, keep it in memory and write it to REPORT_PATH.
+
+        :return: The report dict, or None when profiling is disabled.
+        """
+        global LAST_REPORT
+
+        if not self.enabled:
+            return None
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        files = sorted(self.files, key=lambda r: r["seconds"], reverse=True)
+        report = {
+            "created_at": time.time(),
+            "total_seconds": time.perf_counter() - self._started,
+            "imported": sum(1 for r in files if r["mode"] == "import"),
+            "lazy": sum(1 for r in files if r["mode"] == "lazy"),
+            "failed": sum(1 for r in files if r["error"]),
+            "stages": self.stages,
+            "files": files,
+        }
+        LAST_REPORT = report
+
+        try:
+            os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+            with open(REPORT_PATH, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            print(f"Warning: Failed to write startup report {REPORT_PATH}: {e}")
+
+        return report
+
+
+def load_report():
+    """
+    Return the most recent startup report.
+
+    :return: The report of this process if it was profiled, otherwise the last
+             one written to disk, or None if there is none.
+    """
+    if LAST_REPORT is not None:
+        return LAST_REPORT
+    try:
+        with open(REPORT_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
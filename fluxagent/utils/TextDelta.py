@@ -0,0 +1,217 @@
+"""
+Compact UI updates for large texts shown in node widgets.
+
+Texts are kept here by version and served in slices from GET
+/X-FluxAgent-rich-text (RichTextService); the ui result of a node, which
+the prompt history keeps, only names the version (see summary()). The
+browser that queued the prompt is also sent an update against the version
+it was sent last time: the range of the old text to replace and the text to
+insert there, so the widget edits its document in place instead of
+reloading it. Small inserts travel inside the update; larger ones are
+fetched by the widget. The version last sent is tracked per (client id,
+node id), as every browser tab has its own copy of the widget.
+
+An update is a dict:
+
+    hash         version of the new text, see text_hash()
+    length       length of the new text in UTF-16 code units (JavaScript)
+    base         version the update applies to, None to replace everything
+    start        first replaced code unit of the base version
+    delete       replaced code units
+    insert       inserted text, or, when it is fetched in slices:
+    insert_from  first inserted character (code point) of the new text
+    insert_to    end of the inserted characters
+    chunk_chars  characters per slice
+
+The widget checks the hash of its text against base before applying an
+update, and against hash afterwards; on a mismatch it fetches the whole
+current version instead (resync). A version named by a ui result (an
+execution, or one replayed from the history) is fetched the same way
+unless the widget already shows it.
+
+Configuration (.env):
+
+    FLUXAGENT_RICH_TEXT_INLINE_CHARS  largest insert sent inside the update (65536)
+    FLUXAGENT_RICH_TEXT_CHUNK_CHARS   characters per fetched slice (262144)
+    FLUXAGENT_RICH_TEXT_CACHE_BYTES   texts kept for diffs and fetches, the latest always is (67108864)
+"""
+
+import zlib
+import threading
+from collections import OrderedDict
+
+from .Env import env_int
+
+# Texts are compared in blocks of this many characters before the exact position is searched
+_BLOCK = 4096
+
+
+def text_hash(text: str) -> str:
+    """Version of a text: CRC32 of its UTF-8 encoding, also computed by the widget."""
+    return f"{zlib.crc32(text.encode('utf-8')):08x}"
+
+
+def utf16_length(text: str) -> int:
+    """Length of a text as JavaScript counts it."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def common_prefix(a: str, b: str) -> int:
+    """Number of leading characters a and b share."""
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i:i + _BLOCK] == b[i:i + _BLOCK]:
+        i += _BLOCK
+    if i >= limit:
+        return limit
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def common_suffix(a: str, b: str, limit: int) -> int:
+    """Number of trailing characters a and b share, at most limit."""
+    n, m = len(a), len(b)
+    i = 0
+    while i < limit and a[max(n - i - _BLOCK, n - limit):n - i] == b[max(m - i - _BLOCK, m - limit):m - i]:
+        i += _BLOCK
+    if i >= limit:
+        return limit
+    while i < limit and a[n - i - 1] == b[m - i - 1]:
+        i += 1
+    return i
+
+
+class TextVersions:
+    """
+    Texts by version, bounded by total size, least recently used dropped
+    first, and the version last sent per (client id, node id).
+    """
+
+    def __init__(self, max_bytes: int, inline_chars: int, chunk_chars: int):
+        self.max_bytes = max_bytes
+        self.inline_chars = inline_chars
+        self.chunk_chars = max(1, chunk_chars)
+        self.size = 0
+        self._texts = OrderedDict()  # hash -> text
+        self._sent = {}  # (client id, node id) -> hash
+        self._lock = threading.Lock()
+
+    def put(self, text: str) -> str:
+        """
+        Keep a text that was not sent to a client, so it can be fetched by version.
+
+        :param text: The text.
+        :return: Its version.
+        """
+        version = text_hash(text)
+        with self._lock:
+            self._store(version, text)
+        return version
+
+    def update(self, key: tuple, text: str) -> dict:
+        """
+        Record the new text of a node and build the update that turns the
+        previous one into it.
+
+        :param key: (client id, node id): the client the update is sent to and the node showing the text.
+        :param text: Its new text.
+        :return: The update, see the module documentation.
+        """
+        new_hash = text_hash(text)
+        with self._lock:
+            previous = self._current(key)
+            self._store(new_hash, text)
+            self._sent[key] = new_hash
+
+        update = {"hash": new_hash, "length": utf16_length(text), "base": None, "start": 0, "delete": 0}
+        prefix = suffix = 0
+        if previous is not None:
+            base_hash, base = previous
+            prefix = common_prefix(base, text)
+            suffix = common_suffix(base, text, min(len(base), len(text)) - prefix)
+            if prefix or suffix or base_hash == new_hash:
+                update["base"] = base_hash
+                update["start"] = utf16_length(base[:prefix])
+                update["delete"] = utf16_length(base[prefix:len(base) - suffix])
+            else:
+                # Nothing in common, replacing everything needs no base
+                prefix = suffix = 0
+
+        insert_to = len(text) - suffix
+        if insert_to - prefix <= self.inline_chars:
+            update["insert"] = text[prefix:insert_to]
+        else:
+            update["insert_from"] = prefix
+            update["insert_to"] = insert_to
+            update["chunk_chars"] = self.chunk_chars
+        return update
+
+    def summary(self, text: str, version: str = None) -> dict:
+        """
+        Describe a kept text for a ui result, without the text itself.
+
+        :param text: The text.
+        :param version: Its version, when already known.
+        :return: hash, length (UTF-16 code units), codepoints and chunk_chars (slice size).
+        """
+        return {
+            "hash": version or text_hash(text),
+            "length": utf16_length(text),
+            "codepoints": len(text),
+            "chunk_chars": self.chunk_chars,
+        }
+
+    def current(self, key: tuple):
+        """Return the (hash, text) last sent for a (client id, node id), or None."""
+        with self._lock:
+            return self._current(key)
+
+    def get(self, version: str):
+        """Return the text of a version, or None when it is not kept."""
+        with self._lock:
+            text = self._texts.get(version)
+            if text is not None:
+                self._texts.move_to_end(version)
+            return text
+
+    def _current(self, key: tuple):
+        # Called with the lock held
+        version = self._sent.get(key)
+        if version is None or version not in self._texts:
+            return None
+        return version, self._texts[version]
+
+    def _store(self, version: str, text: str):
+        # Called with the lock held
+        if version in self._texts:
+            self._texts.move_to_end(version)
+            return
+        self._texts[version] = text
+        self.size += len(text)
+        # The text just stored may still be fetched, it stays even when over budget
+        while self.size > self.max_bytes and len(self._texts) > 1:
+            dropped_version, dropped = self._texts.popitem(last=False)
+            self.size -= len(dropped)
+            for key in [key for key, sent in self._sent.items() if sent == dropped_version]:
+                del self._sent[key]
+
+
+_versions = None
+_versions_lock = threading.Lock()
+
+
+def get_text_versions() -> TextVersions:
+    """Return the process-wide TextVersions, creating it on first use."""
+    global _versions
+    if _versions is None:
+        with _versions_lock:
+            if _versions is None:
+                _versions = TextVersions(
+                    max_bytes=env_int("FLUXAGENT_RICH_TEXT_CACHE_BYTES", 64 * 1024 * 1024),
+                    inline_chars=env_int("FLUXAGENT_RICH_TEXT_INLINE_CHARS", 65536),
+                    chunk_chars=env_int("FLUXAGENT_RICH_TEXT_CHUNK_CHARS", 262144),
+                )
+    return _versions
@@ -0,0 +1,44 @@
+"""
+Local approximate token counting for chat prompts.
+
+Budgets (rate limits, conversation windows) only need a close estimate, not
+the exact BPE count, so no tokenizer model is loaded: words count as one token
+per started four characters, every other non-space character as one token,
+and each chat message adds the fixed framing overhead of the chat format.
+"""
+
+import re
+
+# Tokens added by the chat format around each message, and once per reply
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+_PIECES = re.compile(r"[A-Za-z0-9]+|[^\sA-Za-z0-9]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text.
+
+    :param text: Any text.
+    :return: Approximate token count.
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if len(piece) > 4 and piece[0].isalnum():
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+
+def count_message_tokens(message: dict) -> int:
+    """Estimate the tokens of one chat message, framing included."""
+    return MESSAGE_OVERHEAD + count_tokens(str(message.get("content") or ""))
+
+
+def count_messages_tokens(messages) -> int:
+    """Estimate the prompt tokens of a list of chat messages."""
+    return REPLY_OVERHEAD + sum(count_message_tokens(message) for message in messages)
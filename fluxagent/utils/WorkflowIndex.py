@@ -0,0 +1,70 @@
+"""
+Per-prompt index of the workflow nodes in extra_pnginfo.
+
+ComfyUI hands the same extra_pnginfo to every node of a prompt, so the
+nodes of its workflow are indexed by id once, on the first lookup, and
+every later lookup of that prompt is a dict access instead of a scan over
+all nodes. Indexes of the last few workflows are kept.
+"""
+
+import threading
+from collections import OrderedDict
+
+# Workflows indexed at once, a few prompts may be validated while one runs
+MAX_WORKFLOWS = 4
+
+
+class WorkflowIndex:
+    """Workflow nodes by id, for a small number of recent workflows."""
+
+    def __init__(self, max_workflows: int = MAX_WORKFLOWS):
+        self.max_workflows = max_workflows
+        # id(workflow) -> (workflow, {node id: node}); the workflow is kept so its id is not reused
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_node(self, extra_pnginfo, node_id):
+        """
+        Find a node of the workflow in extra_pnginfo.
+
+        :param extra_pnginfo: The prompt's extra_pnginfo.
+        :param node_id: The node id, as a string or a number.
+        :return: The node's workflow entry, or None.
+        """
+        if not extra_pnginfo or "workflow" not in extra_pnginfo:
+            return None
+        workflow = extra_pnginfo["workflow"]
+        return self._index(workflow).get(str(node_id))
+
+    def _index(self, workflow) -> dict:
+        key = id(workflow)
+        with self._lock:
+            entry = self._indexes.get(key)
+            if entry is not None and entry[0] is workflow:
+                self._indexes.move_to_end(key)
+                return entry[1]
+
+        nodes = {}
+        for node in workflow.get("nodes", []):
+            # The first node with an id wins, as with a scan
+            nodes.setdefault(str(node.get("id")), node)
+        with self._lock:
+            self._indexes[key] = (workflow, nodes)
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_workflows:
+                self._indexes.popitem(last=False)
+        return nodes
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_workflow_index() -> WorkflowIndex:
+    """Return the process-wide WorkflowIndex, creating it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = WorkflowIndex()
+    return _index
@@ -65,6 +65,15 @@ app.extensionManager.registerSidebarTab({
     let inputArea;
     let sendButton;
     let loadingIndicator;
+    let loadingText;
+    let stopButton;
+    let providerSelect;
+    // Messages the server is still working on
+    const pendingMessages = new Set();
+    // AI bubbles that are still receiving streamed deltas, by message_id
+    const streamingMessages = new Map();
+    // Each opened tab is one conversation; the server keeps its history
+    const sessionId = (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(16).slice(2)}`);
     
     // Create the main UI
     function createUI() {
@@ -97,7 +106,22 @@ app.extensionManager.registerSidebarTab({
             margin-bottom: 10px;
             text-align: center;
           ">
-            <span style="animation: pulse 1.5s ease-in-out infinite alternate;">AI is thinking...</span>
+            <span id="loading-text" style="animation: pulse 1.5s ease-in-out infinite alternate;">AI is thinking...</span>
+          </div>
+          
+          <!-- LLM provider of this conversation -->
+          <div style="display: flex; align-items: center; gap: 8px; margin-bottom: 8px; color: #888; font-size: 12px;">
+            <label for="provider-select">Provider</label>
+            <select 
+              id="provider-select" 
+              style="
+                padding: 2px 6px; 
+                border: 1px solid #444; 
+                border-radius: 4px; 
+                background: #2a2a2a; 
+                color: #fff;
+              "
+            ></select>
           </div>
           
           <!-- Input area -->
@@ -132,6 +156,20 @@ app.extensionManager.registerSidebarTab({
                 align-self: flex-end;
               "
             >Send</button>
+            <button 
+              id="stop-button" 
+              style="
+                display: none;
+                padding: 8px 16px; 
+                background: #a33; 
+                color: white; 
+                border: none; 
+                border-radius: 4px; 
+                cursor: pointer;
+                height: fit-content;
+                align-self: flex-end;
+              "
+            >Stop</button>
           </div>
         </div>
         
@@ -342,6 +380,30 @@ app.extensionManager.registerSidebarTab({
       inputArea = el.querySelector('#user-input');
       sendButton = el.querySelector('#send-button');
       loadingIndicator = el.querySelector('#loading-indicator');
+      loadingText = el.querySelector('#loading-text');
+      stopButton = el.querySelector('#stop-button');
+      providerSelect = el.querySelector('#provider-select');
+    }
+    
+    // Fill the provider list, the server's default selected
+    function loadProviders() {
+      api.fetchApi("/X-FluxAgent-chatbot-providers").then(response => {
+        if (!response.ok) {
+          throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        return response.json();
+      }).then(data => {
+        providerSelect.innerHTML = '';
+        for (const provider of data.providers) {
+          const option = document.createElement('option');
+          option.value = provider.name;
+          option.textContent = provider.hedge ? `${provider.name} (hedged: ${provider.hedge})` : provider.name;
+          option.selected = provider.name === data.default;
+          providerSelect.appendChild(option);
+        }
+      }).catch(error => {
+        console.error('Error loading providers:', error);
+      });
     }
     
     // Send message function
@@ -360,7 +422,15 @@ app.extensionManager.registerSidebarTab({
       
       // Send message to server
       const requestData = {
-        message: message
+        message: message,
+        stream: true,
+        session_id: sessionId,
+        // Empty until the list is loaded, the server then uses the session's provider
+        provider: providerSelect.value,
+        // A new message replaces the one still being answered
+        supersede: true,
+        // Chatbot events are only sent to this websocket client
+        client_id: api.clientId
       };
       
       console.log('Sending message:', message);
@@ -372,6 +442,11 @@ app.extensionManager.registerSidebarTab({
         },
         body: JSON.stringify(requestData)
       }).then(response => {
+        if (response.status === 429) {
+          return response.json().then(body => {
+            throw new Error(`${body.error} (queue position ${body.queue_position})`);
+          });
+        }
         if (!response.ok) {
           throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
@@ -381,7 +456,7 @@ app.extensionManager.registerSidebarTab({
       }).catch(error => {
         console.error('Error sending message:', error);
         addMessageToChat(`Error: Failed to send message - ${error.message}`, 'error');
-        showLoading(false);
+        showLoading(pendingMessages.size > 0);
       });
     }
     
@@ -390,6 +465,16 @@ app.extensionManager.registerSidebarTab({
       const messageDiv = document.createElement('div');
       messageDiv.className = `message-bubble ${type}-message`;
       
+      renderMessage(messageDiv, message, type);
+      
+      messageContainer.appendChild(messageDiv);
+      scrollToBottom();
+      return messageDiv;
+    }
+    
+    // Render message content into a bubble
+    function renderMessage(messageDiv, message, type) {
+      messageDiv.className = `message-bubble ${type}-message`;
       if (type === 'ai' || type === 'error') {
         messageDiv.innerHTML = markdownToHtml(message);
         
@@ -400,10 +485,10 @@ app.extensionManager.registerSidebarTab({
       } else {
         messageDiv.textContent = message;
       }
-      
-      messageContainer.appendChild(messageDiv);
-      
-      // Auto-scroll to bottom unless user has scrolled up
+    }
+    
+    // Auto-scroll to bottom unless user has scrolled up
+    function scrollToBottom() {
       if (!userScrolledUp) {
         messageContainer.scrollTop = messageContainer.scrollHeight;
       }
@@ -458,6 +543,9 @@ app.extensionManager.registerSidebarTab({
         sendButton.disabled = show;
         sendButton.textContent = show ? 'Sending...' : 'Send';
       }
+      if (stopButton) {
+        stopButton.style.display = show ? 'block' : 'none';
+      }
     }
     
     // Track user scrolling
@@ -469,13 +557,65 @@ app.extensionManager.registerSidebarTab({
       });
     }
     
+    // Handle streamed deltas, re-rendering at most once per animation frame
+    function deltaHandler(event) {
+      const data = event.detail;
+      let entry = streamingMessages.get(data.message_id);
+      if (!entry) {
+        if (loadingIndicator) {
+          loadingIndicator.style.display = 'none';
+        }
+        entry = { div: addMessageToChat('', 'ai'), text: '', frame: null };
+        streamingMessages.set(data.message_id, entry);
+      }
+      entry.text += data.delta;
+      if (entry.frame === null) {
+        entry.frame = requestAnimationFrame(() => {
+          entry.frame = null;
+          entry.div.innerHTML = markdownToHtml(entry.text);
+          scrollToBottom();
+        });
+      }
+    }
+    
     // Handle message responses
     function messageHandler(event) {
       const data = event.detail;
       console.log("Received message:", data);
       
-      showLoading(false);
+      pendingMessages.delete(data.message_id);
+      showLoading(pendingMessages.size > 0);
       
+      // Replace a streamed bubble with the complete response
+      const entry = data.message_id && streamingMessages.get(data.message_id);
+      if (entry) {
+        streamingMessages.delete(data.message_id);
+        if (entry.frame !== null) {
+          cancelAnimationFrame(entry.frame);
+        }
+        if (data.cancelled) {
+          // Keep what was received, without an error bubble
+          if (entry.text) {
+            renderMessage(entry.div, entry.text, 'ai');
+          } else {
+            entry.div.remove();
+          }
+        } else if (data.error && entry.text) {
+          // Keep the partial answer, report the failure below it
+          renderMessage(entry.div, entry.text, 'ai');
+          addMessageToChat(data.error, 'error');
+        } else if (data.error) {
+          renderMessage(entry.div, data.error, 'error');
+        } else {
+          renderMessage(entry.div, data.ai_response || entry.text, 'ai');
+        }
+        scrollToBottom();
+        return;
+      }
+      
+      if (data.cancelled) {
+        return;
+      }
       if (data.error) {
         addMessageToChat(data.error, 'error');
       } else if (data.ai_response) {
@@ -486,15 +626,38 @@ app.extensionManager.registerSidebarTab({
     // Handle loading state
     function loadingHandler(event) {
       const data = event.detail;
+      if (data.loading && data.message_id) {
+        pendingMessages.add(data.message_id);
+      }
+      if (loadingText) {
+        loadingText.textContent = data.queue_position > 0
+          ? `Waiting in queue (position ${data.queue_position})...`
+          : 'AI is thinking...';
+      }
       showLoading(data.loading);
     }
     
+    // Cancel the messages of this conversation that are still being answered
+    function stopMessages() {
+      api.fetchApi("/X-FluxAgent-chatbot-cancel", {
+        method: "POST",
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ session_id: sessionId, client_id: api.clientId })
+      }).catch(error => {
+        console.error('Error cancelling message:', error);
+      });
+    }
+    
     // Initialize UI
     createUI();
     setupScrollTracking();
+    loadProviders();
     
     // Setup event listeners
     sendButton.addEventListener('click', sendMessage);
+    stopButton.addEventListener('click', stopMessages);
     
     inputArea.addEventListener('keydown', (e) => {
       if (e.key === 'Enter' && !e.shiftKey) {
@@ -506,11 +669,13 @@ app.extensionManager.registerSidebarTab({
     // Setup API event listeners
     api.addEventListener("X-FluxAgent.chatbot.message", messageHandler);
     api.addEventListener("X-FluxAgent.chatbot.loading", loadingHandler);
+    api.addEventListener("X-FluxAgent.chatbot.delta", deltaHandler);
 
     // Cleanup function
     return () => {
       api.removeEventListener("X-FluxAgent.chatbot.message", messageHandler);
       api.removeEventListener("X-FluxAgent.chatbot.loading", loadingHandler);
+      api.removeEventListener("X-FluxAgent.chatbot.delta", deltaHandler);
       el.innerHTML = ''; 
     }
   }
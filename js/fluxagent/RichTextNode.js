@@ -1,10 +1,23 @@
 import { app } from "/scripts/app.js";
+import { api } from "/scripts/api.js";
 
 // Ensure the app is available
 if (app) {
     let nodeName = "X-FluxAgent.RichTextNode";
     app.registerExtension({
         name: nodeName, // Give your extension a unique name
+        setup() {
+            // Sent to this client while the node runs: the change since the text it was
+            // sent last time, applied in place (see fluxagent/utils/TextDelta.py)
+            api.addEventListener("X-FluxAgent.rich_text.update", ({ detail }) => {
+                const node = app.graph?.getNodeById(detail.node_id);
+                const widget = node?.widgets?.find(w => w.type === "X-FluxAgent.RichTextWidget");
+                if (widget?.queueUpdate) {
+                    widget.queueUpdate(detail.update, detail.node_id)
+                        .then(() => node.setDirtyCanvas(true, true));
+                }
+            });
+        },
         async beforeRegisterNodeDef(nodeType, nodeData, app) {
             // Check if this is the node definition for 'ExampleNode'
             // The 'nodeData.name' is the name ComfyUI uses internally,
@@ -26,6 +39,13 @@ if (app) {
                     // Set initial width and height [width, height]
                     this.size = [300, 200]; 
 
+                    // The widget only displays the last result: keep it out of the prompt,
+                    // so it is not uploaded again and does not change the node's cache key
+                    const richTextWidget = this.widgets?.find(w => w.type === "X-FluxAgent.RichTextWidget");
+                    if (richTextWidget) {
+                        richTextWidget.serializeValue = () => undefined;
+                    }
+
                     // Track size changes for serialization
                     const onResized = this.onResized;
                     this.onResized = function(size) {
@@ -43,11 +63,15 @@ if (app) {
                     const node = this;
                     // node.id is number, but details.node_id[0] is string
                     if (details.node_id[0] == node.id) {
-                        for (const [widgetName, values] of Object.entries(details)) {
-                            const widget = node.widgets.find(w => w.name.startsWith("X-FluxAgent."));
-                            if (widget && widget.setValue) {
-                                widget.setValue(values[0]); 
-                            }
+                        const widget = node.widgets.find(w => w.type === "X-FluxAgent.RichTextWidget");
+                        if (widget?.queueVersion && details.rich_text_version) {
+                            // Only names the text: usually already shown by the update event
+                            // before it, otherwise (e.g. from the history) fetched
+                            widget.queueVersion(details.rich_text_version[0], details.node_id[0])
+                                .then(() => node.setDirtyCanvas(true, true));
+                        } else if (widget?.setValue && details.rich_text) {
+                            // Full text, as kept in the history by earlier versions
+                            widget.setValue(details.rich_text[0]);
                         }
                         node.setDirtyCanvas(true, true);
                     }
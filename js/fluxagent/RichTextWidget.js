@@ -1,6 +1,63 @@
 import { app } from "/scripts/app.js";
+import { api } from "/scripts/api.js";
 import { ComfyWidgets } from "/scripts/widgets.js";
-import { createRichEditor } from "./codemirror_bundle.js"
+
+// The 1 MB CodeMirror bundle is only downloaded once an editor is shown, under its
+// content hashed name so the browser caches it for good (fluxagent/AssetService.py)
+let codeMirror = null;
+function loadCodeMirror() {
+    if (!codeMirror) {
+        codeMirror = api.fetchApi("/X-FluxAgent-assets/manifest.json")
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Failed to fetch the asset manifest: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(manifest => import(api.apiURL(`/X-FluxAgent-assets/${manifest["codemirror_bundle.js"].file}`)))
+            .catch(error => {
+                // Try again with the next editor shown
+                codeMirror = null;
+                throw error;
+            });
+    }
+    return codeMirror;
+}
+
+// CRC32 of the UTF-8 text, the version hash the backend puts in updates (fluxagent/utils/TextDelta.py)
+const CRC_TABLE = (() => {
+    const table = new Uint32Array(256);
+    for (let n = 0; n < 256; n++) {
+        let c = n;
+        for (let k = 0; k < 8; k++) {
+            c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+        }
+        table[n] = c;
+    }
+    return table;
+})();
+
+function textHash(text) {
+    const bytes = new TextEncoder().encode(text);
+    let crc = 0xffffffff;
+    for (let i = 0; i < bytes.length; i++) {
+        crc = CRC_TABLE[(crc ^ bytes[i]) & 0xff] ^ (crc >>> 8);
+    }
+    return ((crc ^ 0xffffffff) >>> 0).toString(16).padStart(8, "0");
+}
+
+// Slice of a version of the text, null when it is no longer kept
+async function fetchTextSlice(nodeId, hash, offset, limit) {
+    const params = new URLSearchParams({ client_id: api.clientId, node_id: nodeId, hash, offset, limit });
+    const response = await api.fetchApi(`/X-FluxAgent-rich-text?${params}`);
+    if (response.status === 409) {
+        return null;
+    }
+    if (!response.ok) {
+        throw new Error(`Failed to fetch text of node ${nodeId}: ${response.status}`);
+    }
+    return (await response.json()).text;
+}
 
 
 function createRichTextWidgetWidget(node, inputName, inputData) {
@@ -45,6 +102,7 @@ function createRichTextWidgetWidget(node, inputName, inputData) {
         value: inputData[1]?.default || "",
         htmlElement: htmlElement,
         editor: null,
+        editorLoading: null,
         lastDimensions: { width: 0, height: 0 },
         draw(ctx, node, widget_width, y, widget_height) {
             const hidden =
@@ -59,6 +117,9 @@ function createRichTextWidgetWidget(node, inputName, inputData) {
                 widget.options.onHide?.(widget);
                 return;
             }
+            if (!this.editor) {
+                this.createEditor();
+            }
 
             const position = getPosition(node, ctx, widget_width, y, node.size[1]);
             Object.assign(this.htmlElement.style, position);
@@ -76,6 +137,7 @@ function createRichTextWidgetWidget(node, inputName, inputData) {
         },
         setValue(value) {
             this.value = value;
+            this.valueHash = null;
             if (this.editor) {
                 // Update CodeMirror content
                 this.editor.dispatch({
@@ -87,29 +149,136 @@ function createRichTextWidgetWidget(node, inputName, inputData) {
                 });
             }
             saveValue();
-        }
-    };
+        },
+        // Hash of the current value, computed once per version
+        valueHash: null,
+        currentHash() {
+            if (this.valueHash === null) {
+                this.valueHash = textHash(this.value);
+            }
+            return this.valueHash;
+        },
+        replaceRange(from, to, insert) {
+            if (this.editor) {
+                this.editor.dispatch({ changes: { from, to, insert } });
+            }
+            this.value = this.value.slice(0, from) + insert + this.value.slice(to);
+            this.valueHash = null;
+        },
+        // Updates are applied one after another, slices of large ones arrive asynchronously
+        pendingUpdate: Promise.resolve(),
+        queueUpdate(update, nodeId) {
+            this.pendingUpdate = this.pendingUpdate
+                .then(() => this.applyUpdate(update, nodeId))
+                .catch(error => console.error("X-FluxAgent: Failed to update rich text", error));
+            return this.pendingUpdate;
+        },
+        // Version named by an execution result, fetched after the updates before it unless they already produced it
+        queueVersion(version, nodeId) {
+            this.pendingUpdate = this.pendingUpdate
+                .then(() => {
+                    if (version.hash !== this.currentHash()) {
+                        return this.resync(nodeId, version.hash);
+                    }
+                })
+                .catch(error => console.error("X-FluxAgent: Failed to update rich text", error));
+            return this.pendingUpdate;
+        },
+        async applyUpdate(update, nodeId) {
+            if (update.hash === this.currentHash()) {
+                // Already showing this version, e.g. a cached result sent again
+                return;
+            }
+            if (update.base && update.base !== this.currentHash()) {
+                return this.resync(nodeId);
+            }
+
+            let at = update.base ? update.start : 0;
+            this.replaceRange(at, update.base ? update.start + update.delete : this.value.length, update.insert ?? "");
+            if (update.insert === undefined) {
+                // Too large to travel in the event, fetch the inserted text in slices
+                for (let offset = update.insert_from; offset < update.insert_to; offset += update.chunk_chars) {
+                    const limit = Math.min(update.chunk_chars, update.insert_to - offset);
+                    const slice = await fetchTextSlice(nodeId, update.hash, offset, limit);
+                    if (slice === null) {
+                        return this.resync(nodeId);
+                    }
+                    this.replaceRange(at, at, slice);
+                    at += slice.length;
+                }
+            }
 
-    widget.editor = createRichEditor(htmlElement, widget.value, {
-        language: "markdown",
-        showLineNumbers: false,
-        onUpdate: (value) => {
-            widget.value = value;
+            if (this.currentHash() !== update.hash) {
+                return this.resync(nodeId);
+            }
             saveValue();
-            // Also update the node's serialization data immediately
-            if (node && node.serialize_widgets) {
-                app.graph.setDirtyCanvas(true, false);
+        },
+        // Replace the value by a version of the text, by default the one the node last
+        // sent this client, fetched in slices; the value is kept if that fails
+        async resync(nodeId, hash = null, attempts = 3) {
+            const params = new URLSearchParams({ client_id: api.clientId, node_id: nodeId });
+            if (hash) {
+                params.set("hash", hash);
+            }
+            const response = await api.fetchApi(`/X-FluxAgent-rich-text?${params}`);
+            if (!response.ok) {
+                console.warn(`X-FluxAgent: Cannot resync rich text of node ${nodeId}: ${response.status}`);
+                return;
+            }
+            const version = await response.json();
+            const slices = [];
+            for (let offset = 0; offset < version.codepoints; offset += version.chunk_chars) {
+                const slice = await fetchTextSlice(nodeId, version.hash, offset, version.chunk_chars);
+                if (slice === null) {
+                    if (!hash && attempts > 1) {
+                        // Replaced while fetching, start over with the newer version
+                        return this.resync(nodeId, null, attempts - 1);
+                    }
+                    console.warn(`X-FluxAgent: Text ${version.hash} of node ${nodeId} is no longer kept`);
+                    return;
+                }
+                slices.push(slice);
             }
+            this.setValue(slices.join(""));
+            this.valueHash = version.hash;
+        }
+    };
+
+    // Called on the first draw that shows the widget, the value is kept without an editor until then
+    widget.createEditor = function () {
+        if (this.editorLoading) {
+            return this.editorLoading;
         }
-    });
-
-    // block LiteGraph shortcuts while the cursor is inside the editor
-    ["keydown", "keyup", "keypress"].forEach(type =>
-        widget.editor.dom.addEventListener(type, e => {
-            e.stopPropagation();        // keeps the event inside CodeMirror
-            // you can also preventDefault() here for ↑/↓ etc. if needed
-        })
-    );
+        this.editorLoading = loadCodeMirror().then(({ createRichEditor }) => {
+            widget.editor = createRichEditor(htmlElement, widget.value, {
+                language: "markdown",
+                showLineNumbers: false,
+                onUpdate: (value) => {
+                    widget.value = value;
+                    widget.valueHash = null;
+                    saveValue();
+                    // Also update the node's serialization data immediately
+                    if (node && node.serialize_widgets) {
+                        app.graph.setDirtyCanvas(true, false);
+                    }
+                }
+            });
+
+            // block LiteGraph shortcuts while the cursor is inside the editor
+            ["keydown", "keyup", "keypress"].forEach(type =>
+                widget.editor.dom.addEventListener(type, e => {
+                    e.stopPropagation();        // keeps the event inside CodeMirror
+                    // you can also preventDefault() here for ↑/↓ etc. if needed
+                })
+            );
+            app.graph.setDirtyCanvas(true, false);
+        }).catch(error => {
+            console.error("X-FluxAgent: Failed to load the rich text editor", error);
+            // draw() runs every frame, retry a little later
+            setTimeout(() => { this.editorLoading = null; }, 5000);
+        });
+        return this.editorLoading;
+    };
 
     widget.htmlElement.hidden = true;
 
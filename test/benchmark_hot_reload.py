@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the hot reload patch of HierarchicalCache.set_prompt.
+
+Fills a cache with the outputs of a synthetic workflow of N nodes, keyed
+like ComfyUI's input signatures (nested frozensets holding the class type
+of every node and of its ancestors), then times the patch's own work in
+set_prompt, before and after the class type reverse index:
+
+    legacy   walks every cache key with dfs() on every prompt
+    indexed  looks the reloaded class types up in the index
+
+"idle" is a prompt with nothing reloaded (nearly every prompt), "reload"
+the first prompt after one node class was reloaded. Outside ComfyUI a
+minimal comfy_execution.caching is installed:
+
+    python test/benchmark_hot_reload.py --nodes 1000,10000 --prompts 50
+    python test/benchmark_hot_reload.py --json results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+from collections.abc import Mapping, Sequence
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TEST_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, TEST_DIR)
+
+from comfy_stubs import install_hot_reload_modules  # noqa: E402
+
+
+def to_hashable(obj):
+    """Same conversion ComfyUI applies to node signatures."""
+    if isinstance(obj, (int, float, str, bool, type(None))):
+        return obj
+    if isinstance(obj, Mapping):
+        return frozenset([(to_hashable(k), to_hashable(v)) for k, v in sorted(obj.items())])
+    if isinstance(obj, Sequence):
+        return frozenset(zip(itertools.count(), [to_hashable(i) for i in obj]))
+    return obj
+
+
+def build_workflow(nodes: int, class_types: int, depth: int, seed: int) -> dict:
+    """
+    :return: node id -> cache key, each node reading two of the eight nodes
+             before it and its key holding its ancestors up to depth levels.
+    """
+    rng = random.Random(seed)
+    immediate = {}
+    parents = {}
+    for node in range(nodes):
+        node_id = str(node)
+        parents[node_id] = [str(rng.randrange(max(0, node - 8), node)) for _ in range(2)] if node else []
+        immediate[node_id] = [f"BenchNode{rng.randrange(class_types)}", None,
+                              ("seed", node), ("text", f"prompt {node}"), ("inputs", tuple(parents[node_id]))]
+
+    keys = {}
+    for node_id in immediate:
+        ancestors, level = [node_id], [node_id]
+        for _ in range(depth):
+            level = [parent for child in level for parent in parents[child]]
+            ancestors.extend(level)
+        keys[node_id] = to_hashable([immediate[ancestor] for ancestor in dict.fromkeys(ancestors)])
+    return keys
+
+
+def legacy_set_prompt(cache, hot_reload):
+    """The patch's work before the reverse index, without the original set_prompt."""
+    found_keys = []
+    for key, item_list in cache.cache_key_set.keys.items():
+        if hot_reload.dfs(item_list, hot_reload.RELOADED_CLASS_TYPES):
+            found_keys.append(key)
+    for key in found_keys:
+        cache_key = cache.cache_key_set.get_data_key(key)
+        cache.cache.pop(cache_key, None)
+
+
+def bench(nodes: int, prompts: int, args) -> list:
+    from comfy_execution import caching
+    import fluxagent.utils.HotReload as hot_reload
+
+    hot_reload.monkeypatch()
+    keys = build_workflow(nodes, args.class_types, args.depth, args.seed)
+    node_ids = list(keys)
+    rows = []
+    for variant in ("legacy", "indexed"):
+        cache = caching.HierarchicalCache(caching.CacheKeySet)
+        hot_reload.RELOADED_CLASS_TYPES.clear()
+        start = time.perf_counter()
+        cache.set_prompt(keys, node_ids, {})
+        store = hot_reload._original_set_immediate if variant == "legacy" else caching.HierarchicalCache._set_immediate
+        for node_id in keys:
+            store(cache, node_id, node_id)
+        fill = time.perf_counter() - start
+
+        def one_prompt():
+            start = time.perf_counter()
+            if variant == "legacy":
+                legacy_set_prompt(cache, hot_reload)
+                hot_reload._original_set_prompt(cache, keys, node_ids, {})
+            else:
+                cache.set_prompt(keys, node_ids, {})
+            return time.perf_counter() - start
+
+        idle = min(one_prompt() for _ in range(prompts))
+        hot_reload.RELOADED_CLASS_TYPES["BenchNode0"] = 1
+        reload = one_prompt()
+        cleared = nodes - len(cache.cache)
+        hot_reload.RELOADED_CLASS_TYPES.clear()
+
+        rows.append({
+            "nodes": nodes,
+            "variant": variant,
+            "fill_ms": round(fill * 1000, 2),
+            "idle_us": round(idle * 1e6, 1),
+            "reload_us": round(reload * 1e6, 1),
+            "cleared": cleared,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", default="1000,10000", help="comma separated cached node counts")
+    parser.add_argument("--prompts", type=int, default=20, help="prompts timed per size, the fastest is reported")
+    parser.add_argument("--class-types", type=int, default=50, help="distinct node class types in the workflow")
+    parser.add_argument("--depth", type=int, default=3, help="ancestor levels in each cache key")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    install_hot_reload_modules([f"BenchNode{index}" for index in range(args.class_types)])
+    columns = ["nodes", "variant", "fill_ms", "idle_us", "reload_us", "cleared"]
+    print("  ".join(f"{name:>10}" for name in columns))
+    results = []
+    for nodes in [int(value) for value in args.nodes.split(",")]:
+        for row in bench(nodes, args.prompts, args):
+            results.append(row)
+            print("  ".join(f"{row[name]:>10}" for name in columns), flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
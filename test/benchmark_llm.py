@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of FluxAgent's LLM paths against the offline mock server.
+
+Drives OpenAIChatnNode (one worker thread per concurrent request, as node
+executions block) and the /X-FluxAgent-chatbot-message route, plain and
+streamed, at increasing concurrency. For every level it reports throughput,
+p50/p99 latency, p50/p99 time to the first streamed delta and the process
+RSS. No network or ComfyUI is needed:
+
+    python test/benchmark_llm.py --levels 1,8,32 --requests 200 --latency 0.05
+    python test/benchmark_llm.py --targets chat-stream --token-interval 0.005 --tokens 100
+    python test/benchmark_llm.py --json results.json        # keep numbers to compare runs
+
+Settings of the code under test (FLUXAGENT_* variables) are read from the
+environment as usual, e.g. FLUXAGENT_CHAT_MAX_RUNNING for the chat route's
+admission limit; refused messages are counted as "rejected".
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import importlib
+import contextlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TEST_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, TEST_DIR)
+
+from mock_openai_server import MockConfig, start_mock_server  # noqa: E402
+from comfy_stubs import install_prompt_server  # noqa: E402
+
+TARGETS = ("node", "chat", "chat-stream")
+
+
+def rss_mb() -> float:
+    """Current resident set size of the process in MB (peak where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the per-request prints of the node and the chat route."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def summarize(target, concurrency, elapsed, results, rss_before):
+    """
+    :param results: (latency seconds, time to first delta or None, outcome) tuples,
+                    outcome being "ok", "error" or "rejected".
+    """
+    outcomes = Counter(outcome for _, _, outcome in results)
+    latencies = [latency for latency, _, outcome in results if outcome == "ok"]
+    first_deltas = [ttfb for _, ttfb, outcome in results if outcome == "ok" and ttfb is not None]
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 1)
+
+    rss = rss_mb()
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": outcomes["ok"],
+        "errors": outcomes["error"],
+        "rejected": outcomes["rejected"],
+        "seconds": round(elapsed, 3),
+        "throughput": round(outcomes["ok"] / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(percentile(latencies, 0.5)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "first_delta_p50_ms": ms(percentile(first_deltas, 0.5)),
+        "first_delta_p99_ms": ms(percentile(first_deltas, 0.99)),
+        "rss_mb": round(rss, 1),
+        "rss_delta_mb": round(rss - rss_before, 1),
+    }
+
+
+def print_row(row):
+    columns = ["target", "concurrency", "requests", "ok", "errors", "rejected", "throughput",
+               "p50_ms", "p99_ms", "first_delta_p50_ms", "first_delta_p99_ms", "rss_mb", "rss_delta_mb"]
+    if print_row.header:
+        print("  ".join(f"{name:>12}" for name in columns))
+        print_row.header = False
+    print("  ".join(f"{'-' if row[name] is None else row[name]:>12}" for name in columns), flush=True)
+
+
+print_row.header = True
+
+
+# ==============================================================================
+# === OpenAIChatnNode ===
+# ==============================================================================
+
+def bench_node(levels, requests, model):
+    from fluxagent.OpenaiChatNode import OpenAIChatnNode
+
+    node = OpenAIChatnNode()
+
+    def one(prompt):
+        started = time.perf_counter()
+        try:
+            node.chat_completion(model, prompt)
+            return time.perf_counter() - started, None, "ok"
+        except Exception:
+            return time.perf_counter() - started, None, "error"
+
+    rows = []
+    for level in levels:
+        prompts = [f"node benchmark c{level} #{i}" for i in range(requests)]
+        rss_before = rss_mb()
+        started = time.perf_counter()
+        with quiet(), ThreadPoolExecutor(max_workers=level) as executor:
+            results = list(executor.map(one, prompts))
+        rows.append(summarize("node", level, time.perf_counter() - started, results, rss_before))
+        print_row(rows[-1])
+    return rows
+
+
+# ==============================================================================
+# === /X-FluxAgent-chatbot-message ===
+# ==============================================================================
+
+async def bench_chat(levels, requests, targets):
+    import aiohttp
+    from aiohttp import web
+
+    prompt_server = install_prompt_server()
+    with quiet():
+        # Importing the service registers its routes on the PromptServer
+        importlib.import_module("fluxagent.ChatBotService")
+
+    app = prompt_server.app
+    app.add_routes(prompt_server.routes)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{runner.addresses[0][1]}/X-FluxAgent-chatbot-message"
+
+    rows = []
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+            for target in targets:
+                stream = target == "chat-stream"
+                for level in levels:
+                    semaphore = asyncio.Semaphore(level)
+
+                    async def one(i):
+                        client_id = f"{target}-c{level}-{i}"
+                        prompt_server.sockets[client_id] = None
+                        async with semaphore:
+                            started = time.perf_counter()
+                            async with session.post(url, json={
+                                "message": f"chat benchmark {client_id}",
+                                "stream": stream,
+                                "session_id": client_id,
+                                "client_id": client_id,
+                            }) as response:
+                                body = await response.json()
+                            latency = time.perf_counter() - started
+                        first_delta = prompt_server.first_delta.pop(client_id, None)
+                        prompt_server.sockets.pop(client_id, None)
+                        if response.status == 429:
+                            outcome = "rejected"
+                        elif response.status == 200 and body.get("status") == "success":
+                            outcome = "ok"
+                        else:
+                            outcome = "error"
+                        return latency, first_delta and first_delta - started, outcome
+
+                    rss_before = rss_mb()
+                    started = time.perf_counter()
+                    with quiet():
+                        results = await asyncio.gather(*[one(i) for i in range(requests)])
+                    rows.append(summarize(target, level, time.perf_counter() - started, results, rss_before))
+                    print_row(rows[-1])
+    finally:
+        await runner.cleanup()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"comma separated, from {', '.join(TARGETS)}")
+    parser.add_argument("--levels", default="1,4,16,64", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per level")
+    parser.add_argument("--model", default="gpt-4.1")
+    parser.add_argument("--url", help="OPENAI_BASE_URL of an already running mock server")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock: seconds before the response headers")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="mock: seconds between streamed words")
+    parser.add_argument("--tokens", type=int, default=50, help="mock: words per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mock: fraction of requests answered with 500")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.levels.split(",")]
+
+    server = None
+    if args.url:
+        base_url = args.url
+    else:
+        server = start_mock_server(MockConfig(args.latency, args.token_interval, args.tokens, args.error_rate))
+        base_url = server.url
+
+    # Read by the modules under test when they are imported
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ.setdefault("FLUXAGENT_LLM_CACHE_DISK_ENTRIES", "0")
+
+    print(f"Benchmarking against {base_url}: {args.requests} requests per level, levels {levels}")
+    rows = []
+    try:
+        if "node" in targets:
+            rows += bench_node(levels, args.requests, args.model)
+        chat_targets = [target for target in targets if target.startswith("chat")]
+        if chat_targets:
+            rows += asyncio.run(bench_chat(levels, args.requests, chat_targets))
+    finally:
+        if server is not None:
+            server.shutdown()
+            print(f"Mock responses by status: {dict(server.stats)}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": rows}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Minimal stand-ins for the ComfyUI modules FluxAgent imports, shared by the
+tests and the benchmarks so they run without ComfyUI.
+"""
+
+import os
+import sys
+import time
+import types
+import importlib
+from collections import Counter
+
+
+def prompt_server_module():
+    """
+    A "server" module whose PromptServer.instance provides what the services
+    use: routes, the aiohttp app, the connected clients (sockets, add the
+    client ids a test uses) and send/send_sync. Every event is recorded
+    in sent, with the time each client received its first delta.
+    """
+    from aiohttp import web
+
+    class PromptServer:
+        instance = None
+
+        def __init__(self):
+            self.routes = web.RouteTableDef()
+            self.app = web.Application()
+            self.events = Counter()
+            self.first_delta = {}
+            self.sent = []
+            # Connected websocket clients by id
+            self.sockets = {}
+            # Client that queued the prompt being executed
+            self.client_id = None
+
+        def send_sync(self, event, data, sid=None):
+            self._record(event, data, sid)
+
+        async def send(self, event, data, sid=None):
+            self._record(event, data, sid)
+
+        def _record(self, event, data, sid):
+            self.events[event] += 1
+            self.sent.append((event, data, sid))
+            if event == "X-FluxAgent.chatbot.delta" and sid is not None:
+                self.first_delta.setdefault(sid, time.perf_counter())
+
+    module = types.ModuleType("server")
+    module.PromptServer = PromptServer
+    PromptServer.instance = PromptServer()
+    return module
+
+
+def install_prompt_server():
+    """Install prompt_server_module() as "server" and return its PromptServer.instance."""
+    module = prompt_server_module()
+    sys.modules["server"] = module
+    return module.PromptServer.instance
+
+
+def comfy_modules() -> dict:
+    """
+    The comfy modules NodeRunner imports, by name: comfy.model_management,
+    whose interruption flag is set with interrupt_processing(), and a
+    comfy.utils.ProgressBar recording its updates in updates.
+    """
+    class InterruptProcessingException(Exception):
+        pass
+
+    model_management = types.ModuleType("comfy.model_management")
+    model_management.InterruptProcessingException = InterruptProcessingException
+    model_management.interrupted = False
+
+    def interrupt_processing(value=True):
+        model_management.interrupted = value
+
+    def processing_interrupted():
+        return model_management.interrupted
+
+    def throw_exception_if_processing_interrupted():
+        if model_management.interrupted:
+            model_management.interrupted = False
+            raise InterruptProcessingException()
+
+    model_management.interrupt_processing = interrupt_processing
+    model_management.processing_interrupted = processing_interrupted
+    model_management.throw_exception_if_processing_interrupted = throw_exception_if_processing_interrupted
+
+    class ProgressBar:
+        def __init__(self, total):
+            self.total = total
+            self.updates = []
+
+        def update_absolute(self, value, total=None):
+            self.updates.append((value, total))
+
+    utils = types.ModuleType("comfy.utils")
+    utils.ProgressBar = ProgressBar
+    package = types.ModuleType("comfy")
+    package.model_management = model_management
+    package.utils = utils
+    return {"comfy": package, "comfy.model_management": model_management, "comfy.utils": utils}
+
+
+def folder_paths_module(base_dir: str):
+    """
+    A folder_paths module with the output, user and temp directories under base_dir.
+
+    :param base_dir: Directory the ComfyUI directories are created in.
+    """
+    folder_paths = types.ModuleType("folder_paths")
+
+    def directory(path):
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    for name in ("output", "user", "temp"):
+        path = os.path.join(base_dir, name)
+        setattr(folder_paths, f"get_{name}_directory", lambda path=path: directory(path))
+    return folder_paths
+
+
+def hot_reload_modules(class_types=()) -> dict:
+    """
+    The modules HotReload imports, by name: a comfy_execution.caching with the parts of HierarchicalCache the set_prompt
+    patch uses, and a "nodes" module whose NODE_CLASS_MAPPINGS tells class
+    types from other strings.
+
+    :param class_types: Class types registered in nodes.NODE_CLASS_MAPPINGS.
+    """
+    nodes = types.ModuleType("nodes")
+    nodes.NODE_CLASS_MAPPINGS = {class_type: object for class_type in class_types}
+    nodes.NODE_DISPLAY_NAME_MAPPINGS = {}
+
+    class CacheKeySet:
+        def __init__(self, dynprompt, node_ids, is_changed_cache):
+            # Node id -> cache key, computed by the caller
+            self.keys = dynprompt
+            self.subcache_keys = {}
+
+        def get_data_key(self, node_id):
+            return self.keys.get(node_id)
+
+    class BasicCache:
+        def __init__(self, key_class):
+            self.key_class = key_class
+            self.cache = {}
+
+        def set_prompt(self, dynprompt, node_ids, is_changed_cache):
+            self.cache_key_set = self.key_class(dynprompt, node_ids, is_changed_cache)
+
+        def _set_immediate(self, node_id, value):
+            self.cache[self.cache_key_set.get_data_key(node_id)] = value
+
+    class HierarchicalCache(BasicCache):
+        pass
+
+    caching = types.ModuleType("comfy_execution.caching")
+    caching.CacheKeySet = CacheKeySet
+    caching.HierarchicalCache = HierarchicalCache
+    package = types.ModuleType("comfy_execution")
+    package.caching = caching
+    return {"nodes": nodes, "comfy_execution": package, "comfy_execution.caching": caching}
+
+
+def install_hot_reload_modules(class_types=()):
+    """Install hot_reload_modules() unless ComfyUI's own modules can be imported."""
+    try:
+        # Imported only to find out whether ComfyUI is on the path
+        importlib.import_module("comfy_execution.caching")
+        return
+    except ImportError:
+        pass
+    sys.modules.update(hot_reload_modules(class_types))
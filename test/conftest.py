@@ -0,0 +1,43 @@
+"""
+Shared pytest fixtures. The tests import the extension's modules from the
+repository root (not through the extension's __init__.py, which loads every
+node) and stand in for ComfyUI where a module needs it, see comfy_stubs.py.
+"""
+
+import os
+import sys
+
+import pytest
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TEST_DIR)
+for path in (ROOT_DIR, TEST_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import comfy_stubs  # noqa: E402
+from mock_openai_server import MockConfig, start_mock_server  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def mock_server():
+    """The offline OpenAI compatible server, for the whole test session."""
+    server = start_mock_server(MockConfig(tokens=20))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="session")
+def prompt_server():
+    """
+    PromptServer stand-in installed as the "server" module for the session;
+    the services keep the instance they were imported with.
+    """
+    previous = sys.modules.get("server")
+    instance = comfy_stubs.install_prompt_server()
+    yield instance
+    if previous is None:
+        sys.modules.pop("server", None)
+    else:
+        sys.modules["server"] = previous
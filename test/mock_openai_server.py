@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the OpenAI chat completions API.
+
+Serves POST /v1/chat/completions, plain JSON or SSE streamed (stream=true,
+with the usage chunk when stream_options.include_usage is set), using only
+the standard library. Point FluxAgent at it with:
+
+    python test/mock_openai_server.py --port 8765 --latency 0.2 --token-interval 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock python main.py
+
+or, next to the real providers, as a provider of its own:
+
+    FLUXAGENT_LLM_PROVIDERS={"mock": {"base_url": "http://127.0.0.1:8765/v1", "api_key": "mock"}}
+
+In-process, register_mock_provider() adds it to the running registry.
+
+The reply echoes the last user message, padded to --tokens words. Behaviour
+is set on the command line (or MockConfig when started in-process with
+start_mock_server) and can be forced per request by directives in the user
+message:
+
+    [mock:status=503]     answer with this HTTP status
+    [mock:latency=1.5]    seconds before the response headers
+    [mock:tokens=200]     words in the reply
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque, Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_DIRECTIVE = re.compile(r"\[mock:(\w+)=([^\]]+)\]")
+
+
+class MockConfig:
+    """Behaviour of the mock server."""
+
+    def __init__(self, latency=0.0, token_interval=0.0, tokens=0, error_rate=0.0,
+                 rate_limit_rpm=0, retry_after=1.0, seed=None):
+        self.latency = latency                  # seconds before the response headers
+        self.token_interval = token_interval    # seconds between streamed words
+        self.tokens = tokens                    # minimum words per reply
+        self.error_rate = error_rate            # fraction of requests answered with 500
+        self.rate_limit_rpm = rate_limit_rpm    # requests per minute before 429, 0 for none
+        self.retry_after = retry_after          # Retry-After of error answers
+        self.random = random.Random(seed)
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections of benchmark bursts
+    request_queue_size = 1024
+
+    def __init__(self, address, config: MockConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.stats = Counter()
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def handle_error(self, request, client_address):
+        # Clients dropping pooled or cancelled connections are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def rate_limited(self) -> float:
+        """Seconds until a request is allowed again, 0 if it may go now."""
+        rpm = self.config.rate_limit_rpm
+        if not rpm:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if len(self._recent) >= rpm:
+                return 60 - (now - self._recent[0])
+            self._recent.append(now)
+        return 0.0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockOpenAIServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._error(404, "Unknown endpoint")
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._error(401, "Missing API key")
+        try:
+            request = json.loads(body)
+            messages = request["messages"]
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(400, f"Invalid request: {e}")
+
+        config = self.server.config
+        user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        directives = dict(_DIRECTIVE.findall(user))
+
+        wait = self.server.rate_limited()
+        if wait:
+            return self._error(429, "Rate limit reached", retry_after=wait)
+        if "status" in directives:
+            return self._error(int(directives["status"]), "Injected error", retry_after=config.retry_after)
+        if config.error_rate and config.random.random() < config.error_rate:
+            return self._error(500, "Injected error", retry_after=config.retry_after)
+
+        time.sleep(float(directives.get("latency", config.latency)))
+
+        words = ["Echo:"] + _DIRECTIVE.sub("", user).split()
+        target = int(directives.get("tokens", config.tokens))
+        words += ["lorem"] * max(0, target - len(words))
+        usage = {
+            "prompt_tokens": sum(len(str(m.get("content") or "").split()) for m in messages),
+            "completion_tokens": len(words),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = request.get("model", "mock")
+
+        if request.get("stream"):
+            self._stream(model, words, usage, (request.get("stream_options") or {}).get("include_usage"))
+        else:
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        self.server.stats[200] += 1
+
+    def _stream(self, model, words, usage, include_usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(data):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None):
+            return json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                               "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]})
+
+        interval = self.server.config.token_interval
+        event(chunk({"role": "assistant", "content": ""}))
+        for i, word in enumerate(words):
+            event(chunk({"content": word if i == 0 else " " + word}))
+            if interval:
+                time.sleep(interval)
+        event(chunk({}, "stop"))
+        if include_usage:
+            event(json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                              "choices": [], "usage": usage}))
+        event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _error(self, status, message, retry_after=None):
+        headers = {}
+        if retry_after is not None and (status == 429 or status >= 500):
+            headers["Retry-After"] = str(max(1, round(retry_after)))
+            headers["retry-after-ms"] = str(int(retry_after * 1000))
+        self._send_json(status, {"error": {"message": message, "type": "mock_error", "code": status}}, headers)
+        self.server.stats[status] += 1
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_mock_server(config: MockConfig = None, host: str = "127.0.0.1", port: int = 0) -> MockOpenAIServer:
+    """
+    Start the mock server on a background thread.
+
+    :param config: Server behaviour, defaults to instant answers.
+    :param port: Port to listen on, 0 for any free port.
+    :return: The running server; its url is the OPENAI_BASE_URL to use,
+             shutdown() stops it.
+    """
+    server = MockOpenAIServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, name="mock-openai-server", daemon=True).start()
+    return server
+
+
+def register_mock_provider(server: MockOpenAIServer, name: str = "mock"):
+    """
+    Add a running mock server to FluxAgent's provider registry, for tests
+    and benchmarks that import the extension's modules.
+
+    :param server: Server from start_mock_server().
+    :param name: Provider name the nodes and chat sessions select it by.
+    :return: The registered Provider.
+    """
+    from fluxagent.utils.LLMProviders import Provider, get_provider_registry
+
+    provider = Provider(name, server.url, api_key="mock")
+    get_provider_registry().register(provider)
+    return provider
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the response headers")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="seconds between streamed words")
+    parser.add_argument("--tokens", type=int, default=0, help="minimum words per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rpm", type=int, default=0, help="requests per minute before 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of error answers")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = MockConfig(args.latency, args.token_interval, args.tokens, args.error_rate,
+                        args.rate_limit_rpm, args.retry_after, args.seed)
+    server = MockOpenAIServer((args.host, args.port), config)
+    print(f"Mock OpenAI server on {server.url} (set OPENAI_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Responses by status: {dict(server.stats)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Tests for fluxagent/utils/AdmissionControl.py."""
+
+import asyncio
+
+import pytest
+
+from fluxagent.utils.AdmissionControl import AdmissionController, QueueFull
+
+
+def test_submit_enforces_the_session_and_queue_limits():
+    admission = AdmissionController(max_running=1, max_waiting=1, max_per_session=2)
+    assert admission.submit("a1", "a").queue_position == 0
+    assert admission.submit("a2", "a").queue_position == 1
+    with pytest.raises(QueueFull) as session_full:
+        admission.submit("a3", "a")
+    assert session_full.value.position == 3
+    with pytest.raises(QueueFull) as queue_full:
+        admission.submit("b1", "b")
+    assert queue_full.value.position == 2
+
+
+def test_supersede_cancels_the_earlier_jobs_of_the_session():
+    admission = AdmissionController(max_running=1, max_waiting=4, max_per_session=1)
+    first = admission.submit("a1", "a")
+    second = admission.submit("a2", "a", supersede=True)
+    assert first.cancel_reason == "Superseded by a newer message"
+    assert second.cancel_reason is None
+
+
+def test_slots_are_handed_out_in_arrival_order():
+    admission = AdmissionController(max_running=1, max_waiting=8, max_per_session=8)
+    order = []
+
+    async def run(job_id, release):
+        job = admission.submit(job_id, "s")
+        async with admission.slot(job):
+            order.append(job_id)
+            await release.wait()
+        admission.finish(job)
+
+    async def main():
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(run(f"job{index}", release)) for index in range(3)]
+        await asyncio.sleep(0.01)
+        assert order == ["job0"] and admission.running == 1 and admission.waiting == 2
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["job0", "job1", "job2"]
+    assert admission.running == 0 and admission.waiting == 0
+
+
+def test_cancel_waiting_and_running_jobs():
+    admission = AdmissionController(max_running=1, max_waiting=8, max_per_session=8)
+
+    async def run(job):
+        async with admission.slot(job):
+            await asyncio.sleep(10)
+
+    async def main():
+        jobs = [admission.submit(f"job{index}", "s") for index in range(3)]
+        for job in jobs:
+            job.task = asyncio.ensure_future(run(job))
+        await asyncio.sleep(0.01)
+        assert admission.cancel("job2", "Stop")
+        assert admission.cancel_session("s") == 2
+        results = await asyncio.gather(*(job.task for job in jobs), return_exceptions=True)
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
+        assert [job.cancel_reason for job in jobs] == ["Cancelled", "Cancelled", "Stop"]
+
+    asyncio.run(main())
+    assert admission.running == 0 and admission.waiting == 0
+
+
+def test_only_the_owner_cancels_a_job_by_id():
+    admission = AdmissionController(max_running=1, max_waiting=8, max_per_session=8)
+    job = admission.submit("a1", "client-a:s", owner="client-a")
+    assert not admission.cancel("a1", owner="client-b")
+    assert not admission.cancel("a1")
+    assert job.cancel_reason is None
+    assert admission.cancel("a1", owner="client-a")
+    assert job.cancel_reason == "Cancelled"
@@ -0,0 +1,65 @@
+"""Tests for fluxagent/AICodeGenNode.py."""
+
+import pytest
+
+from fluxagent import AICodeGenNode as code_gen_node
+from fluxagent.AICodeGenNode import AICodeGenNode
+from fluxagent.utils import CodeCache
+from fluxagent.utils import CodeSandbox as code_sandbox
+
+
+def test_is_changed_depends_only_on_the_code():
+    default = AICodeGenNode.IS_CHANGED(rich_text="Your code", node_id="3", prompt={"3": {}})
+    assert default == AICodeGenNode.IS_CHANGED(rich_text="Your code", node_id="4", extra_pnginfo=None)
+    assert AICodeGenNode.IS_CHANGED(rich_text="Your code") != AICodeGenNode.IS_CHANGED(rich_text="Your code ")
+
+
+def test_find_slots_reads_the_node_from_the_workflow():
+    workflow = {"workflow": {"nodes": [{
+        "id": 3,
+        "inputs": [{"name": "text", "type": "STRING"}],
+        "outputs": [{"name": "result", "type": "STRING"}, {"name": "count"}],
+    }]}}
+    inputs, outputs = AICodeGenNode.find_slots(workflow, "3")
+    assert inputs == [{"name": "text", "type": "STRING"}]
+    assert outputs == [{"name": "result", "type": "STRING"}, {"name": "count", "type": "ANY"}]
+    assert AICodeGenNode.find_slots(None, "3") == ([], [])
+    assert AICodeGenNode.find_slots(workflow, "9") == ([], [])
+
+
+WORKFLOW = {"workflow": {"nodes": [{
+    "id": 3,
+    "inputs": [{"name": "text", "type": "STRING"}],
+    "outputs": [{"name": "upper", "type": "STRING"}, {"name": "size", "type": "INT"}],
+}]}}
+
+CODE = "upper = text.upper()\nsize = len(text)"
+
+
+@pytest.fixture
+def sandbox_module(monkeypatch):
+    monkeypatch.setattr(code_gen_node, "_sandbox_warned", False)
+    monkeypatch.setattr(code_sandbox, "_sandbox", None)
+    yield code_sandbox
+    if code_sandbox._sandbox is not None:
+        code_sandbox._sandbox.shutdown()
+
+
+def test_disabled_sandbox_returns_the_placeholder_for_every_output(sandbox_module, monkeypatch, capsys):
+    monkeypatch.delenv("FLUXAGENT_SANDBOX_ENABLED", raising=False)
+    node = AICodeGenNode()
+    expected = ("Generated code goes here 3",) * 2
+    assert node.process(rich_text=CODE, node_id="3", extra_pnginfo=WORKFLOW, text="ab") == expected
+    assert node.process(rich_text=CODE, node_id="3", extra_pnginfo=WORKFLOW, text="ab") == expected
+    assert capsys.readouterr().out.count("FLUXAGENT_SANDBOX_ENABLED=1") == 1
+    assert node.process(rich_text="Your code", node_id="3", extra_pnginfo=WORKFLOW) == expected
+
+
+def test_enabled_sandbox_runs_the_code(sandbox_module, monkeypatch):
+    monkeypatch.setenv("FLUXAGENT_SANDBOX_ENABLED", "1")
+    monkeypatch.setenv("FLUXAGENT_SANDBOX_WORKERS", "1")
+    monkeypatch.setenv("FLUXAGENT_SANDBOX_PRELOAD", "")
+    monkeypatch.setattr(CodeCache, "_cache", CodeCache.CodeCache(max_entries=16))
+    node = AICodeGenNode()
+    assert node.process(rich_text=CODE, node_id="3", extra_pnginfo=WORKFLOW, text="ab") == ("AB", 2)
+    assert node.process(rich_text="x = 1", node_id="9", extra_pnginfo=None) == (None,)
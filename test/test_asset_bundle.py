@@ -0,0 +1,84 @@
+"""Tests for fluxagent/utils/AssetBundle.py and fluxagent/utils/Paths.py."""
+
+import os
+import sys
+import gzip
+import types
+
+import pytest
+
+from fluxagent.utils import Paths
+from fluxagent.utils.AssetBundle import ASSET_SOURCES, AssetBundle, choose_encoding
+
+SCRIPT = "export const value = 1;\n" * 200
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "src" / "bundle.js"
+    path.parent.mkdir()
+    path.write_text(SCRIPT, encoding="utf-8")
+    return path
+
+
+def make_bundle(tmp_path, out_dir=None):
+    return AssetBundle({"bundle.js": "src/bundle.js", "missing.js": "src/missing.js"}, str(tmp_path),
+                       out_dir and str(out_dir))
+
+
+def test_only_the_served_entry_points_are_sources():
+    assert ASSET_SOURCES == {"codemirror_bundle.js": "libs/codemirror/dist/codemirror_bundle.js"}
+
+
+def test_default_cache_dir_uses_the_comfyui_user_directory(monkeypatch, tmp_path):
+    folder_paths = types.ModuleType("folder_paths")
+    folder_paths.get_user_directory = lambda: str(tmp_path)
+    monkeypatch.setitem(sys.modules, "folder_paths", folder_paths)
+    assert Paths.default_cache_dir() == os.path.join(str(tmp_path), "X-FluxAgent")
+
+    monkeypatch.setitem(sys.modules, "folder_paths", None)
+    assert Paths.default_cache_dir() == os.path.join(Paths.EXTENSION_DIR, ".cache", "X-FluxAgent")
+
+
+def test_assets_get_hashed_names_and_compressed_variants(tmp_path, source):
+    bundle = make_bundle(tmp_path)
+    manifest = bundle.manifest()
+    assert list(manifest) == ["bundle.js"]
+    entry = manifest["bundle.js"]
+    assert entry["file"] == f"bundle.{entry['digest'][:16]}.js"
+
+    asset, immutable = bundle.lookup(entry["file"])
+    assert immutable and asset.content_type == "text/javascript"
+    assert asset.variants["identity"] == SCRIPT.encode()
+    assert gzip.decompress(asset.variants["gzip"]) == SCRIPT.encode()
+    assert asset.etag("gzip") != asset.etag("identity")
+    assert bundle.lookup("bundle.js") == (asset, False)
+    assert bundle.lookup("missing.js") == (None, False)
+
+
+def test_changed_sources_are_rebuilt_and_old_names_still_served(tmp_path, source):
+    bundle = make_bundle(tmp_path)
+    old_name = bundle.manifest()["bundle.js"]["file"]
+    source.write_text(SCRIPT + "export const other = 2;\n", encoding="utf-8")
+    os.utime(source, ns=(0, 1))
+    new_name = bundle.manifest()["bundle.js"]["file"]
+    assert new_name != old_name
+    assert bundle.lookup(old_name)[1] and bundle.lookup(new_name)[1]
+
+
+def test_built_variants_are_kept_on_disk(tmp_path, source):
+    out_dir = tmp_path / "out"
+    name = make_bundle(tmp_path, out_dir).manifest()["bundle.js"]["file"]
+    assert (out_dir / (name + ".gz")).is_file()
+    (out_dir / (name + ".gz")).write_bytes(b"stored")
+    asset, _ = make_bundle(tmp_path, out_dir).lookup(name)
+    assert asset.variants["gzip"] == b"stored"
+
+
+def test_choose_encoding_follows_accept_encoding(tmp_path, source):
+    asset, _ = make_bundle(tmp_path).lookup("bundle.js")
+    preferred = "br" if "br" in asset.variants else "gzip"
+    assert choose_encoding("gzip, deflate, br", asset) == preferred
+    assert choose_encoding("gzip;q=0, br;q=0", asset) == "identity"
+    assert choose_encoding("*", asset) == preferred
+    assert choose_encoding("", asset) == "identity"
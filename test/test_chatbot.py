@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test script for the ChatBot functionality
+
+Runs ChatBotService against the offline mock OpenAI server in
+test/mock_openai_server.py, so no API key or network is needed.
+"""
+
+import json
+import asyncio
+import contextlib
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def chatbot(mock_server, prompt_server):
+    """ChatBotService pointed at the mock server, with retries disabled."""
+    from _pytest.monkeypatch import MonkeyPatch
+
+    patch = MonkeyPatch()
+    patch.setenv("FLUXAGENT_LLM_PROVIDERS", json.dumps({"openai": {"base_url": mock_server.url}}))
+    patch.setenv("OPENAI_API_KEY", "test_key_for_testing")
+    patch.setenv("FLUXAGENT_LLM_MAX_RETRIES", "0")
+
+    # ChatBotService registers its routes on the stand-in PromptServer when imported
+    from fluxagent import ChatBotService
+    from fluxagent.utils import LLMProviders, RateLimiter
+
+    # Built from the environment on first use
+    patch.setattr(LLMProviders, "_registry", None)
+    patch.setattr(RateLimiter, "_retry_policy", None)
+    yield ChatBotService.ChatBotService()
+    patch.undo()
+
+
+async def check_chatbot_service(service, prompt_server):
+    from fluxagent.utils.HttpClient import close_async_sessions
+    from fluxagent.utils.LLMClient import LLMError
+
+    print("\n1. Testing a plain response:")
+    result = await service.get_openai_response("Hello, how are you?")
+    print(f"Result: {result}")
+    assert result.startswith("Echo: Hello, how are you?")
+
+    print("\n2. Testing a streamed response:")
+    result = await service.stream_openai_response("Stream this", "message-1", client_id="client-1")
+    await asyncio.sleep(0.1)  # let the client outbox deliver the deltas
+    print(f"Result: {result}")
+    assert result.startswith("Echo: Stream this")
+    assert "client-1" in prompt_server.first_delta
+
+    print("\n3. Testing conversation memory:")
+    conversation = service.conversations.get("session-1")
+    await service.get_openai_response("My name is Ada", conversation=conversation)
+    request = service.build_request("What is my name?", conversation=conversation)
+    contents = [message["content"] for message in request["messages"]]
+    print(f"Messages sent: {len(contents)}")
+    assert "My name is Ada" in contents
+
+    print("\n4. Testing error handling:")
+    try:
+        await service.get_openai_response("Fail please [mock:status=500]")
+    except LLMError as e:
+        print(f"Error result: {e}")
+        assert e.status == 500
+    else:
+        raise AssertionError("Expected an LLMError")
+
+    await close_async_sessions()
+
+
+@contextlib.asynccontextmanager
+async def route_client(prompt_server):
+    """aiohttp test client of an app serving the routes registered on the stand-in PromptServer."""
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+
+    app = web.Application()
+    app.add_routes(prompt_server.routes)
+    async with TestClient(TestServer(app)) as client:
+        yield client
+
+
+def post_messages(prompt_server, bodies):
+    """POST each body to the message route in turn, return the (status, json) answers."""
+    from fluxagent.utils.HttpClient import close_async_sessions
+
+    async def post():
+        answers = []
+        async with route_client(prompt_server) as client:
+            for body in bodies:
+                response = await client.post("/X-FluxAgent-chatbot-message", json=body)
+                answers.append((response.status, await response.json()))
+        await close_async_sessions()
+        return answers
+
+    return asyncio.run(post())
+
+
+def test_chatbot_service(chatbot, prompt_server):
+    """Test the ChatBotService functionality"""
+    print("Testing ChatBotService...")
+    asyncio.run(check_chatbot_service(chatbot, prompt_server))
+    print("\nChatBotService tests completed successfully!")
+
+
+def test_message_requires_a_connected_client(chatbot, prompt_server):
+    answers = post_messages(prompt_server, [
+        {"message": "Hello", "session_id": "s"},
+        {"message": "Hello", "session_id": "s", "client_id": "not-connected"},
+    ])
+    assert [status for status, _ in answers] == [400, 400]
+
+
+def test_sessions_are_scoped_by_client(chatbot, prompt_server):
+    from fluxagent.ChatBotService import chatbot_service
+
+    prompt_server.sockets.update({"client-a": None, "client-b": None})
+    answers = post_messages(prompt_server, [
+        {"message": "My name is Ada", "session_id": "shared", "client_id": "client-a"},
+        {"message": "My name is Bob", "session_id": "shared", "client_id": "client-b"},
+    ])
+    assert [body.get("status") for _, body in answers] == ["success", "success"]
+
+    contents = [message.content for message in chatbot_service.conversations.get("client-a:shared").messages]
+    assert "My name is Ada" in contents
+    assert "My name is Bob" not in contents
+    # Responses only go to the client that asked
+    responses = [sid for event, _, sid in prompt_server.sent if event == "X-FluxAgent.chatbot.message"]
+    assert responses[-2:] == ["client-a", "client-b"]
+
+
+def test_events_without_a_client_are_not_broadcast(chatbot, prompt_server):
+    from fluxagent.ChatBotService import send_event
+
+    sent = len(prompt_server.sent)
+    send_event(None, "X-FluxAgent.chatbot.message", {"error": "Request failed", "loading": False})
+    assert len(prompt_server.sent) == sent
+
+
+def test_deltas_are_coalesced_between_flushes(chatbot, monkeypatch):
+    from fluxagent import ChatBotService
+
+    sent = []
+    monkeypatch.setattr(ChatBotService, "send_event", lambda client_id, event, data: sent.append((client_id, data)))
+
+    async def stream():
+        coalescer = ChatBotService.DeltaCoalescer("m1", "client-a", interval=0.05, max_chars=10)
+        coalescer.add("He")
+        coalescer.add("llo")
+        assert [data["delta"] for _, data in sent] == ["He"]
+        await asyncio.sleep(0.1)  # the timer flushes a stalled stream
+        coalescer.add("0123456789")  # past max_chars, sent at once
+        coalescer.add("!")
+        coalescer.flush()
+
+    asyncio.run(stream())
+    assert [data["delta"] for _, data in sent] == ["He", "llo", "0123456789", "!"]
+    assert [data["index"] for _, data in sent] == [0, 1, 2, 3]
+    assert {client_id for client_id, _ in sent} == {"client-a"}
+
+
+def test_clients_only_cancel_their_own_messages(chatbot, prompt_server):
+    from fluxagent.utils.HttpClient import close_async_sessions
+
+    prompt_server.sockets.update({"client-a": None, "client-b": None})
+
+    async def cancel(client, body):
+        response = await client.post("/X-FluxAgent-chatbot-cancel", json=body)
+        return response.status, await response.json()
+
+    async def check():
+        async with route_client(prompt_server) as client:
+            message = asyncio.ensure_future(client.post("/X-FluxAgent-chatbot-message", json={
+                "message": "Take your time [mock:latency=5]", "session_id": "s", "client_id": "client-a"}))
+            await asyncio.sleep(0.3)
+            loading = [data for event, data, sid in prompt_server.sent
+                       if event == "X-FluxAgent.chatbot.loading" and sid == "client-a"]
+            message_id = loading[-1]["message_id"]
+
+            assert (await cancel(client, {"session_id": "s"}))[0] == 400
+            assert (await cancel(client, {"session_id": "s", "client_id": "client-b"}))[1]["cancelled"] == 0
+            assert (await cancel(client, {"message_id": message_id, "client_id": "client-b"}))[1]["cancelled"] == 0
+            assert not message.done()
+
+            assert (await cancel(client, {"message_id": message_id, "client_id": "client-a"}))[1]["cancelled"] == 1
+            response = await message
+            assert (await response.json())["status"] == "cancelled"
+        await close_async_sessions()
+
+    asyncio.run(check())
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,101 @@
+"""Tests for fluxagent/utils/ClientOutbox.py."""
+
+import asyncio
+
+from fluxagent.utils.ClientOutbox import ClientOutbox, ClientOutboxes
+
+
+class Receiver:
+    """send() of a websocket client that is blocked until released."""
+
+    def __init__(self):
+        self.received = []
+        self.released = None
+
+    async def send(self, event, data, sid):
+        await self.released.wait()
+        self.received.append((event, data, sid))
+
+
+def run_outbox(fill, max_items=3):
+    """Queue events with fill(outbox) while the client is blocked, then deliver them all."""
+    receiver = Receiver()
+
+    async def run():
+        receiver.released = asyncio.Event()
+        outbox = ClientOutbox("client", receiver.send, max_items)
+        fill(outbox)
+        await asyncio.sleep(0)
+        receiver.released.set()
+        while outbox._task is not None:
+            await asyncio.sleep(0.01)
+        return outbox
+
+    outbox = asyncio.run(run())
+    return outbox, [(event, data) for event, data, _ in receiver.received]
+
+
+def test_events_are_sent_in_order_to_their_client():
+    def fill(outbox):
+        for index in range(3):
+            outbox.put("event", index)
+
+    outbox, received = run_outbox(fill)
+    assert received == [("event", 0), ("event", 1), ("event", 2)]
+    assert outbox.dropped == 0
+
+
+def test_full_queue_drops_the_oldest_droppable_event():
+    def fill(outbox):
+        outbox.put("message", 0)
+        outbox.put("loading", 1, droppable=True)
+        outbox.put("message", 2)
+        outbox.put("loading", 3, droppable=True)  # drops loading 1
+        outbox.put("message", 4)  # drops loading 3
+
+    outbox, received = run_outbox(fill)
+    assert received == [("message", 0), ("message", 2), ("message", 4)]
+    assert outbox.dropped == 2
+
+
+def test_non_droppable_events_are_never_dropped():
+    def fill(outbox):
+        for index in range(10):
+            outbox.put("message", index)
+
+    outbox, received = run_outbox(fill)
+    assert [data for _, data in received] == list(range(10))
+    assert outbox.dropped == 0
+
+
+def test_coalesced_events_replace_or_merge_while_waiting():
+    def merge(queued, data):
+        return queued + data
+
+    def fill(outbox):
+        outbox.put("first", "")
+        outbox.put("loading", "waiting", coalesce_key="loading")
+        outbox.put("delta", "a", coalesce_key="delta", merge=merge)
+        outbox.put("loading", "running", coalesce_key="loading")
+        outbox.put("delta", "b", coalesce_key="delta", merge=merge)
+
+    _, received = run_outbox(fill)
+    assert received == [("first", ""), ("loading", "running"), ("delta", "ab")]
+
+
+def test_outboxes_are_released_when_drained():
+    receiver = Receiver()
+
+    async def run():
+        receiver.released = asyncio.Event()
+        receiver.released.set()
+        outboxes = ClientOutboxes(receiver.send, 8)
+        outboxes.get("a").put("event", 1)
+        outboxes.get("b").put("event", 2)
+        assert len(outboxes._outboxes) == 2
+        await asyncio.sleep(0.01)
+        return outboxes
+
+    outboxes = asyncio.run(run())
+    assert outboxes._outboxes == {}
+    assert sorted(sid for _, _, sid in receiver.received) == ["a", "b"]
@@ -0,0 +1,97 @@
+"""Tests for fluxagent/utils/CodeCache.py and fluxagent/utils/WorkflowIndex.py."""
+
+import os
+import importlib.util
+
+import pytest
+
+from fluxagent.utils import CodeCache as code_cache
+from fluxagent.utils.CodeCache import CodeCache
+from fluxagent.utils.WorkflowIndex import WorkflowIndex
+
+
+def cached_files(cache_dir):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(cache_dir) for name in names)
+
+
+def test_code_is_compiled_once_per_source_and_filename(monkeypatch):
+    compiled = []
+    real_compile = compile
+
+    def counting_compile(*args, **kwargs):
+        compiled.append(args[1])
+        return real_compile(*args, **kwargs)
+
+    monkeypatch.setattr(code_cache, "compile", counting_compile, raising=False)
+    cache = CodeCache(max_entries=2)
+    code = cache.compile("x = 1", "<a>")
+    assert cache.compile("x = 1", "<a>") is code
+    assert cache.compile("x = 1", "<b>").co_filename == "<b>"
+    cache.compile("x = 2", "<a>")
+    # "x = 1" in <a> was the least recently used of three entries
+    assert cache.compile("x = 1", "<b>").co_filename == "<b>"
+    cache.compile("x = 1", "<a>")
+    assert compiled == ["<a>", "<b>", "<a>", "<a>"]
+
+    namespace = {}
+    exec(code, namespace)
+    assert namespace["x"] == 1
+
+
+def test_bytecode_is_persisted_for_a_new_cache(tmp_path, monkeypatch):
+    CodeCache(max_entries=4, cache_dir=str(tmp_path)).compile("y = 2", "<node>")
+    assert len(cached_files(tmp_path)) == 1
+
+    def no_compile(*args, **kwargs):
+        raise AssertionError("compiled again")
+
+    monkeypatch.setattr(code_cache, "compile", no_compile, raising=False)
+    namespace = {}
+    exec(CodeCache(max_entries=4, cache_dir=str(tmp_path)).compile("y = 2", "<node>"), namespace)
+    assert namespace["y"] == 2
+
+
+def test_bytecode_of_another_python_or_damaged_files_is_ignored(tmp_path):
+    CodeCache(max_entries=4, cache_dir=str(tmp_path)).compile("z = 3", "<node>")
+    (path,) = cached_files(tmp_path)
+    with open(path, "rb") as f:
+        data = f.read()
+    magic = importlib.util.MAGIC_NUMBER
+    with open(path, "wb") as f:
+        f.write(b"\0" * len(magic) + data[len(magic):])
+    assert CodeCache(max_entries=4, cache_dir=str(tmp_path)).compile("z = 3", "<node>").co_filename == "<node>"
+
+    with open(path, "wb") as f:
+        f.write(magic + b"\xff")
+    assert CodeCache(max_entries=4, cache_dir=str(tmp_path)).compile("z = 3", "<node>").co_filename == "<node>"
+
+
+def test_syntax_errors_are_raised_and_not_cached(tmp_path):
+    cache = CodeCache(max_entries=4, cache_dir=str(tmp_path))
+    with pytest.raises(SyntaxError):
+        cache.compile("def broken(:", "<broken>")
+    assert cached_files(tmp_path) == []
+
+
+def test_workflow_nodes_are_found_by_id():
+    index = WorkflowIndex()
+    workflow = {"nodes": [{"id": 3, "name": "first"}, {"id": 4}, {"id": 3, "name": "duplicate"}]}
+    extra_pnginfo = {"workflow": workflow}
+    assert index.get_node(extra_pnginfo, "3")["name"] == "first"
+    assert index.get_node(extra_pnginfo, 4) == {"id": 4}
+    assert index.get_node(extra_pnginfo, "9") is None
+    assert index.get_node(None, "3") is None
+    assert index.get_node({}, "3") is None
+
+
+def test_workflow_indexes_are_kept_for_the_most_recent_workflows():
+    index = WorkflowIndex(max_workflows=2)
+    workflows = [{"nodes": [{"id": n}]} for n in range(3)]
+    for workflow in workflows:
+        index.get_node({"workflow": workflow}, "0")
+    assert [entry[0] for entry in index._indexes.values()] == workflows[1:]
+
+    # An indexed workflow is not scanned again
+    workflows[2]["nodes"].append({"id": 5})
+    assert index.get_node({"workflow": workflows[2]}, "5") is None
+    assert index.get_node({"workflow": {"nodes": [{"id": 5}]}}, "5") == {"id": 5}
@@ -0,0 +1,120 @@
+"""Tests for fluxagent/utils/CodeSandbox.py and the worker in SandboxWorker.py."""
+
+import os
+import array
+
+import pytest
+
+from fluxagent.utils import CodeCache
+from fluxagent.utils.CodeSandbox import CodeSandbox, SandboxError
+from fluxagent.utils.SandboxWorker import dump_payload, load_payload, release
+
+SHM_THRESHOLD = 4096
+
+
+@pytest.fixture(autouse=True)
+def memory_code_cache(monkeypatch):
+    """Compiled code stays in memory instead of the user directory."""
+    monkeypatch.setattr(CodeCache, "_cache", CodeCache.CodeCache(max_entries=16))
+
+
+def make_sandbox(**settings):
+    config = dict(enabled=True, workers=1, max_runs=0, timeout=20, cpu_seconds=0, memory_mb=0,
+                  preload=[], shm_threshold=SHM_THRESHOLD)
+    config.update(settings)
+    return CodeSandbox(**config)
+
+
+@pytest.fixture
+def sandbox():
+    sandbox = make_sandbox()
+    yield sandbox
+    sandbox.shutdown()
+
+
+def worker_pid(sandbox):
+    (pid,) = sandbox.run("import os\npid = os.getpid()", "<pid>", {}, ["pid"])
+    return pid
+
+
+def test_runs_code_with_inputs_and_outputs(sandbox):
+    source = "total = a + b\nunset_name = None\nlabel = f'{name}!'"
+    assert sandbox.run(source, "<add>", {"a": 2, "b": 3, "name": "x"}, ["total", "label", "missing"]) == (5, "x!", None)
+    assert worker_pid(sandbox) != os.getpid()
+
+
+def test_disabled_sandbox_refuses_to_run():
+    sandbox = make_sandbox(enabled=False)
+    with pytest.raises(SandboxError, match="FLUXAGENT_SANDBOX_ENABLED"):
+        sandbox.run("x = 1", "<x>", {}, ["x"])
+    sandbox.start()
+    assert sandbox._idle.empty()
+
+
+def test_no_workers_is_an_error_not_an_in_process_run():
+    sandbox = make_sandbox(workers=0)
+    with pytest.raises(SandboxError, match="FLUXAGENT_SANDBOX_WORKERS"):
+        sandbox.run("x = 1", "<x>", {}, ["x"])
+
+
+def test_code_error_keeps_the_worker(sandbox):
+    pid = worker_pid(sandbox)
+    with pytest.raises(SandboxError, match="ZeroDivisionError"):
+        sandbox.run("x = 1 / 0", "<div>", {}, ["x"])
+    assert worker_pid(sandbox) == pid
+
+
+def test_timeout_kills_the_worker_and_the_next_run_works(sandbox):
+    pid = worker_pid(sandbox)
+    with pytest.raises(SandboxError, match="did not finish within"):
+        sandbox.run("while True:\n    pass", "<loop>", {}, [], timeout=0.5)
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+    assert worker_pid(sandbox) != pid
+
+
+def test_workers_are_recycled_after_max_runs():
+    sandbox = make_sandbox(max_runs=2)
+    try:
+        first = worker_pid(sandbox)
+        assert worker_pid(sandbox) == first
+        second = worker_pid(sandbox)
+        assert second != first
+        assert worker_pid(sandbox) == second
+    finally:
+        sandbox.shutdown()
+
+
+def test_crashed_worker_is_replaced(sandbox):
+    pid = worker_pid(sandbox)
+    with pytest.raises(SandboxError, match="exited with code 3"):
+        sandbox.run("import os\nos._exit(3)", "<crash>", {}, [])
+    assert worker_pid(sandbox) != pid
+
+
+def test_large_payloads_round_trip_through_shared_memory(sandbox):
+    values = array.array("d", range(4096))
+    descriptor, block = dump_payload({"values": values}, SHM_THRESHOLD)
+    try:
+        assert descriptor[0] == "shm"
+        assert load_payload(descriptor) == {"values": values}
+    finally:
+        release(block)
+    assert dump_payload([1, 2], SHM_THRESHOLD)[0][0] == "inline"
+
+    source = "doubled = array.array('d', (value * 2 for value in values))"
+    (doubled,) = sandbox.run("import array\n" + source, "<double>", {"values": values}, ["doubled"])
+    assert doubled == array.array("d", (value * 2 for value in values))
+
+
+def test_worker_runs_in_its_own_directory_without_the_server_environment(sandbox, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "secret")
+    sandbox.run("x = 1", "<start>", {}, ["x"])
+    cwd, home, key = sandbox.run("import os\ncwd = os.getcwd()\nhome = os.environ.get('HOME')\n"
+                                 "key = os.environ.get('OPENAI_API_KEY')", "<env>", {}, ["cwd", "home", "key"])
+    assert key is None
+    assert cwd == home
+    assert os.path.basename(cwd).startswith("fluxagent-sandbox-")
+    assert cwd != os.getcwd()
+    sandbox.shutdown()
+    assert not os.path.exists(cwd)
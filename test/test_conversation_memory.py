@@ -0,0 +1,79 @@
+"""Tests for fluxagent/utils/ConversationMemory.py and Tokenizer.py."""
+
+import pytest
+
+from fluxagent.utils.ConversationMemory import Conversation, ConversationStore
+from fluxagent.utils.Tokenizer import MESSAGE_OVERHEAD, REPLY_OVERHEAD, count_message_tokens, count_messages_tokens, count_tokens
+
+
+def test_count_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens("a cat") == 2
+    # One token per started four characters of a long word, one per symbol
+    assert count_tokens("tokenizer!") == 4
+    assert count_message_tokens({"content": "a cat"}) == MESSAGE_OVERHEAD + 2
+    assert count_messages_tokens([{"content": "a"}, {"content": None}]) == REPLY_OVERHEAD + 2 * MESSAGE_OVERHEAD + 1
+
+
+def test_build_messages_keeps_the_most_recent_messages_that_fit():
+    conversation = Conversation(max_messages=50)
+    for index in range(20):
+        conversation.add("user" if index % 2 == 0 else "assistant", f"message {index}")
+
+    messages = conversation.build_messages("system", "new", budget=50)
+    assert messages[0] == {"role": "system", "content": "system"}
+    assert messages[-1] == {"role": "user", "content": "new"}
+    window = [message["content"] for message in messages[1:-1]]
+    assert window == [f"message {index}" for index in range(20 - len(window), 20)]
+    assert 0 < len(window) < 20
+    assert count_messages_tokens(messages) <= 50
+
+
+def test_build_messages_includes_the_summary():
+    conversation = Conversation(max_messages=10)
+    conversation.summary = "The user is Ada."
+    messages = conversation.build_messages("system", "new", budget=1000)
+    assert messages[1]["role"] == "system"
+    assert "The user is Ada." in messages[1]["content"]
+
+
+def test_fold_replaces_the_oldest_messages_by_the_summary():
+    conversation = Conversation(max_messages=100)
+    for index in range(30):
+        conversation.add("user", f"message number {index}")
+    assert conversation.messages_to_fold(budget=10 ** 6) == []
+
+    folded = conversation.messages_to_fold(budget=100)
+    assert folded and folded[0].content == "message number 0"
+    # The latest exchange is always kept verbatim
+    assert len(folded) <= 28
+    request = conversation.summary_request_messages(folded)
+    assert "message number 0" in request[1]["content"]
+
+    conversation.fold(folded, "summary")
+    assert conversation.summary == "summary"
+    assert conversation.messages[0].content == f"message number {len(folded)}"
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setenv("FLUXAGENT_CHAT_MAX_SESSIONS", "2")
+    monkeypatch.setenv("FLUXAGENT_CHAT_SESSION_TTL", "60")
+    return ConversationStore()
+
+
+def test_store_keeps_the_most_recently_used_sessions(store):
+    first = store.get("a")
+    store.get("b")
+    assert store.get("a") is first
+    store.get("c")
+    # "b" was the least recently used
+    assert store.get("a") is first
+    assert "b" not in store._sessions
+
+
+def test_store_expires_idle_sessions(store):
+    first = store.get("a")
+    first.last_used -= 120
+    store.get("b")
+    assert store.get("a") is not first
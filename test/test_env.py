@@ -0,0 +1,30 @@
+"""Tests for fluxagent/utils/Env.py."""
+
+from fluxagent.utils.Env import env_float, env_int
+
+
+def test_env_int_reads_the_value(monkeypatch):
+    monkeypatch.setenv("FLUXAGENT_TEST_VALUE", " 12 ")
+    assert env_int("FLUXAGENT_TEST_VALUE", 3) == 12
+
+
+def test_env_float_reads_the_value(monkeypatch):
+    monkeypatch.setenv("FLUXAGENT_TEST_VALUE", "0.25")
+    assert env_float("FLUXAGENT_TEST_VALUE", 1.0) == 0.25
+
+
+def test_unset_or_empty_uses_the_default(monkeypatch):
+    monkeypatch.delenv("FLUXAGENT_TEST_VALUE", raising=False)
+    assert env_int("FLUXAGENT_TEST_VALUE", 3) == 3
+    monkeypatch.setenv("FLUXAGENT_TEST_VALUE", "")
+    assert env_float("FLUXAGENT_TEST_VALUE", 1.5) == 1.5
+
+
+def test_malformed_value_warns_and_uses_the_default(monkeypatch, capsys):
+    monkeypatch.setenv("FLUXAGENT_TEST_VALUE", "2.5")
+    assert env_int("FLUXAGENT_TEST_VALUE", 3) == 3
+    monkeypatch.setenv("FLUXAGENT_TEST_VALUE", "fast")
+    assert env_float("FLUXAGENT_TEST_VALUE", 1.5) == 1.5
+    output = capsys.readouterr().out
+    assert "Invalid FLUXAGENT_TEST_VALUE='2.5', using the default 3" in output
+    assert "Invalid FLUXAGENT_TEST_VALUE='fast', using the default 1.5" in output
@@ -0,0 +1,126 @@
+"""Tests for fluxagent/utils/FileWatcher.py."""
+
+import os
+import sys
+import time
+import queue
+
+import pytest
+
+from fluxagent.utils import FileWatcher as file_watcher
+from fluxagent.utils.FileWatcher import FileWatcher
+
+
+def write(path, text="x = 1\n"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def changes(backend, until, timeout=5):
+    """Paths the backend reports until the set `until` was seen or the timeout."""
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while not until <= seen and time.monotonic() < deadline:
+        seen.update(backend.read(0.05))
+    return seen
+
+
+def inotify_backend(roots):
+    if not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux only")
+    try:
+        return file_watcher._InotifyBackend(roots)
+    except OSError as e:
+        pytest.skip(f"inotify unavailable: {e}")
+
+
+BACKENDS = {
+    "poll": lambda roots: file_watcher._PollingBackend(roots, interval=0.01),
+    "inotify": inotify_backend,
+}
+
+
+@pytest.fixture(params=list(BACKENDS))
+def backend_factory(request):
+    opened = []
+
+    def factory(roots):
+        backend = BACKENDS[request.param](roots)
+        opened.append(backend)
+        return backend
+
+    yield factory
+    for backend in opened:
+        backend.close()
+
+
+def test_created_modified_and_nested_files_are_reported(backend_factory, tmp_path):
+    existing = write(tmp_path / "nodes" / "node.py")
+    backend = backend_factory([str(tmp_path)])
+    # Let the poll backend's next scan see a new mtime
+    time.sleep(0.01)
+
+    new = write(tmp_path / "nodes" / "new.py")
+    assert changes(backend, {new}) == {new}
+    write(tmp_path / "nodes" / "node.py", "x = 2\n")
+    assert existing in changes(backend, {existing})
+    nested = write(tmp_path / "nodes" / "sub" / "deep.py")
+    assert nested in changes(backend, {nested})
+
+
+def test_other_files_and_ignored_directories_are_not_reported(backend_factory, tmp_path):
+    (tmp_path / "__pycache__").mkdir()
+    backend = backend_factory([str(tmp_path)])
+    write(tmp_path / "notes.txt")
+    write(tmp_path / ".node.py")
+    write(tmp_path / "__pycache__" / "node.py")
+    marker = write(tmp_path / "marker.py")
+    assert changes(backend, {marker}) == {marker}
+
+
+def test_polling_reports_deleted_files(tmp_path):
+    path = write(tmp_path / "node.py")
+    backend = file_watcher._PollingBackend([str(tmp_path)], interval=0.01)
+    os.unlink(path)
+    assert backend.read(0.01) == [path]
+    assert backend.read(0.01) == []
+
+
+def test_a_burst_of_changes_is_reported_once_it_is_quiet(tmp_path):
+    batches = queue.Queue()
+    watcher = FileWatcher([str(tmp_path), str(tmp_path / "missing")], batches.put,
+                          debounce=0.3, backend="poll", poll_interval=0.02)
+    assert watcher.roots == [str(tmp_path)]
+    watcher.start()
+    try:
+        paths = set()
+        for index in range(5):
+            paths.add(write(tmp_path / f"node{index}.py"))
+            time.sleep(0.05)
+        assert batches.get(timeout=5) == paths
+        with pytest.raises(queue.Empty):
+            batches.get(timeout=0.5)
+    finally:
+        watcher.stop()
+    assert watcher.backend is None
+
+
+def test_callback_errors_do_not_stop_the_watcher(tmp_path, capsys):
+    batches = queue.Queue()
+
+    def callback(batch):
+        batches.put(batch)
+        if len(batches.queue) == 1:
+            raise RuntimeError("reload failed")
+
+    watcher = FileWatcher([str(tmp_path)], callback, debounce=0.05, backend="poll", poll_interval=0.02)
+    watcher.start()
+    try:
+        first = write(tmp_path / "first.py")
+        assert batches.get(timeout=5) == {first}
+        second = write(tmp_path / "second.py")
+        assert batches.get(timeout=5) == {second}
+    finally:
+        watcher.stop()
+    assert "reload failed" in capsys.readouterr().out
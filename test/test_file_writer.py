@@ -0,0 +1,175 @@
+"""Tests for fluxagent/utils/FileWriter.py."""
+
+import os
+import gzip
+import stat
+import threading
+
+import pytest
+
+from fluxagent.utils import FileWriter as file_writer
+from fluxagent.utils.FileWriter import BufferedFileWriter, OutputFormat
+
+
+@pytest.fixture
+def writer():
+    writer = BufferedFileWriter(flush_interval=60, flush_bytes=1024 * 1024, max_open_files=2)
+    yield writer
+    writer.close()
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_appends_are_buffered_until_flushed(writer, tmp_path):
+    path = str(tmp_path / "sub" / "out.txt")
+    writer.append(path, "one\n")
+    writer.append(path, "two\n")
+    assert read(path) == ""
+    writer.flush(path)
+    assert read(path) == "one\ntwo\n"
+
+
+def test_handles_beyond_the_pool_are_closed_with_their_appends_written(writer, tmp_path):
+    paths = [str(tmp_path / f"out{index}.txt") for index in range(4)]
+    for index, path in enumerate(paths):
+        writer.append(path, f"text {index}")
+    writer.flush()
+    assert [read(path) for path in paths] == [f"text {index}" for index in range(4)]
+    assert len(writer._handles) == 2
+
+
+def test_concurrent_appends_never_interleave(writer, tmp_path):
+    path = str(tmp_path / "out.txt")
+    texts = [f"{index:03d}" * 1000 + "\n" for index in range(20)]
+    threads = [threading.Thread(target=writer.append, args=(path, text)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.flush()
+    assert sorted(read(path).splitlines(keepends=True)) == texts
+
+
+class FailingFile:
+    """Stands in for a handle's file and fails the first write like a full disk."""
+
+    def __init__(self, file):
+        self.file = file
+        self.failed = False
+
+    def write(self, data):
+        if not self.failed:
+            self.failed = True
+            raise OSError(28, "No space left on device")
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+
+def test_failed_writes_keep_the_appends_for_the_next_flush(writer, tmp_path):
+    path = str(tmp_path / "out.txt")
+    writer.append(path, "kept\n")
+    handle = writer._handles[path]
+    handle.file = FailingFile(handle.raw)
+    with pytest.raises(OSError):
+        writer.flush(path)
+    assert read(path) == ""
+    handle.file = handle.raw
+    writer.append(path, "next\n")
+    writer.flush(path)
+    assert read(path) == "kept\nnext\n"
+
+
+def test_a_slow_open_only_holds_up_its_own_file(writer, tmp_path, monkeypatch):
+    slow_path = str(tmp_path / "slow.jsonl")
+    with open(slow_path, "w") as f:
+        f.write("0\n")
+    counting = threading.Event()
+    release = threading.Event()
+    count_lines = file_writer._count_lines
+
+    def slow_count_lines(path, compression):
+        counting.set()
+        release.wait(5)
+        return count_lines(path, compression)
+
+    monkeypatch.setattr(file_writer, "_count_lines", slow_count_lines)
+    rotating = OutputFormat(max_records=10, line_records=True)
+    thread = threading.Thread(target=writer.append, args=(slow_path, "1\n", rotating))
+    thread.start()
+    try:
+        assert counting.wait(5)
+        fast_path = str(tmp_path / "fast.txt")
+        fast = threading.Thread(target=lambda: (writer.append(fast_path, "fast"), writer.flush(fast_path)))
+        fast.start()
+        fast.join(2)
+        assert not fast.is_alive() and read(fast_path) == "fast"
+    finally:
+        release.set()
+        thread.join()
+    writer.flush()
+    assert read(slow_path) == "0\n1\n"
+    assert writer._handles[slow_path].records == 2
+
+
+def test_write_replaces_the_content_and_drops_earlier_appends_into_the_old_file(writer, tmp_path):
+    path = str(tmp_path / "out.txt")
+    writer.append(path, "old")
+    writer.write(path, "new")
+    writer.flush()
+    assert read(path) == "new"
+    assert os.listdir(tmp_path) == ["out.txt"]
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX file modes")
+def test_write_creates_files_with_the_umask_applied(writer, tmp_path):
+    path = str(tmp_path / "out.txt")
+    previous = os.umask(0o027)
+    try:
+        writer.write(path, "text")
+    finally:
+        os.umask(previous)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX file modes")
+def test_write_keeps_the_mode_of_a_replaced_file(writer, tmp_path):
+    path = str(tmp_path / "out.txt")
+    writer.write(path, "first")
+    os.chmod(path, 0o600)
+    writer.write(path, "second")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert read(path) == "second"
+
+
+def test_gzip_appends_from_several_opens_read_as_one_stream(writer, tmp_path):
+    path = str(tmp_path / "out.txt.gz")
+    gzip_format = OutputFormat(compression="gzip")
+    writer.append(path, "one\n", gzip_format)
+    writer._close(os.path.abspath(path))
+    writer.append(path, "two\n", gzip_format)
+    writer._close(os.path.abspath(path))
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert f.read() == "one\ntwo\n"
+
+
+def test_files_rotate_after_max_records(writer, tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    rotating = OutputFormat(max_records=2, line_records=True)
+    for index in range(5):
+        writer.append(path, f"{index}\n", rotating)
+    writer.flush()
+    assert read(tmp_path / "out.0001.jsonl") == "0\n1\n"
+    assert read(tmp_path / "out.0002.jsonl") == "2\n3\n"
+    assert read(path) == "4\n"
+
+
+def test_invalid_formats_are_refused():
+    with pytest.raises(ValueError):
+        OutputFormat(compression="lz4")
+    with pytest.raises(ValueError):
+        OutputFormat(max_records=10, pattern="{stem}-old{ext}")
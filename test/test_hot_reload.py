@@ -0,0 +1,215 @@
+"""Tests for fluxagent/utils/HotReload.py, with the ComfyUI modules it imports from comfy_stubs.py."""
+
+import sys
+import types
+import importlib
+import threading
+
+import pytest
+
+import comfy_stubs
+
+
+@pytest.fixture
+def hot_reload(monkeypatch):
+    for name, module in comfy_stubs.hot_reload_modules(["Other"]).items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delitem(sys.modules, "fluxagent.utils.HotReload", raising=False)
+    module = importlib.import_module("fluxagent.utils.HotReload")
+    yield module
+    sys.modules.pop("fluxagent.utils.HotReload", None)
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+NODE_FILE = '''
+{imports}
+class {name}:
+    VERSION = {version}
+
+NODE_CLASS_MAPPINGS = {{"{name}": {name}}}
+NODE_DISPLAY_NAME_MAPPINGS = {{"{name}": "{name} v{version}"}}
+'''
+
+
+def node_file(name, version=1, imports=""):
+    return NODE_FILE.format(name=name, version=version, imports=imports)
+
+
+def test_relative_and_absolute_imports_are_linked(hot_reload, tmp_path):
+    write(tmp_path / "nodes" / "__init__.py", "")
+    write(tmp_path / "nodes" / "helpers.py", "")
+    write(tmp_path / "nodes" / "sub" / "__init__.py", "from .. import helpers\n")
+    write(tmp_path / "nodes" / "sub" / "node.py", "from ..helpers import x\nfrom . import other\nimport json\n")
+    write(tmp_path / "nodes" / "sub" / "other.py", "import ext.nodes.helpers\n")
+    graph = hot_reload.ModuleGraph("ext", str(tmp_path))
+    graph.scan([str(tmp_path / "nodes")])
+
+    assert graph.imports["ext.nodes.sub"] == {"ext.nodes", "ext.nodes.helpers"}
+    assert graph.imports["ext.nodes.sub.node"] == {"ext.nodes.helpers", "ext.nodes.sub", "ext.nodes.sub.other"}
+    assert graph.imports["ext.nodes.sub.other"] == {"ext.nodes.helpers"}
+    assert graph.importers["ext.nodes.sub.other"] == {"ext.nodes.sub.node"}
+
+
+def test_dependents_follow_imports_transitively_and_update(hot_reload, tmp_path):
+    base = write(tmp_path / "user" / "base.py", "")
+    middle = write(tmp_path / "user" / "middle.py", "from . import base\n")
+    write(tmp_path / "user" / "top.py", "from .middle import thing\n")
+    write(tmp_path / "user" / "alone.py", "")
+    graph = hot_reload.ModuleGraph("ext", str(tmp_path))
+    graph.scan([str(tmp_path / "user")])
+
+    assert graph.dependents({"ext.user.base"}) == {"ext.user.middle", "ext.user.top"}
+    assert graph.dependents({"ext.user.top"}) == set()
+
+    write(tmp_path / "user" / "middle.py", "")
+    assert graph.update(middle) == "ext.user.middle"
+    assert graph.dependents({"ext.user.base"}) == set()
+
+    assert graph.remove(base) == "ext.user.base"
+    assert "ext.user.base" not in graph.files
+
+
+def test_order_puts_imports_first_and_breaks_cycles(hot_reload, tmp_path):
+    write(tmp_path / "user" / "a.py", "from . import b\n")
+    write(tmp_path / "user" / "b.py", "from . import c\n")
+    write(tmp_path / "user" / "c.py", "from . import a\n")
+    write(tmp_path / "user" / "d.py", "from . import a\n")
+    graph = hot_reload.ModuleGraph("ext", str(tmp_path))
+    graph.scan([str(tmp_path / "user")])
+
+    names = ["ext.user.d", "ext.user.c", "ext.user.b", "ext.user.a"]
+    assert graph.order(names) == ["ext.user.c", "ext.user.b", "ext.user.a", "ext.user.d"]
+    assert graph.order(["ext.user.d", "ext.user.b"]) == ["ext.user.b", "ext.user.d"]
+
+
+@pytest.fixture
+def extension(hot_reload, tmp_path, monkeypatch):
+    """A loaded extension package "ext" with user/base.py and user/node.py importing it."""
+    write(tmp_path / "user" / "__init__.py", "")
+    write(tmp_path / "user" / "base.py", "VALUE = 1\n")
+    write(tmp_path / "user" / "node.py", node_file("Node", imports="from .base import VALUE"))
+    for name in ("ext", "ext.user"):
+        package = types.ModuleType(name)
+        package.__path__ = [str(tmp_path / name.replace("ext", "", 1).strip("."))]
+        monkeypatch.setitem(sys.modules, name, package)
+    node = hot_reload.import_node_file("ext.user.node", str(tmp_path / "user" / "node.py"))
+    owner = sys.modules["ext"]
+    owner.NODE_CLASS_MAPPINGS = dict(node.NODE_CLASS_MAPPINGS)
+    owner.NODE_DISPLAY_NAME_MAPPINGS = dict(node.NODE_DISPLAY_NAME_MAPPINGS)
+    nodes = sys.modules["nodes"]
+    nodes.NODE_CLASS_MAPPINGS.update(node.NODE_CLASS_MAPPINGS)
+
+    graph = hot_reload.ModuleGraph("ext", str(tmp_path))
+    graph.scan([str(tmp_path / "user")])
+    monkeypatch.setattr(hot_reload, "_graph", graph)
+    monkeypatch.setattr(hot_reload, "_owners", [owner])
+    hot_reload._graph_ready.set()
+    yield owner
+    for name in ("ext.user.base", "ext.user.node", "ext.user.extra"):
+        sys.modules.pop(name, None)
+
+
+def test_reload_swaps_new_mappings_in(hot_reload, extension, tmp_path):
+    nodes = sys.modules["nodes"]
+    old_mappings, old_nodes_mappings = extension.NODE_CLASS_MAPPINGS, nodes.NODE_CLASS_MAPPINGS
+    old_class = old_mappings["Node"]
+    write(tmp_path / "user" / "node.py", node_file("Node", version=2, imports="from .base import VALUE"))
+    extra = write(tmp_path / "user" / "extra.py", node_file("Extra"))
+
+    assert hot_reload.reload_files([str(tmp_path / "user" / "node.py"), extra]) == ["ext.user.extra", "ext.user.node"]
+    # The mappings readers hold are left as they were
+    assert old_mappings == {"Node": old_class}
+    assert "Other" in old_nodes_mappings and old_nodes_mappings["Node"] is old_class
+    assert extension.NODE_CLASS_MAPPINGS["Node"].VERSION == 2
+    assert extension.NODE_DISPLAY_NAME_MAPPINGS == {"Node": "Node v2", "Extra": "Extra v1"}
+    assert set(nodes.NODE_CLASS_MAPPINGS) == {"Other", "Node", "Extra"}
+    assert hot_reload.RELOADED_CLASS_TYPES == {"Node": 3, "Extra": 3}
+    hot_reload.RELOADED_CLASS_TYPES.clear()
+
+
+def test_dependents_reload_and_failures_keep_the_old_module(hot_reload, extension, tmp_path):
+    base = write(tmp_path / "user" / "base.py", "VALUE = 2\n")
+    assert hot_reload.reload_files([base]) == ["ext.user.base", "ext.user.node"]
+    assert sys.modules["ext.user.node"].VALUE == 2
+    working = extension.NODE_CLASS_MAPPINGS["Node"]
+
+    node = write(tmp_path / "user" / "node.py", "raise RuntimeError('broken')\n")
+    assert hot_reload.reload_files([node]) == []
+    assert extension.NODE_CLASS_MAPPINGS["Node"] is working
+    assert sys.modules["ext.user.node"].Node is working
+    hot_reload.RELOADED_CLASS_TYPES.clear()
+
+
+def test_set_prompt_waits_for_a_swap_in_progress(hot_reload):
+    hot_reload.monkeypatch()
+    caching = sys.modules["comfy_execution.caching"]
+    cache = caching.HierarchicalCache(caching.CacheKeySet)
+    keys = {"1": frozenset({("class_type", "Other")})}
+    cache.set_prompt(keys, ["1"], {})
+    cache._set_immediate("1", "output")
+
+    done = threading.Event()
+    with hot_reload.REGISTRY_LOCK:
+        hot_reload.RELOADED_CLASS_TYPES["Other"] = 1
+        thread = threading.Thread(target=lambda: (cache.set_prompt(keys, ["1"], {}), done.set()))
+        thread.start()
+        assert not done.wait(0.2)
+    thread.join(5)
+    assert done.is_set()
+    assert cache.cache == {}
+    assert hot_reload.RELOADED_CLASS_TYPES == {}
+
+
+def test_class_types_in_nested_keys(hot_reload):
+    key = frozenset({("class_type", "Other"), ("inputs", (("image", ("Loader", 0)), ("seed", 5)))})
+    assert hot_reload.class_types_in(key, [{"Other": object}, {"Loader": object}]) == {"Other", "Loader"}
+    assert hot_reload.class_types_in(key, []) == {"class_type", "Other", "inputs", "image", "Loader", "seed"}
+
+
+def test_cache_key_index_pops_and_prunes(hot_reload):
+    index = hot_reload.CacheKeyIndex()
+    index.add("k1", {"A", "B"})
+    index.add("k2", {"B"})
+    index.add("k2", {"B"})
+    assert index.size == 3
+    index.prune({"k2"})
+    assert dict(index.keys) == {"B": {"k2"}}
+    assert index.prune_at == 2 + hot_reload.INDEX_SLACK
+    assert index.pop(["A", "B"]) == {"k2"}
+    assert index.size == 0 and not index.keys
+
+
+def test_set_prompt_clears_only_the_entries_of_reloaded_classes(hot_reload):
+    caching = sys.modules["comfy_execution.caching"]
+    cache = caching.HierarchicalCache(caching.CacheKeySet)
+    keys = {"1": frozenset({("class_type", "Other")}), "2": frozenset({("class_type", "Kept")})}
+    cache.set_prompt(keys, ["1", "2"], {})
+    # Stored before the patch, indexed when the index is built
+    cache._set_immediate("1", "other output")
+    hot_reload.monkeypatch()
+    sys.modules["nodes"].NODE_CLASS_MAPPINGS["Kept"] = object
+    cache._set_immediate("2", "kept output")
+
+    hot_reload.RELOADED_CLASS_TYPES["Other"] = 1
+    cache.set_prompt(keys, ["1", "2"], {})
+    assert cache.cache == {keys["2"]: "kept output"}
+    assert hot_reload.RELOADED_CLASS_TYPES == {}
+    assert dict(cache._reload_index.keys) == {"Kept": {keys["2"]}}
+
+
+def test_reload_module_reloads_the_files_of_a_module(hot_reload, extension, tmp_path):
+    write(tmp_path / "user" / "base.py", "VALUE = 3\n")
+    assert hot_reload.reloadModule("ext.user.base")
+    assert sys.modules["ext.user.node"].VALUE == 3
+    assert hot_reload.reloadModule("ext.user")
+    assert not hot_reload.reloadModule("ext.missing")
+    hot_reload.RELOADED_CLASS_TYPES.clear()
+
+
+def test_reload_module_needs_the_watcher(hot_reload):
+    assert hot_reload.reloadModule("ext.user.base") is False
@@ -0,0 +1,183 @@
+"""Tests for fluxagent/utils/LLMClient.py and fluxagent/utils/HttpClient.py against the mock server."""
+
+import time
+import socket
+import asyncio
+
+import pytest
+
+from fluxagent.utils import Metrics
+from fluxagent.utils import RateLimiter as rate_limiter
+from fluxagent.utils.HttpClient import HttpClient, HttpClientError, close_async_sessions, get_async_session
+from fluxagent.utils.LLMClient import (
+    SSE_DONE, LLMError, async_chat_completion, async_stream_chat_completion, chat_completion, extract_content,
+    parse_sse_line, request_key, stream_chat_completion,
+)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Fresh retry policy and circuit breakers, no retries."""
+    monkeypatch.setenv("FLUXAGENT_LLM_MAX_RETRIES", "0")
+    monkeypatch.setattr(rate_limiter, "_retry_policy", None)
+    monkeypatch.setattr(rate_limiter, "_breakers", {})
+
+
+def chat_url(server):
+    return f"{server.url}/chat/completions"
+
+
+def payload(text, **extra):
+    return dict({"model": "test-model", "messages": [{"role": "user", "content": text}]}, **extra)
+
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1/chat/completions"
+
+
+def requests_total(outcome, caller):
+    return Metrics.LLM_REQUESTS._values.get(("test-model", caller, outcome), 0)
+
+
+def test_request_key_ignores_the_stream_flag():
+    assert request_key(payload("hi")) == request_key(payload("hi", stream=True))
+    assert request_key(payload("hi")) != request_key(payload("hi", temperature=0.5))
+    assert request_key(payload("hi"), "http://a/v1") != request_key(payload("hi"), "http://b/v1")
+
+
+def test_sse_lines():
+    assert parse_sse_line('data: {"choices": [{"delta": {"content": "Hi"}}]}') == "Hi"
+    assert parse_sse_line('data: {"choices": [{"delta": {"role": "assistant"}}]}') is None
+    assert parse_sse_line(": keep-alive") is None
+    assert parse_sse_line("data: [DONE]") is SSE_DONE
+    with pytest.raises(LLMError, match="Stream Error: overloaded") as error:
+        parse_sse_line('data: {"error": {"message": "overloaded"}}')
+    assert error.value.kind == "stream_error"
+
+
+def test_chat_completion_returns_the_response_and_counts_it(llm, mock_server):
+    before = requests_total("success", "test")
+    result = chat_completion("key", payload("Hello there"), chat_url(mock_server), caller="test")
+    assert extract_content(result).startswith("Echo: Hello there")
+    assert result["usage"]["prompt_tokens"] == 2
+    assert requests_total("success", "test") == before + 1
+    assert extract_content({"choices": []}) is None
+
+
+def test_http_errors_become_llm_errors(llm, mock_server):
+    before = requests_total("error", "test")
+    with pytest.raises(LLMError) as error:
+        chat_completion("key", payload("[mock:status=503]"), chat_url(mock_server), caller="test")
+    assert (error.value.status, error.value.kind, error.value.retryable) == (503, "http_5xx", True)
+    assert error.value.retry_after == 1.0
+    assert "Details: Injected error" in str(error.value)
+    assert requests_total("error", "test") == before + 1
+
+    with pytest.raises(LLMError) as error:
+        chat_completion("", payload("hi"), chat_url(mock_server))
+    assert (error.value.status, error.value.retryable) == (401, False)
+
+
+def test_connection_errors_are_retryable(llm):
+    with pytest.raises(LLMError) as error:
+        chat_completion("key", payload("hi"), closed_port_url())
+    assert (error.value.status, error.value.kind, error.value.retryable) == (None, "connection", True)
+
+
+def test_stream_yields_the_deltas_and_records_the_usage(llm, mock_server):
+    labels = ("test-model", "stream-test")
+    before = Metrics.LLM_COMPLETION_TOKENS._values.get(labels, 0)
+    deltas = list(stream_chat_completion("key", payload("Stream me"), chat_url(mock_server), caller="stream-test"))
+    assert len(deltas) == 20
+    assert "".join(deltas).startswith("Echo: Stream me lorem")
+    # The usage chunk is requested even though the payload did not ask for it
+    assert Metrics.LLM_COMPLETION_TOKENS._values[labels] == before + 20
+    assert requests_total("success", "stream-test") >= 1
+
+
+def test_stream_errors_before_the_first_delta_raise(llm, mock_server):
+    with pytest.raises(LLMError) as error:
+        next(stream_chat_completion("key", payload("[mock:status=500]"), chat_url(mock_server)))
+    assert error.value.status == 500
+
+
+def test_closing_a_stream_early_counts_as_cancelled(llm, mock_server):
+    before = requests_total("cancelled", "stream-close")
+    stream = stream_chat_completion("key", payload("Stop early"), chat_url(mock_server), caller="stream-close")
+    assert next(stream) == "Echo:"
+    stream.close()
+    assert requests_total("cancelled", "stream-close") == before + 1
+
+
+def run_async(coro_fn):
+    """Run a coroutine function on a new loop, closing the loop's aiohttp session afterwards."""
+    async def run():
+        try:
+            return await coro_fn()
+        finally:
+            await close_async_sessions()
+    return asyncio.run(run())
+
+
+def test_async_completion_and_stream(llm, mock_server):
+    async def run():
+        result = await async_chat_completion("key", payload("Async"), chat_url(mock_server))
+        deltas = [delta async for delta in async_stream_chat_completion("key", payload("Async stream"), chat_url(mock_server))]
+        with pytest.raises(LLMError) as error:
+            await async_chat_completion("key", payload("[mock:status=502]"), chat_url(mock_server))
+        return result, deltas, error.value
+
+    result, deltas, error = run_async(run)
+    assert extract_content(result).startswith("Echo: Async")
+    assert "".join(deltas).startswith("Echo: Async stream")
+    assert error.status == 502
+
+
+def test_cancelling_an_async_request_aborts_it(llm, mock_server):
+    before = requests_total("cancelled", "async-cancel")
+
+    async def run():
+        task = asyncio.ensure_future(async_chat_completion(
+            "key", payload("Slow [mock:latency=5]"), chat_url(mock_server), caller="async-cancel"))
+        await asyncio.sleep(0.2)
+        started = time.monotonic()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.monotonic() - started
+
+    assert run_async(run) < 1
+    assert requests_total("cancelled", "async-cancel") == before + 1
+
+
+def test_async_sessions_are_kept_per_loop():
+    async def session():
+        first = get_async_session()
+        assert get_async_session() is first
+        await close_async_sessions()
+        assert first.closed
+        return first
+
+    assert asyncio.run(session()) is not asyncio.run(session())
+
+
+def test_http_client_reads_or_streams_the_body(mock_server):
+    client = HttpClient()
+    headers = {"Authorization": "Bearer key"}
+    try:
+        response = client.post(chat_url(mock_server), headers, payload("plain"))
+        assert response.status_code == 200 and response.headers_at is not None
+        assert response.json()["choices"][0]["message"]["content"].startswith("Echo: plain ")
+
+        with client.post(chat_url(mock_server), headers, payload("streamed", stream=True), stream=True) as response:
+            lines = [line for line in response.iter_lines() if line]
+        assert lines[-1] == "data: [DONE]"
+        assert "".join(filter(None, (parse_sse_line(line) for line in lines[:-1]))).startswith("Echo: streamed ")
+
+        with pytest.raises(HttpClientError):
+            client.post(closed_port_url(), headers, payload("hi"))
+    finally:
+        client.close()
@@ -0,0 +1,215 @@
+"""Tests for fluxagent/utils/LLMProviders.py and the hedged requests of LLMClient."""
+
+import time
+import socket
+import asyncio
+
+import pytest
+
+from fluxagent.utils import Metrics
+from fluxagent.utils import LLMProviders
+from fluxagent.utils import RateLimiter as rate_limiter
+from fluxagent.utils.HttpClient import close_async_sessions
+from fluxagent.utils.LLMClient import async_routed_stream_chat_completion, routed_chat_completion
+from fluxagent.utils.LLMProviders import HedgePolicy, LatencyTracker, Provider, ProviderRegistry
+from mock_openai_server import MockConfig, register_mock_provider, start_mock_server
+
+
+def test_builtin_providers_and_config_overrides(monkeypatch):
+    monkeypatch.setenv("AZURE_KEY", "secret")
+    registry = ProviderRegistry({
+        "azure": {"base_url": "https://azure.example/v1/", "api_key_env": "AZURE_KEY", "models": {"gpt-4.1": "deploy"}},
+        "openai": {"hedge": "azure"},
+        "broken": {"api_key": "x"},
+    }, default="azure")
+    assert registry.names() == ["openai", "ollama", "llamacpp", "azure"]
+    assert "mock" not in registry.names()
+    assert registry.get("").name == "azure"
+    azure = registry.get("azure")
+    assert azure.chat_url == "https://azure.example/v1/chat/completions"
+    assert azure.api_key == "secret"
+    assert azure.prepare({"model": "gpt-4.1", "stream": True}) == {"model": "deploy", "stream": True}
+    assert [endpoint.name for endpoint in registry.endpoints(registry.get("openai"))] == ["openai", "azure"]
+    with pytest.raises(ValueError, match="Unknown LLM provider"):
+        registry.get("mock")
+
+
+def test_unknown_hedge_and_default_fall_back(capsys):
+    registry = ProviderRegistry({"openai": {"hedge": "nowhere"}}, default="nowhere")
+    assert registry.get("openai").hedge is None
+    assert registry.default == "openai"
+    assert "hedging disabled" in capsys.readouterr().out
+
+
+def test_malformed_provider_settings_are_skipped(monkeypatch, capsys):
+    config = {"openai": "https://elsewhere/v1", "broken": ["x"], "numeric": {"base_url": 5},
+              "good": {"base_url": "http://127.0.0.1:9000/v1"}}
+    registry = ProviderRegistry(config)
+    assert registry.names() == ["openai", "ollama", "llamacpp", "good"]
+    assert registry.get("openai").base_url == LLMProviders.OPENAI_BASE_URL
+    output = capsys.readouterr().out
+    assert output.count("Invalid settings for LLM provider") == 3
+
+    monkeypatch.setenv("FLUXAGENT_LLM_PROVIDERS", '["openai"]')
+    assert ProviderRegistry().names() == ["openai", "ollama", "llamacpp"]
+    assert "not a JSON object" in capsys.readouterr().out
+
+
+def test_missing_api_key_is_reported(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(ValueError, match="OPENAI_API_KEY"):
+        ProviderRegistry({}).get("openai").check_api_key()
+    ProviderRegistry({}).get("ollama").check_api_key()
+
+
+def test_register_adds_or_replaces_providers():
+    registry = ProviderRegistry({})
+    registry.register(Provider("local", "http://127.0.0.1:9000/v1", hedge="ollama"))
+    assert registry.endpoints(registry.get("local"))[1].name == "ollama"
+    registry.register(Provider("ollama", "http://127.0.0.1:9999/v1"))
+    assert registry.get("ollama").base_url == "http://127.0.0.1:9999/v1"
+    with pytest.raises(ValueError, match="Unknown hedge"):
+        registry.register(Provider("other", "http://127.0.0.1:9001/v1", hedge="missing"))
+
+
+def test_mock_server_registers_as_a_provider(monkeypatch, mock_server):
+    monkeypatch.setattr(LLMProviders, "_registry", ProviderRegistry({}))
+    provider = register_mock_provider(mock_server)
+    assert LLMProviders.get_provider_registry().get("mock") is provider
+    assert provider.chat_url == f"{mock_server.url}/chat/completions"
+    provider.check_api_key()
+
+
+def test_latency_percentiles_need_enough_recent_samples(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(LLMProviders.time, "monotonic", lambda: now[0])
+    tracker = LatencyTracker(window=10, max_age=60, min_samples=3)
+    for seconds in (0.1, 0.2):
+        tracker.record("url", False, seconds)
+    assert tracker.percentile("url", False, 95) is None
+    for seconds in (0.3, 0.4, 1.0):
+        tracker.record("url", False, seconds)
+    assert tracker.percentile("url", False, 50) == 0.3
+    assert tracker.percentile("url", False, 95) == 1.0
+    assert tracker.percentile("url", True, 95) is None
+    assert tracker.snapshot(95) == {("url", "plain"): 1.0}
+
+    now[0] += 61
+    assert tracker.percentile("url", False, 95) is None
+
+
+def test_latency_window_keeps_the_latest_samples():
+    tracker = LatencyTracker(window=3, min_samples=1)
+    for seconds in (5.0, 1.0, 2.0, 3.0):
+        tracker.record("url", True, seconds)
+    assert tracker.percentile("url", True, 100) == 3.0
+
+
+def test_hedge_policy_orders_by_latency_and_picks_the_delay():
+    registry = ProviderRegistry({"openai": {"hedge": "ollama"}})
+    endpoints = registry.endpoints(registry.get("openai"))
+    tracker = LatencyTracker(min_samples=2)
+    policy = HedgePolicy(tracker, percentile=95, default_delay=10, min_delay=0.25)
+
+    ordered, delay = policy.plan(endpoints, streamed=False)
+    assert [endpoint.name for endpoint in ordered] == ["openai", "ollama"] and delay == 10
+
+    for _ in range(2):
+        tracker.record(endpoints[0].chat_url, False, 3.0)
+        tracker.record(endpoints[1].chat_url, False, 0.1)
+    ordered, delay = policy.plan(endpoints, streamed=False)
+    assert [endpoint.name for endpoint in ordered] == ["ollama", "openai"]
+    assert delay == 0.25
+
+    ordered, delay = policy.plan(endpoints[:1], streamed=False)
+    assert delay == 3.0
+    # Streams are tracked apart from plain requests
+    assert policy.plan(endpoints, streamed=True)[1] == 10
+
+
+@pytest.fixture
+def slow_server():
+    server = start_mock_server(MockConfig(latency=1.0, tokens=20))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    """An empty registry, and a hedge policy that hedges after 0.1 s."""
+    monkeypatch.setenv("FLUXAGENT_LLM_MAX_RETRIES", "0")
+    monkeypatch.setattr(rate_limiter, "_retry_policy", None)
+    monkeypatch.setattr(rate_limiter, "_breakers", {})
+    registry = ProviderRegistry({})
+    tracker = LatencyTracker(min_samples=100)
+    monkeypatch.setattr(LLMProviders, "_registry", registry)
+    monkeypatch.setattr(LLMProviders, "_tracker", tracker)
+    monkeypatch.setattr(LLMProviders, "_policy", HedgePolicy(tracker, default_delay=0.1, min_delay=0.05))
+    return registry
+
+
+def add_hedged_pair(registry, primary_url, hedge_url):
+    """Providers "primary" and "hedge"; the model name in a response tells which one answered."""
+    registry.register(Provider("hedge", hedge_url, api_key="mock", models={"test-model": "hedge-model"}))
+    registry.register(Provider("primary", primary_url, api_key="mock", models={"test-model": "primary-model"},
+                               hedge="hedge"))
+    return registry.get("primary")
+
+
+def hedges(winner):
+    return Metrics.LLM_HEDGES._values.get(("primary", winner), 0)
+
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def payload(text):
+    return {"model": "test-model", "messages": [{"role": "user", "content": text}]}
+
+
+def test_slow_primary_is_hedged(hedging, mock_server, slow_server):
+    primary = add_hedged_pair(hedging, slow_server.url, mock_server.url)
+    won = hedges("hedge")
+    started = time.monotonic()
+    response = routed_chat_completion("primary", payload("hedge me"), caller="test")
+    assert time.monotonic() - started < 0.9
+    assert response["model"] == "hedge-model"
+    assert hedges("hedge") == won + 1
+    # The losing primary took at least as long as the hedge wait
+    assert LLMProviders.get_latency_tracker()._samples[(primary.chat_url, False)][-1][1] >= 0.1
+
+
+def test_fast_primary_is_not_hedged(hedging, mock_server, slow_server):
+    add_hedged_pair(hedging, mock_server.url, slow_server.url)
+    answered = slow_server.stats[200]
+    response = routed_chat_completion("primary", payload("no hedge"), caller="test")
+    assert response["model"] == "primary-model"
+    time.sleep(0.2)
+    assert slow_server.stats[200] == answered
+
+
+def test_failed_primary_fails_over_at_once(hedging, monkeypatch, mock_server):
+    monkeypatch.setattr(LLMProviders._policy, "default_delay", 10)
+    add_hedged_pair(hedging, closed_port_url(), mock_server.url)
+    started = time.monotonic()
+    assert routed_chat_completion("primary", payload("fail over"), caller="test")["model"] == "hedge-model"
+    assert time.monotonic() - started < 5
+
+
+def test_slow_stream_is_hedged(hedging, mock_server, slow_server):
+    add_hedged_pair(hedging, slow_server.url, mock_server.url)
+
+    async def collect():
+        try:
+            return "".join([delta async for delta in async_routed_stream_chat_completion("primary", payload("stream"))])
+        finally:
+            await close_async_sessions()
+
+    started = time.monotonic()
+    assert asyncio.run(collect()).startswith("Echo: stream")
+    assert time.monotonic() - started < 0.9
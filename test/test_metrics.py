@@ -0,0 +1,95 @@
+"""Tests for fluxagent/utils/Metrics.py."""
+
+from fluxagent.utils import Metrics
+from fluxagent.utils.Metrics import Counter, Gauge, Histogram, Registry, RequestTimer, record_cache_lookup
+
+
+def test_counter_renders_labelled_samples_sorted_and_escaped():
+    counter = Counter("requests_total", "Requests.", ("model", "outcome"))
+    counter.inc(model="b", outcome="ok")
+    counter.inc(2.5, model="a", outcome='say "hi"\n')
+    counter.inc(model="b", outcome="ok")
+    assert counter.render() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{model="a",outcome="say \\"hi\\"\\n"} 2.5',
+        'requests_total{model="b",outcome="ok"} 2',
+    ]
+
+
+def test_gauge_is_set_directly_or_read_from_a_function():
+    gauge = Gauge("in_flight", "In flight.")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.render()[-1] == "in_flight 1"
+    gauge.set(0.5)
+    assert gauge.render()[-1] == "in_flight 0.5"
+
+    gauge = Gauge("latency", "Latency.", ("endpoint",), function=lambda: {("http://a",): 1.25})
+    assert gauge.render()[-1] == 'latency{endpoint="http://a"} 1.25'
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("duration_seconds", "Duration.", ("model",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, model="m")
+    assert histogram.render()[2:] == [
+        'duration_seconds_bucket{model="m",le="0.1"} 2',
+        'duration_seconds_bucket{model="m",le="1"} 3',
+        'duration_seconds_bucket{model="m",le="+Inf"} 4',
+        'duration_seconds_sum{model="m"} 3.65',
+        'duration_seconds_count{model="m"} 4',
+    ]
+
+
+def test_registry_renders_every_metric_in_order():
+    registry = Registry()
+    registry.register(Counter("b_total", "B."))
+    registry.register(Counter("a_total", "A.")).inc()
+    assert registry.render() == "# HELP b_total B.\n# TYPE b_total counter\n# HELP a_total A.\n# TYPE a_total counter\na_total 1\n"
+
+
+def value(metric, *labels):
+    return metric._values.get(tuple(labels), 0)
+
+
+def test_request_timer_records_only_the_first_outcome():
+    timer = RequestTimer("timer-model", "test")
+    assert value(Metrics.LLM_IN_FLIGHT, "timer-model", "test") == 1
+    timer.first_byte()
+    timer.success({"prompt_tokens": 7, "completion_tokens": 3})
+    timer.failure("http_5xx")
+    timer.cancelled()
+
+    assert value(Metrics.LLM_IN_FLIGHT, "timer-model", "test") == 0
+    assert value(Metrics.LLM_REQUESTS, "timer-model", "test", "success") == 1
+    assert value(Metrics.LLM_REQUESTS, "timer-model", "test", "error") == 0
+    assert value(Metrics.LLM_ERRORS, "timer-model", "test", "http_5xx") == 0
+    assert value(Metrics.LLM_PROMPT_TOKENS, "timer-model", "test") == 7
+    assert value(Metrics.LLM_COMPLETION_TOKENS, "timer-model", "test") == 3
+    assert sum(value(Metrics.LLM_TTFB, "timer-model", "test")[0]) == 1
+    assert sum(value(Metrics.LLM_DURATION, "timer-model", "test")[0]) == 1
+
+
+def test_request_timer_retries_and_failures():
+    timer = RequestTimer(None, "test")
+    timer.first_byte(at=timer.started + 1)
+    timer.retried()
+    assert timer.ttfb is None
+    timer.failure("http_429")
+
+    assert value(Metrics.LLM_RETRIES, "unknown", "test") >= 1
+    assert value(Metrics.LLM_ERRORS, "unknown", "test", "http_429") >= 1
+    # No first byte in the attempt that failed, so no time to first byte sample
+    assert value(Metrics.LLM_TTFB, "unknown", "test") == 0
+
+
+def test_cache_lookups_and_the_exposition():
+    record_cache_lookup("cache-model", "node", True)
+    record_cache_lookup("cache-model", "node", False)
+    record_cache_lookup("cache-model", "node", False)
+    text = Metrics.render()
+    assert 'fluxagent_llm_cache_lookups_total{model="cache-model",caller="node",result="hit"} 1' in text
+    assert 'fluxagent_llm_cache_lookups_total{model="cache-model",caller="node",result="miss"} 2' in text
+    assert text.endswith("\n")
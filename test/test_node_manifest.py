@@ -0,0 +1,116 @@
+"""Tests for fluxagent/utils/NodeManifest.py."""
+
+import os
+import sys
+
+import pytest
+
+from fluxagent.utils.NodeManifest import NodeManifest, import_node_file, make_lazy_node
+
+NODE_SOURCE = '''
+IMPORTS = globals().setdefault("IMPORTS", 0) + 1
+
+class EchoNode:
+    RETURN_TYPES = ("STRING",)
+    FUNCTION = "run"
+    CATEGORY = "tests"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"text": ("STRING", {"default": "hi"}), "mode": (["a", "b"],)}}
+
+    @classmethod
+    def IS_CHANGED(cls, text=""):
+        return text.upper()
+
+    def run(self, text, mode):
+        return (text,)
+
+NODE_CLASS_MAPPINGS = {"Test.Echo": EchoNode}
+NODE_DISPLAY_NAME_MAPPINGS = {"Test.Echo": "Echo"}
+'''
+
+
+@pytest.fixture
+def node_file(tmp_path):
+    path = tmp_path / "user" / "echo_node.py"
+    path.parent.mkdir()
+    path.write_text(NODE_SOURCE, encoding="utf-8")
+    yield str(path)
+    sys.modules.pop("ext_test.user.echo_node", None)
+
+
+def recorded(tmp_path, node_file):
+    manifest = NodeManifest(str(tmp_path / ".cache" / "manifest.json"))
+    module = import_node_file("ext_test.user.echo_node", node_file)
+    manifest.record("user/echo_node.py", node_file, module)
+    manifest.save(keep=["user/echo_node.py"])
+    sys.modules.pop("ext_test.user.echo_node")
+    return NodeManifest(manifest.path)
+
+
+def test_unchanged_files_are_found_and_changed_ones_are_not(tmp_path, node_file):
+    manifest = recorded(tmp_path, node_file)
+    entry = manifest.lookup("user/echo_node.py", node_file)
+    assert entry["lazy"] and list(entry["nodes"]) == ["Test.Echo"]
+    assert entry["display_names"] == {"Test.Echo": "Echo"}
+
+    # Only the timestamp moved: still valid, by content hash
+    os.utime(node_file, ns=(0, 10 ** 9))
+    assert manifest.lookup("user/echo_node.py", node_file) is entry
+
+    with open(node_file, "a", encoding="utf-8") as f:
+        f.write("# changed\n")
+    assert manifest.lookup("user/echo_node.py", node_file) is None
+    assert manifest.lookup("user/other.py", node_file) is None
+
+
+def test_lazy_node_describes_the_class_and_imports_on_first_use(tmp_path, node_file):
+    entry = recorded(tmp_path, node_file).lookup("user/echo_node.py", node_file)
+    proxy = make_lazy_node("Test.Echo", entry["nodes"]["Test.Echo"], "ext_test.user.echo_node", node_file)
+
+    assert proxy.__name__ == "EchoNode" and proxy.__module__ == "ext_test.user.echo_node"
+    assert proxy.RETURN_TYPES == ("STRING",) and proxy.CATEGORY == "tests"
+    # Tuples and lists survive the JSON round trip, ComfyUI tells combos by them
+    assert proxy.INPUT_TYPES() == {"required": {"text": ("STRING", {"default": "hi"}), "mode": (["a", "b"],)}}
+    assert "ext_test.user.echo_node" not in sys.modules
+
+    assert proxy.IS_CHANGED(text="x") == "X"
+    node = proxy()
+    assert type(node).__name__ == "EchoNode" and not isinstance(node, proxy)
+    assert node.run("text", "a") == ("text",)
+    proxy()
+    assert sys.modules["ext_test.user.echo_node"].IMPORTS == 1
+
+
+def test_nodes_with_unserializable_metadata_are_not_lazy(tmp_path):
+    path = tmp_path / "any_node.py"
+    path.write_text(
+        "class Any(str):\n    pass\n\n"
+        "class AnyNode:\n    RETURN_TYPES = (Any('*'),)\n\n"
+        "    @classmethod\n    def INPUT_TYPES(cls):\n        return {}\n\n"
+        "NODE_CLASS_MAPPINGS = {'Test.Any': AnyNode}\n", encoding="utf-8")
+    module = import_node_file("ext_test.any_node", str(path))
+    try:
+        entry = NodeManifest(str(tmp_path / "manifest.json")).record("any_node.py", str(path), module)
+    finally:
+        sys.modules.pop("ext_test.any_node", None)
+    assert entry["lazy"] is False and entry["nodes"] == {}
+
+
+def test_save_drops_missing_files_and_ignores_other_versions(tmp_path, node_file):
+    manifest = recorded(tmp_path, node_file)
+    manifest.save(keep=[])
+    assert NodeManifest(manifest.path).entries == {}
+
+    with open(manifest.path, "w", encoding="utf-8") as f:
+        f.write('{"version": 0, "files": {"user/echo_node.py": {}}}')
+    assert NodeManifest(manifest.path).entries == {}
+
+
+def test_failed_imports_leave_no_module_behind(tmp_path):
+    path = tmp_path / "broken.py"
+    path.write_text("raise ValueError('broken')\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        import_node_file("ext_test.broken", str(path))
+    assert "ext_test.broken" not in sys.modules
@@ -0,0 +1,151 @@
+"""Tests for fluxagent/utils/NodeRunner.py and the interruptible OpenAIChatnNode, with comfy modules from comfy_stubs.py."""
+
+import time
+import types
+import asyncio
+import threading
+
+import pytest
+
+import comfy_stubs
+from fluxagent.OpenaiChatNode import OpenAIChatnNode
+from fluxagent.utils import LLMProviders
+from fluxagent.utils import NodeRunner as node_runner
+from fluxagent.utils import RateLimiter as rate_limiter
+from fluxagent.utils.NodeRunner import BackgroundLoop, RequestProgress, run_interruptible
+from mock_openai_server import register_mock_provider
+
+
+class ProgressServer:
+    def __init__(self):
+        self.texts = []
+
+    def send_progress_text(self, text, node_id):
+        self.texts.append((node_id, text))
+
+
+@pytest.fixture
+def loop(monkeypatch):
+    """A fresh node loop, polled every 10 ms."""
+    loop = BackgroundLoop("TestNodeLoop")
+    monkeypatch.setattr(node_runner, "_loop", loop)
+    monkeypatch.setattr(node_runner, "POLL_INTERVAL", 0.01)
+    yield loop
+    loop.stop()
+
+
+@pytest.fixture
+def comfy(monkeypatch, loop):
+    """The comfy stand-ins, and a server whose PromptServer takes progress texts."""
+    modules = comfy_stubs.comfy_modules()
+    server = types.SimpleNamespace(PromptServer=types.SimpleNamespace(instance=ProgressServer()))
+    monkeypatch.setattr(node_runner, "_comfy_modules", {
+        "comfy.model_management": modules["comfy.model_management"],
+        "comfy.utils": modules["comfy.utils"],
+        "server": server,
+    })
+    return types.SimpleNamespace(model_management=modules["comfy.model_management"],
+                                 server=server.PromptServer.instance)
+
+
+def interrupt_after(model_management, seconds):
+    timer = threading.Timer(seconds, model_management.interrupt_processing)
+    timer.start()
+    return timer
+
+
+def test_runs_without_comfy(monkeypatch, loop):
+    monkeypatch.setattr(node_runner, "_comfy_modules", {"comfy.model_management": None, "comfy.utils": None})
+
+    async def answer():
+        await asyncio.sleep(0.05)
+        return threading.current_thread().name
+
+    assert run_interruptible(answer(), RequestProgress("1")) == "TestNodeLoop"
+
+
+def test_interrupt_cancels_the_coroutine(comfy):
+    cancelled = threading.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    interrupt_after(comfy.model_management, 0.1)
+    started = time.monotonic()
+    with pytest.raises(comfy.model_management.InterruptProcessingException):
+        run_interruptible(slow())
+    assert time.monotonic() - started < 2
+    assert cancelled.wait(2)
+
+
+def test_errors_of_the_coroutine_are_raised(comfy):
+    async def failing():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError, match="bad request"):
+        run_interruptible(failing())
+
+
+def test_progress_is_reported_while_waiting(comfy):
+    progress = RequestProgress("5", total=4)
+
+    async def streaming():
+        for _ in range(10):
+            progress.tokens += 1
+            await asyncio.sleep(0.03)
+        return "done"
+
+    assert run_interruptible(streaming(), progress) == "done"
+    updates = progress._bar.updates
+    assert [tokens for tokens, _ in updates] == sorted({tokens for tokens, _ in updates})
+    assert all(tokens < total for tokens, total in updates)
+    assert progress.total == 16
+    texts = [text for node_id, text in comfy.server.texts if node_id == "5"]
+    assert texts and all(text.endswith("s") for text in texts)
+    assert any("tokens" in text for text in texts)
+
+
+def test_progress_text_before_the_first_token():
+    progress = RequestProgress()
+    assert progress.text().startswith("Waiting for the response")
+    progress.tokens = 3
+    assert progress.text().startswith("3 tokens")
+
+
+def test_stopped_loop_starts_again_on_the_next_request(loop):
+    async def name():
+        return threading.current_thread().name
+
+    assert loop.submit(name()).result(5) == "TestNodeLoop"
+    thread = loop._thread
+    loop.stop()
+    assert loop.loop is None and not thread.is_alive()
+    assert loop.submit(name()).result(5) == "TestNodeLoop"
+
+
+@pytest.fixture
+def chat_node(monkeypatch, mock_server, comfy):
+    monkeypatch.setenv("FLUXAGENT_LLM_MAX_RETRIES", "0")
+    monkeypatch.setattr(rate_limiter, "_retry_policy", None)
+    monkeypatch.setattr(rate_limiter, "_breakers", {})
+    monkeypatch.setattr(LLMProviders, "_registry", LLMProviders.ProviderRegistry({}))
+    register_mock_provider(mock_server)
+    return OpenAIChatnNode()
+
+
+def test_chat_node_reports_progress_while_it_waits(chat_node, comfy):
+    (response,) = chat_node.chat_completion("test-model", "[mock:latency=0.2] hello node", provider="mock", node_id="8")
+    assert response.startswith("Echo: hello node")
+    assert ("8", "Waiting for the response, 0s") in comfy.server.texts
+
+
+def test_chat_node_stops_on_interrupt(chat_node, comfy):
+    interrupt_after(comfy.model_management, 0.1)
+    started = time.monotonic()
+    with pytest.raises(comfy.model_management.InterruptProcessingException):
+        chat_node.chat_completion("test-model", "[mock:latency=5] slow", provider="mock")
+    assert time.monotonic() - started < 2
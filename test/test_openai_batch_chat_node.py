@@ -0,0 +1,81 @@
+"""Tests for fluxagent/OpenaiBatchChatNode.py against the mock server."""
+
+import pytest
+
+from fluxagent.OpenaiBatchChatNode import OpenAIBatchChatNode
+from fluxagent.utils import LLMProviders
+from fluxagent.utils import RateLimiter as rate_limiter
+from fluxagent.utils import ResponseCache as response_cache
+from mock_openai_server import register_mock_provider
+
+
+@pytest.fixture
+def node(monkeypatch, mock_server, tmp_path):
+    """The node with the mock server as its only reachable provider and a fresh response cache."""
+    monkeypatch.setenv("FLUXAGENT_LLM_MAX_RETRIES", "0")
+    monkeypatch.setenv("FLUXAGENT_LLM_CACHE_DISK_ENTRIES", "0")
+    monkeypatch.setattr(rate_limiter, "_retry_policy", None)
+    monkeypatch.setattr(rate_limiter, "_breakers", {})
+    monkeypatch.setattr(LLMProviders, "_registry", LLMProviders.ProviderRegistry({}))
+    monkeypatch.setattr(response_cache, "_cache", response_cache.ResponseCache(str(tmp_path)))
+    register_mock_provider(mock_server)
+    return OpenAIBatchChatNode()
+
+
+def run(node, user, split="lines", concurrency=4, system=None, cache="False"):
+    return node.batch_chat_completion(
+        ["test-model"], user, [split], [concurrency], system=[system] if system else None,
+        cache=[cache], provider=["mock"])
+
+
+def test_split_messages():
+    split = OpenAIBatchChatNode.split_messages
+    assert split(["a\n\n b \n"], "lines") == [("a", None, None), (" b ", None, None)]
+    assert split(["a\nb", "c"], "none") == [("a\nb", None, None), ("c", None, None)]
+    items = split(['"plain"\n{"user": "u", "system": "s"}\n{"content": "c"}\nnot json'], "jsonl")
+    assert items[:3] == [("plain", None, None), ("u", "s", None), ("c", None, None)]
+    assert items[3][0] is None and items[3][2].startswith("Error: Invalid JSONL line")
+
+
+def test_responses_come_back_in_input_order(node):
+    messages = [f"[mock:latency={0.05 * (5 - i)}] item {i}" for i in range(5)]
+    responses, errors = run(node, ["\n".join(messages)])
+    assert [response.split()[:3] for response in responses] == [["Echo:", "item", str(i)] for i in range(5)]
+    assert errors == [""] * 5
+
+
+def test_item_errors_do_not_fail_the_batch(node):
+    user = '{"user": "fine"}\n{"user": "[mock:status=400] bad"}\nnot json\n{"system": "only"}'
+    responses, errors = run(node, [user], split="jsonl")
+    assert responses[0].startswith("Echo: fine")
+    assert responses[1:] == ["", "", ""]
+    assert errors[0] == ""
+    assert "400" in errors[1]
+    assert errors[2].startswith("Error: Invalid JSONL line")
+    assert errors[3] == "Error: User message is empty!"
+
+
+def test_empty_batch_is_an_error(node):
+    with pytest.raises(ValueError, match="empty"):
+        run(node, ["\n  \n"])
+
+
+def test_cached_items_skip_the_server(node, mock_server):
+    first, _ = run(node, ["cached one\ncached two"], cache="True")
+    answered = mock_server.stats[200]
+    second, errors = run(node, ["cached one\ncached two"], cache="True")
+    assert second == first and errors == ["", ""]
+    assert mock_server.stats[200] == answered
+
+    run(node, ["cached one"], system="other system", cache="True")
+    assert mock_server.stats[200] == answered + 1
+
+
+def test_non_string_jsonl_fields_are_item_errors(node):
+    user = '{"user": "fine"}\n{"user": 5}\n{"user": ["a"]}\n{"user": "ok", "system": {"x": 1}}\n7'
+    responses, errors = run(node, [user], split="jsonl")
+    assert responses[0].startswith("Echo: fine")
+    assert errors[1:4] == ['Error: JSONL "user" and "system" must be strings'] * 3
+    assert responses[1:4] == ["", "", ""]
+    # A bare JSON value is the message itself
+    assert responses[4].startswith("Echo: 7") and errors[4] == ""
@@ -0,0 +1,93 @@
+"""Tests for fluxagent/utils/RateLimiter.py."""
+
+import time
+from email.utils import formatdate
+
+import pytest
+
+from fluxagent.utils.LLMClient import LLMError, _error_from_body
+from fluxagent.utils.RateLimiter import CircuitBreaker, RateLimiter, RetryPolicy, TokenBucket, parse_retry_after
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    monkeypatch.setenv("FLUXAGENT_LLM_MAX_RETRIES", "3")
+    monkeypatch.setenv("FLUXAGENT_LLM_RETRY_BASE_DELAY", "1")
+    monkeypatch.setenv("FLUXAGENT_LLM_RETRY_MAX_DELAY", "10")
+    return RetryPolicy()
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after({}) is None
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"retry-after": "7"}) == 7.0
+    assert parse_retry_after({"retry-after": "-3"}) == 0.0
+    assert parse_retry_after({"retry-after": "soon"}) is None
+    http_date = parse_retry_after({"retry-after": formatdate(time.time() + 30, usegmt=True)})
+    assert 28 <= http_date <= 30
+
+
+def test_delay_honours_retry_after_below_the_cap(policy):
+    assert policy.delay(0, retry_after=8) == 8
+    for attempt in range(10):
+        assert 8 <= policy.delay(attempt, retry_after=8) <= policy.max_delay
+
+
+def test_delay_is_capped_at_max_delay(policy):
+    for attempt in range(10):
+        assert 0 <= policy.delay(attempt) <= policy.max_delay
+        assert policy.delay(attempt, retry_after=25) == policy.max_delay
+
+
+def test_should_retry(policy):
+    assert policy.should_retry(LLMError("busy", status=503), 0)
+    assert not policy.should_retry(LLMError("busy", status=503), 3)
+    assert not policy.should_retry(LLMError("bad request", status=400), 0)
+    assert policy.should_retry(LLMError("slow down", status=429, retry_after=10), 0)
+
+
+def test_retry_after_beyond_the_cap_fails_fast(policy):
+    error = _error_from_body(429, "", "http://example.invalid/v1/chat/completions", {"retry-after": "120"})
+    assert error.retry_after == 120
+    assert "Retry after: 120s" in str(error)
+    assert not policy.should_retry(error, 0)
+
+
+def test_token_bucket_reserve_and_adjust():
+    bucket = TokenBucket(60)  # one per second
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(2) == pytest.approx(2.0, abs=0.05)
+    bucket.adjust(2)
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_rate_limiter_uses_model_and_default_limits():
+    limiter = RateLimiter({"default": {"rpm": 60}, "fast": {"rpm": 6000}})
+    assert limiter.reserve("other", 10) == 0.0
+    for _ in range(59):
+        limiter.reserve("other", 10)
+    assert limiter.reserve("other", 10) > 0.5
+    assert limiter.reserve("fast", 10) == 0.0
+    assert RateLimiter({}).reserve("any", 10 ** 6) == 0.0
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.2)
+    breaker.record_failure(LLMError("down", status=503))
+    assert breaker.allow() is None
+    breaker.record_failure(LLMError("down", status=503))
+    assert breaker.allow() > 0
+    time.sleep(0.25)
+    # One trial request at a time once the cooldown is over
+    assert breaker.allow() is None
+    assert breaker.allow() > 0
+    breaker.record_success()
+    assert breaker.allow() is None
+
+
+def test_circuit_breaker_ignores_rate_limiting():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.record_failure(LLMError("slow down", status=429))
+    breaker.record_failure(LLMError("bad request", status=400))
+    assert breaker.allow() is None
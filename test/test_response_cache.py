@@ -0,0 +1,160 @@
+"""Tests for fluxagent/utils/ResponseCache.py and its use by OpenAIChatnNode."""
+
+import types
+
+import pytest
+
+from fluxagent.OpenaiChatNode import OpenAIChatnNode
+from fluxagent.utils import LLMProviders
+from fluxagent.utils import RateLimiter as rate_limiter
+from fluxagent.utils import ResponseCache as response_cache
+from fluxagent.utils.ResponseCache import DiskCache, MemoryCache, ResponseCache
+from mock_openai_server import register_mock_provider
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the module's time with a clock the test moves forward."""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(response_cache, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2, max_bytes=1000, ttl=60)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+
+def test_memory_cache_keeps_to_its_byte_budget():
+    cache = MemoryCache(max_entries=10, max_bytes=10, ttl=60)
+    cache.put("a", "x" * 4)
+    cache.put("b", "x" * 4)
+    cache.put("c", "x" * 4)
+    assert cache.get("a") is None
+    assert cache.size == 8
+
+    cache.put("b", "x")
+    assert cache.size == 5
+    cache.put("huge", "x" * 11)
+    assert cache.get("huge") is None and cache.size == 5
+
+    cache.clear()
+    assert cache.size == 0 and cache.get("c") is None
+
+
+def test_memory_cache_expires_entries(clock):
+    cache = MemoryCache(max_entries=10, max_bytes=1000, ttl=60)
+    cache.put("a", "1")
+    cache.put("b", "2", expires_at=clock.now + 10)
+    clock.now += 30
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    clock.now += 31
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_disk_cache_survives_reopening_and_expires(tmp_path, clock):
+    path = str(tmp_path / "cache" / "llm.sqlite3")
+    DiskCache(path, max_entries=10, ttl=60).put("a", "1")
+
+    reopened = DiskCache(path, max_entries=10, ttl=60)
+    assert reopened.get("a") == ("1", 1060.0)
+    assert reopened.get("b") is None
+    clock.now += 61
+    assert reopened.get("a") is None
+
+
+def test_disk_cache_prune_drops_expired_then_oldest(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(DiskCache, "PRUNE_EVERY", 4)
+    cache = DiskCache(str(tmp_path / "llm.sqlite3"), max_entries=2, ttl=60)
+    cache.put("expired", "0")
+    clock.now += 61
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.put(key, key)
+
+    keys = [row[0] for row in cache._conn.execute("SELECT key FROM responses ORDER BY key")]
+    assert keys == ["b", "c"]
+
+
+@pytest.fixture
+def cache_env(monkeypatch):
+    monkeypatch.setenv("FLUXAGENT_LLM_CACHE_TTL", "60")
+    monkeypatch.setenv("FLUXAGENT_LLM_CACHE_MAX_ENTRIES", "1")
+
+
+def test_disk_hits_are_promoted_with_their_remaining_lifetime(tmp_path, clock, cache_env):
+    cache = ResponseCache(str(tmp_path))
+    cache.put("a", "1")
+    cache.put("b", "2")
+    # "a" was pushed out of memory by "b", the disk still has it
+    assert cache.memory.get("a") is None
+    clock.now += 50
+    assert cache.get("a") == "1"
+    assert cache.memory.get("a") == "1"
+    clock.now += 11
+    assert cache.memory.get("a") is None
+    assert not cache.contains("a")
+
+    restarted = ResponseCache(str(tmp_path))
+    assert restarted.get("b") is None
+    assert restarted.contains("missing") is False
+    restarted.put("c", "3")
+    restarted.clear()
+    assert restarted.get("c") is None
+
+
+def test_disk_tier_can_be_disabled(tmp_path, cache_env, monkeypatch):
+    monkeypatch.setenv("FLUXAGENT_LLM_CACHE_DISK_ENTRIES", "0")
+    cache = ResponseCache(str(tmp_path))
+    assert cache.disk is None
+    cache.put("a", "1")
+    assert cache.get("a") == "1"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unusable_disk_tier_leaves_the_memory_tier(tmp_path, cache_env, capsys):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = ResponseCache(str(blocker / "cache"))
+    assert cache.disk is None
+    assert "disk cache disabled" in capsys.readouterr().out
+    cache.put("a", "1")
+    assert cache.get("a") == "1"
+
+
+@pytest.fixture
+def chat_node(monkeypatch, mock_server, tmp_path):
+    monkeypatch.setenv("FLUXAGENT_LLM_MAX_RETRIES", "0")
+    monkeypatch.setattr(rate_limiter, "_retry_policy", None)
+    monkeypatch.setattr(rate_limiter, "_breakers", {})
+    monkeypatch.setattr(LLMProviders, "_registry", LLMProviders.ProviderRegistry({}))
+    monkeypatch.setattr(response_cache, "_cache", ResponseCache(str(tmp_path)))
+    register_mock_provider(mock_server)
+    return OpenAIChatnNode()
+
+
+def test_is_changed_is_the_request_hash_with_the_cache_on(chat_node):
+    key = OpenAIChatnNode.IS_CHANGED("test-model", "hi", None, "True", "mock")
+    assert key and key == OpenAIChatnNode.IS_CHANGED("test-model", "hi", None, "True", "mock")
+    assert key != OpenAIChatnNode.IS_CHANGED("test-model", "hi", "be brief", "True", "mock")
+    assert key != OpenAIChatnNode.IS_CHANGED("test-model", "hi", None, "True", "")
+    assert OpenAIChatnNode.IS_CHANGED("test-model", "hi", None, "False", "mock") == ""
+    assert OpenAIChatnNode.IS_CHANGED("test-model", None, None, "True", "mock") == ""
+    assert OpenAIChatnNode.IS_CHANGED("test-model", "hi", None, "True", "missing") == ""
+
+
+def test_cached_requests_skip_the_server(chat_node, mock_server):
+    (first,) = chat_node.chat_completion("test-model", "cache this", cache="True", provider="mock")
+    answered = mock_server.stats[200]
+    assert chat_node.chat_completion("test-model", "cache this", cache="True", provider="mock") == (first,)
+    assert mock_server.stats[200] == answered
+
+    chat_node.chat_completion("test-model", "cache this", cache="False", provider="mock")
+    assert mock_server.stats[200] == answered + 1
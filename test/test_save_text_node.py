@@ -0,0 +1,74 @@
+"""Tests for fluxagent/SaveTextNode.py, writing to an output directory from comfy_stubs.py."""
+
+import sys
+import gzip
+import json
+import importlib
+
+import pytest
+
+import comfy_stubs
+from fluxagent.utils import FileWriter
+from fluxagent.utils.FileWriter import BufferedFileWriter
+
+
+@pytest.fixture
+def node(monkeypatch, tmp_path):
+    folder_paths = comfy_stubs.folder_paths_module(str(tmp_path))
+    monkeypatch.setitem(sys.modules, "folder_paths", folder_paths)
+    module = importlib.import_module("fluxagent.SaveTextNode")
+    monkeypatch.setattr(module, "folder_paths", folder_paths)
+    writer = BufferedFileWriter(flush_interval=60, flush_bytes=1024 * 1024, max_open_files=4)
+    monkeypatch.setattr(FileWriter, "_writer", writer)
+    yield module.SaveTextNode()
+    writer.close()
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_overwrite_and_append_in_a_subfolder(node, tmp_path, capsys):
+    output = tmp_path / "output" / "texts"
+    node.save_string("first", "out.txt", "False", subfolder="texts")
+    assert (output / "out.txt").read_text(encoding="utf-8") == "first"
+    assert "Successfully saved" in capsys.readouterr().out
+    node.save_string(" second", "out.txt", "True", subfolder="texts")
+    # Not written yet, only buffered
+    assert "Queued string to append" in capsys.readouterr().out
+    FileWriter.get_file_writer().flush()
+    assert (output / "out.txt").read_text(encoding="utf-8") == "first second"
+
+
+def test_jsonl_records_carry_the_node_and_metadata(node, tmp_path):
+    node.save_string("a\nb", "log.jsonl", "True", output_format="jsonl", metadata='{"run": 3}', node_id="7")
+    node.save_string("c", "log.jsonl", "True", output_format="jsonl", metadata="free text")
+    node.save_string("d", "log.jsonl", "True", output_format="jsonl")
+    FileWriter.get_file_writer().flush()
+
+    records = read_lines(tmp_path / "output" / "log.jsonl")
+    assert [record["text"] for record in records] == ["a\nb", "c", "d"]
+    assert records[0]["node_id"] == "7" and records[0]["run"] == 3
+    assert records[1]["metadata"] == "free text"
+    assert set(records[2]) == {"time", "node_id", "text"}
+
+
+def test_compressed_rotating_output(node, tmp_path):
+    for index in range(3):
+        node.save_string(str(index), "log.jsonl", "True", output_format="jsonl", compression="gzip", rotate_records=2)
+    FileWriter.get_file_writer().flush()
+
+    output = tmp_path / "output"
+    with gzip.open(output / "log.0001.jsonl.gz", "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["text"] for line in f] == ["0", "1"]
+    FileWriter.get_file_writer().close()
+    with gzip.open(output / "log.jsonl.gz", "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["text"] for line in f] == ["2"]
+
+
+def test_write_errors_are_reported_not_raised(node, tmp_path, capsys):
+    (tmp_path / "output").mkdir(parents=True, exist_ok=True)
+    (tmp_path / "output" / "blocker").write_text("")
+    assert node.save_string("text", "out.txt", "False", subfolder="blocker") == ()
+    assert "Error saving string to file" in capsys.readouterr().out
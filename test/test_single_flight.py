@@ -0,0 +1,186 @@
+"""Tests for fluxagent/utils/SingleFlight.py."""
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fluxagent.utils.SingleFlight import AsyncSingleFlight, SingleFlight, get_async_single_flight
+
+
+def test_identical_calls_share_one_run():
+    group = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(group.do, "key", fn)
+        started.wait(5)
+        followers = [executor.submit(group.do, "key", fn) for _ in range(3)]
+        while group._calls["key"].waiters < 3:
+            time.sleep(0.01)
+        release.set()
+        assert [f.result(5) for f in [leader] + followers] == ["result"] * 4
+    assert runs == [1]
+    assert group._calls == {}
+    # Nothing is kept after the call
+    assert group.do("key", lambda: "again") == "again"
+
+
+def test_waiters_get_the_error_of_the_shared_call():
+    group = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("upstream failed")
+
+    with ThreadPoolExecutor(2) as executor:
+        leader = executor.submit(group.do, "key", fn)
+        started.wait(5)
+        follower = executor.submit(group.do, "key", fn)
+        while group._calls["key"].waiters < 1:
+            time.sleep(0.01)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="upstream failed"):
+                future.result(5)
+
+
+def run_async(coro):
+    return asyncio.run(coro)
+
+
+def test_async_calls_share_one_task_and_survive_a_cancelled_caller():
+    async def main():
+        group = AsyncSingleFlight()
+        runs = []
+        release = asyncio.Event()
+
+        async def request():
+            runs.append(1)
+            await release.wait()
+            return "result"
+
+        first = asyncio.ensure_future(group.do("key", request))
+        second = asyncio.ensure_future(group.do("key", request))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await second == "result"
+        assert first.cancelled()
+        assert runs == [1]
+        assert group._calls == {}
+
+    run_async(main())
+
+
+def test_async_call_is_cancelled_when_every_caller_is_gone():
+    async def main():
+        group = AsyncSingleFlight()
+        cancelled = asyncio.Event()
+
+        async def request():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        caller = asyncio.ensure_future(group.do("key", request))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        assert group._calls == {}
+
+    run_async(main())
+
+
+def test_stream_joiners_replay_from_the_start():
+    async def main():
+        group = AsyncSingleFlight()
+        runs = []
+        step = asyncio.Event()
+
+        async def deltas():
+            runs.append(1)
+            yield "a"
+            yield "b"
+            await step.wait()
+            yield "c"
+
+        async def collect(stream):
+            return [delta async for delta in stream]
+
+        first = group.stream("key", deltas)
+        assert await first.__anext__() == "a"
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(collect(group.stream("key", deltas)))
+        await asyncio.sleep(0)
+        step.set()
+        assert ["a"] + await collect(first) == ["a", "b", "c"]
+        assert await second == ["a", "b", "c"]
+        assert runs == [1]
+        await asyncio.sleep(0)
+        assert group._streams == {}
+
+    run_async(main())
+
+
+def test_stream_errors_reach_every_subscriber():
+    async def main():
+        group = AsyncSingleFlight()
+
+        async def deltas():
+            yield "a"
+            raise RuntimeError("stream failed")
+
+        streams = [group.stream("key", deltas), group.stream("key", deltas)]
+        for stream in streams:
+            with pytest.raises(RuntimeError, match="stream failed"):
+                async for _ in stream:
+                    pass
+
+    run_async(main())
+
+
+def test_stream_is_cancelled_when_the_last_subscriber_leaves():
+    async def main():
+        group = AsyncSingleFlight()
+
+        async def deltas():
+            yield "a"
+            await asyncio.sleep(10)
+            yield "b"
+
+        stream = group.stream("key", deltas)
+        assert await stream.__anext__() == "a"
+        shared = group._streams["key"]
+        await stream.aclose()
+        with pytest.raises(asyncio.CancelledError):
+            await shared.task
+        assert group._streams == {}
+
+    run_async(main())
+
+
+def test_each_loop_has_its_own_group():
+    async def group():
+        return get_async_single_flight()
+
+    async def same():
+        return get_async_single_flight() is get_async_single_flight()
+
+    assert run_async(same())
+    assert run_async(group()) is not run_async(group())
@@ -0,0 +1,90 @@
+"""Tests for fluxagent/utils/StartupProfiler.py and fluxagent/utils/Precompile.py."""
+
+import os
+import sys
+import json
+
+import pytest
+
+from fluxagent.utils import StartupProfiler as startup_profiler
+from fluxagent.utils.Precompile import is_stale, precompile
+from fluxagent.utils.StartupProfiler import StartupProfiler
+
+
+@pytest.fixture
+def report_path(monkeypatch, tmp_path):
+    path = tmp_path / ".cache" / "startup_report.json"
+    monkeypatch.setattr(startup_profiler, "REPORT_PATH", str(path))
+    monkeypatch.setattr(startup_profiler, "LAST_REPORT", None)
+    return path
+
+
+def test_profiler_records_imports_failures_and_stages(report_path):
+    profiler = StartupProfiler(True)
+    with profiler.measure("user/slow.py", "import"):
+        data = [0] * 100000
+    with profiler.measure("user/cached.py", "lazy"):
+        pass
+    with pytest.raises(ValueError):
+        with profiler.measure("user/broken.py", "import"):
+            raise ValueError("broken")
+    profiler.record_stage("precompile", 0.5, compiled=3)
+    report = profiler.finish()
+    del data
+
+    assert (report["imported"], report["lazy"], report["failed"]) == (2, 1, 1)
+    assert report["stages"] == {"precompile": {"seconds": 0.5, "compiled": 3}}
+    by_file = {record["file"]: record for record in report["files"]}
+    assert by_file["user/broken.py"]["error"] == "ValueError: broken"
+    assert by_file["user/slow.py"]["memory_peak_bytes"] > 100000 * 4
+    assert json.loads(report_path.read_text(encoding="utf-8"))["failed"] == 1
+    assert startup_profiler.load_report() is report
+
+
+def test_disabled_profiler_records_nothing(report_path):
+    profiler = StartupProfiler(False)
+    with profiler.measure("user/node.py", "import"):
+        pass
+    profiler.record_stage("precompile", 1.0)
+    assert profiler.finish() is None
+    assert not report_path.exists()
+    assert startup_profiler.load_report() is None
+
+
+def write_sources(tmp_path, count):
+    paths = []
+    for index in range(count):
+        path = tmp_path / f"node_{index}.py"
+        path.write_text(f"VALUE = {index}\n", encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def test_precompile_compiles_only_stale_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    paths = write_sources(tmp_path, 3)
+    broken = tmp_path / "broken.py"
+    broken.write_text("def broken(:\n", encoding="utf-8")
+    assert all(is_stale(path) for path in paths)
+
+    result = precompile(paths + [str(broken)], workers=2)
+    assert result["compiled"] == 3
+    assert list(result["errors"]) == [str(broken)]
+    assert "SyntaxError" in result["errors"][str(broken)]
+    assert not any(is_stale(path) for path in paths)
+    assert precompile(paths, workers=2)["compiled"] == 0
+
+    with open(paths[0], "a", encoding="utf-8") as f:
+        f.write("OTHER = 1\n")
+    assert is_stale(paths[0])
+
+
+def test_precompile_skips_single_files_and_disabled_pools(tmp_path, monkeypatch):
+    paths = write_sources(tmp_path, 2)
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    assert precompile(paths[:1], workers=2)["compiled"] == 0
+    assert precompile(paths, workers=0)["compiled"] == 0
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    assert precompile(paths, workers=2)["compiled"] == 0
+    assert all(is_stale(path) for path in paths)
+    assert not os.path.exists(os.path.join(tmp_path, "__pycache__"))
@@ -0,0 +1,148 @@
+"""Tests for fluxagent/utils/TextDelta.py, the RichTextNode ui result and the text route."""
+
+import asyncio
+import importlib
+
+import pytest
+
+from fluxagent.utils.TextDelta import TextVersions, common_prefix, common_suffix, text_hash, utf16_length
+
+
+def apply(base: str, update: dict, current: str) -> str:
+    """Apply an update the way the widget does, in UTF-16 code units; slices come from current."""
+    if update["base"] is not None:
+        assert update["base"] == text_hash(base)
+        units = base.encode("utf-16-le")
+        start, end = 2 * update["start"], 2 * (update["start"] + update["delete"])
+    else:
+        units, start, end = b"", 0, 0
+    insert = update["insert"] if "insert" in update else current[update["insert_from"]:update["insert_to"]]
+    text = (units[:start] + insert.encode("utf-16-le") + units[end:]).decode("utf-16-le")
+    assert text_hash(text) == update["hash"]
+    assert utf16_length(text) == update["length"]
+    return text
+
+
+@pytest.fixture
+def versions():
+    return TextVersions(max_bytes=10 ** 6, inline_chars=100, chunk_chars=64)
+
+
+def test_common_prefix_and_suffix():
+    a, b = "x" * 10000 + "abc" + "y" * 5000, "x" * 10000 + "aXc" + "y" * 5000
+    prefix = common_prefix(a, b)
+    assert prefix == 10001
+    assert common_suffix(a, b, min(len(a), len(b)) - prefix) == 5001
+
+
+@pytest.mark.parametrize("old, new", [
+    ("hello world", "hello brave world"),
+    ("hello world", "hello"),
+    ("", "first text"),
+    ("abc", "xyz"),
+    ("emoji 😀 before", "emoji 😀 after 😀"),
+    ("same", "same"),
+])
+def test_updates_turn_the_previous_text_into_the_new_one(versions, old, new):
+    versions.update(("client", "1"), old)
+    update = versions.update(("client", "1"), new)
+    assert apply(old, update, new) == new
+
+
+def test_large_inserts_are_left_for_slices(versions):
+    old = "start\n"
+    new = old + "line\n" * 100
+    versions.update(("client", "1"), old)
+    update = versions.update(("client", "1"), new)
+    assert "insert" not in update
+    assert (update["insert_from"], update["insert_to"], update["chunk_chars"]) == (len(old), len(new), 64)
+    assert apply(old, update, new) == new
+    assert versions.current(("client", "1")) == (update["hash"], new)
+
+
+def test_versions_are_kept_per_client(versions):
+    versions.update(("a", "1"), "text of a")
+    update = versions.update(("b", "1"), "text of b")
+    # Client b never saw a's text, it gets everything
+    assert update["base"] is None
+    assert versions.current(("a", "1"))[1] == "text of a"
+
+
+def test_least_recently_used_texts_are_dropped_over_budget():
+    versions = TextVersions(max_bytes=10, inline_chars=100, chunk_chars=64)
+    first = versions.put("123456")
+    versions.update(("a", "1"), "abcdef")
+    assert versions.get(first) is None
+    # The latest text stays even when it alone is over budget
+    versions.update(("a", "3"), "x" * 50)
+    assert versions.current(("a", "3")) is not None
+    assert versions.current(("a", "1")) is None
+    assert versions.size == 50
+
+
+def test_texts_are_kept_once_per_version(versions):
+    versions.update(("a", "1"), "shared")
+    version = versions.put("shared")
+    assert versions.size == len("shared")
+    assert versions.get(version) == "shared"
+    assert versions.summary("shared", version) == {"hash": version, "length": 6, "codepoints": 6, "chunk_chars": 64}
+
+
+def test_rich_text_node_only_names_the_version_in_the_ui(prompt_server):
+    from fluxagent.RichTextNode import RichTextNode
+    from fluxagent.utils.TextDelta import get_text_versions
+
+    prompt_server.client_id = "client-rich-text"
+    try:
+        RichTextNode().process("first version", "7")
+        output = RichTextNode().process("second version", "7")
+    finally:
+        prompt_server.client_id = None
+    (version,) = output["ui"]["rich_text_version"]
+    assert "second version" not in str(output["ui"])
+    assert version["hash"] == text_hash("second version") and version["length"] == len("second version")
+    assert output["result"] == ("second version",)
+
+    updates = [data for event, data, sid in prompt_server.sent
+               if event == "X-FluxAgent.rich_text.update" and sid == "client-rich-text"]
+    assert len(updates) == 2
+    assert apply("first version", updates[-1]["update"], "second version") == "second version"
+
+    # Without a client to update, the text is still kept for the history
+    sent = len(prompt_server.sent)
+    output = RichTextNode().process("from the api", "7")
+    assert len(prompt_server.sent) == sent
+    assert get_text_versions().get(output["ui"]["rich_text_version"][0]["hash"]) == "from the api"
+
+
+def test_route_serves_versions_by_hash_and_the_last_sent_one(prompt_server, monkeypatch):
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+    from fluxagent.utils import TextDelta
+
+    # Importing the service registers its route on the PromptServer
+    importlib.import_module("fluxagent.RichTextService")
+
+    versions = TextVersions(max_bytes=10 ** 6, inline_chars=100, chunk_chars=4)
+    monkeypatch.setattr(TextDelta, "_versions", versions)
+    replayed = versions.put("from the history")
+    versions.update(("client", "1"), "sent last")
+
+    async def fetch():
+        app = web.Application()
+        app.add_routes(prompt_server.routes)
+        answers = []
+        async with TestClient(TestServer(app)) as client:
+            for query in ({"hash": replayed}, {"hash": replayed, "offset": 5, "limit": 3},
+                          {"client_id": "client", "node_id": "1"}, {"client_id": "other", "node_id": "1"},
+                          {"hash": "00000000"}, {"hash": "00000000", "offset": 0}):
+                response = await client.get("/X-FluxAgent-rich-text", params=query)
+                answers.append((response.status, await response.json()))
+        return answers
+
+    history, piece, last, unknown_client, unknown, unknown_slice = asyncio.run(fetch())
+    assert history == (200, versions.summary("from the history", replayed))
+    assert piece == (200, {"hash": replayed, "text": "the"})
+    assert last[1]["hash"] == text_hash("sent last")
+    assert unknown_client[0] == 404 and unknown[0] == 404
+    assert unknown_slice[0] == 409